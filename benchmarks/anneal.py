@@ -0,0 +1,45 @@
+"""
+Throughput of simulated annealing engine (sequences per minute on one core) for batches of synthetic proteins with
+different number of sweeps, and mean gap to optimal objective of dp engine (MaxCPBstCAI only).
+
+Run from the repository root: python -m benchmarks.anneal [MaxCPBstCAI|MinRCPBstRCB] [length] [count] [sweeps ...]
+"""
+import sys
+import time
+
+from config import DB_DIR
+from benchmarks.suite import skewed_protein, THRESHOLDS
+from code.anneal import anneal_batch
+from code.extractor import _extract_built_data
+
+ORGANISM = "escherichia_coli"
+LENGTH = 300
+COUNT = 64
+SWEEPS = [10, 30, 100]
+
+
+if __name__ == "__main__":
+    method = sys.argv[1] if len(sys.argv) > 1 else "MaxCPBstCAI"
+    length = int(sys.argv[2]) if len(sys.argv) > 2 else LENGTH
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else COUNT
+    sweeps_list = list(map(int, sys.argv[4:])) or SWEEPS
+    line_data, matrix_data = _extract_built_data(DB_DIR, ORGANISM, method)
+    threshold = THRESHOLDS[method]
+    proteins = [skewed_protein(length, seed) for seed in range(count)]
+    optimal = None
+    if method == "MaxCPBstCAI":
+        from code.dp import max_cpb_st_cai_dp
+        optimal = [max_cpb_st_cai_dp(protein, line_data, matrix_data, threshold).objective for protein in proteins]
+
+    rows = []
+    for sweeps in sweeps_list:
+        start = time.perf_counter()
+        results = anneal_batch(method, proteins, line_data, matrix_data, threshold, sweeps=sweeps)
+        elapsed = time.perf_counter() - start
+        objective = sum(result.objective for result in results) / count
+        gap = "-"
+        if optimal is not None:
+            gap = f"{100 * sum((o - r.objective) / abs(o) for o, r in zip(optimal, results) if o) / count:.3f}"
+        rows.append(f"{sweeps}\t{objective:.6f}\t{gap}\t{60 * count / elapsed:.0f}")
+    print("sweeps\tmean objective\tgap, %\tsequences per minute")
+    print("\n".join(rows))
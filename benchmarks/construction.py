@@ -0,0 +1,52 @@
+"""
+Construction time of MinRCPBstRCB model (without solving) for synthetic proteins of different length.
+
+Run from the repository root: python -m benchmarks.construction [length ...]
+"""
+import random
+import sys
+import time
+
+from config import AMINOACIDS, DB_DIR
+from code.extractor import _extract_built_data
+from code.formulation import min_rcpb_st_rcb_formulation
+from code.optimizer import _create_M, _create_R, _create_Y, _create_matrix_model, _create_min_rcpb_st_rcb_model
+
+
+ORGANISM = "escherichia_coli"
+LENGTHS = [100, 500, 1000, 2000]
+
+
+def synthetic_protein(length: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return "".join(rng.choice(AMINOACIDS[:-1]) for _ in range(length))
+
+
+def construction_times(protein_seq: str, freq_codons: list, freq_codon_pair: list, threshold: float) -> dict:
+    aminoacids = list(protein_seq)
+    Y = _create_Y(aminoacids)
+    M = _create_M()
+    R = _create_R(aminoacids, M)
+
+    start_time = time.time()
+    model, _, _ = _create_min_rcpb_st_rcb_model(aminoacids, Y, M, R, freq_codons, freq_codon_pair, threshold)
+    model.update()
+    loop_time = time.time() - start_time
+    model.dispose()
+
+    start_time = time.time()
+    formulation = min_rcpb_st_rcb_formulation(R, Y, M, freq_codons, freq_codon_pair, threshold)
+    model, _ = _create_matrix_model(formulation)
+    model.update()
+    matrix_time = time.time() - start_time
+    model.dispose()
+    return {"loop": loop_time, "matrix": matrix_time}
+
+
+if __name__ == "__main__":
+    lengths = list(map(int, sys.argv[1:])) or LENGTHS
+    freq_codons, freq_codon_pair = _extract_built_data(DB_DIR, ORGANISM, "MinRCPBstRCB")
+    print("length\tloop, s\tmatrix, s")
+    for length in lengths:
+        times = construction_times(synthetic_protein(length), freq_codons, freq_codon_pair, 0.5)
+        print(f"{length}\t{times['loop']:.3f}\t{times['matrix']:.3f}")
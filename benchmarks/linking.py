@@ -0,0 +1,77 @@
+"""
+Comparison of weak and flow linking of X and Z variables (matrix construction) for synthetic proteins and organisms
+built in database directory: model size, root bound (LP relaxation objective), solve time and objective. Gap of root
+bound is relative distance between LP relaxation objective and optimal objective.
+
+Run from the repository root: python -m benchmarks.linking [MaxCPBstCAI|MinRCPBstRCB] [length ...]
+"""
+import sys
+import time
+
+from config import DB_DIR
+from benchmarks.suite import skewed_protein, THRESHOLDS
+from code.extractor import _extract_built_data, find_organisms
+from code.formulation import LINKINGS
+
+LENGTHS = [20, 60, 150]
+
+
+def linking_case(method: str, protein_seq: str, line_data: list, matrix_data: list, threshold: float,
+                 linking: str) -> dict:
+    """
+    Build model, solve its LP relaxation and the model.
+
+    :return: model size, root bound, solve time and objective
+    """
+    # Gurobi is imported only when benchmark runs
+    from gurobipy import GRB
+    from code.formulation import max_cpb_st_cai_formulation, min_rcpb_st_rcb_formulation
+    from code.optimizer import _create_M, _create_R, _create_Y, _create_matrix_model
+
+    aminoacids = list(protein_seq)
+    Y = _create_Y(aminoacids)
+    M = _create_M()
+    R = _create_R(aminoacids, M)
+    if method == "MaxCPBstCAI":
+        formulation = max_cpb_st_cai_formulation(R, line_data, matrix_data, threshold, linking=linking)
+    else:
+        formulation = min_rcpb_st_rcb_formulation(R, Y, M, line_data, matrix_data, threshold, linking=linking)
+    model, _ = _create_matrix_model(formulation)
+    model.Params.OutputFlag = 0
+    model.update()
+    case = {"variables": model.NumVars, "constraints": model.NumConstrs, "nonzeros": model.NumNZs}
+
+    relaxation = model.relax()
+    relaxation.optimize()
+    case["root_bound"] = relaxation.ObjVal * formulation.scale if relaxation.Status == GRB.OPTIMAL else None
+    relaxation.dispose()
+
+    start_time = time.perf_counter()
+    model.optimize()
+    case["solve_time"] = time.perf_counter() - start_time
+    case["nodes"] = model.NodeCount
+    case["objective"] = model.ObjVal * formulation.scale if model.SolCount else None
+    model.dispose()
+    if case["root_bound"] is not None and case["objective"]:
+        case["root_gap"] = abs(case["root_bound"] - case["objective"]) / abs(case["objective"])
+    return case
+
+
+if __name__ == "__main__":
+    method = sys.argv[1] if len(sys.argv) > 1 else "MaxCPBstCAI"
+    lengths = list(map(int, sys.argv[2:])) or LENGTHS
+    print("organism\tlength\tlinking\tvariables\tconstraints\tnonzeros\troot bound\troot gap, %\tnodes\tsolve, s\t"
+          "objective")
+    for organism in find_organisms(DB_DIR):
+        line_data, matrix_data = _extract_built_data(DB_DIR, organism, method)
+        for length in lengths:
+            for linking in LINKINGS:
+                try:
+                    case = linking_case(method, skewed_protein(length), line_data, matrix_data, THRESHOLDS[method],
+                                        linking)
+                except Exception as e:
+                    print(f"{organism}\t{length}\t{linking}\terror: {e}")
+                    continue
+                print(f"{organism}\t{length}\t{linking}\t{case['variables']}\t{case['constraints']}\t"
+                      f"{case['nonzeros']}\t{case['root_bound']:.6f}\t{100 * case.get('root_gap', 0):.3f}\t"
+                      f"{case['nodes']:.0f}\t{case['solve_time']:.3f}\t{case['objective']:.6f}")
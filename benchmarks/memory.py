@@ -0,0 +1,75 @@
+"""
+Memory of MinRCPBstRCB model construction (without solving) for synthetic proteins of different length: peak memory
+(RSS) of loop construction (dictionaries of Gurobi variables) and matrix construction (index arrays and sparse
+matrices), and size of model index arrays (Y, R matrices and chain index) compared with int64 arrays. Each
+construction runs in a separate process.
+
+Run from the repository root: python -m benchmarks.memory [length ...]
+"""
+import resource
+import sys
+from multiprocessing import Pool
+
+from config import DB_DIR
+from benchmarks.suite import skewed_protein
+from code.extractor import _extract_built_data
+
+ORGANISM = "escherichia_coli"
+LENGTHS = [500, 1000, 2000, 5000]
+
+
+def construction_memory(build: str, length: int) -> float:
+    """
+    :param build: "loop" or "matrix"
+    :param length: number of amino acids
+    :return: increase of peak memory, MB
+    """
+    from code.formulation import min_rcpb_st_rcb_formulation
+    from code.optimizer import _create_M, _create_R, _create_Y, _create_matrix_model, _create_min_rcpb_st_rcb_model
+
+    freq_codons, freq_codon_pair = _extract_built_data(DB_DIR, ORGANISM, "MinRCPBstRCB")
+    aminoacids = list(skewed_protein(length))
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    Y = _create_Y(aminoacids)
+    M = _create_M()
+    R = _create_R(aminoacids, M)
+    if build == "loop":
+        model, _, _ = _create_min_rcpb_st_rcb_model(aminoacids, Y, M, R, freq_codons, freq_codon_pair, 0.5)
+    else:
+        formulation = min_rcpb_st_rcb_formulation(R, Y, M, freq_codons, freq_codon_pair, 0.5)
+        model, _ = _create_matrix_model(formulation)
+    model.update()
+    # kilobytes on Linux
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024
+
+
+def index_bytes(length: int) -> (int, int):
+    """
+    :param length: number of amino acids
+    :return: bytes of Y, R matrices and chain index arrays, bytes of the same arrays as int64
+    """
+    from code.formulation import ChainIndex
+    from code.optimizer import _create_M, _create_R, _create_Y
+
+    aminoacids = list(skewed_protein(length))
+    Y = _create_Y(aminoacids)
+    R = _create_R(aminoacids, _create_M())
+    index = ChainIndex(R)
+    arrays = [Y, R, index.x_pos, index.x_codon, index.z_pos, index.z_from, index.z_to, index.z_j, index.z_k]
+    return sum(a.nbytes for a in arrays), sum(a.size * 8 for a in arrays)
+
+
+def _construction_memory(build: str, length: int) -> float:
+    # fresh process for each construction, so peak memory of previous construction is not counted
+    with Pool(1) as pool:
+        return pool.apply(construction_memory, (build, length))
+
+
+if __name__ == "__main__":
+    lengths = list(map(int, sys.argv[1:])) or LENGTHS
+    print("length\tloop, MB\tmatrix, MB\tsaved, KB/aa\tindex arrays, KB/aa\tint64 arrays, KB/aa")
+    for length in lengths:
+        loop, matrix = _construction_memory("loop", length), _construction_memory("matrix", length)
+        compact, wide = index_bytes(length)
+        print(f"{length}\t{loop:.1f}\t{matrix:.1f}\t{(loop - matrix) * 1024 / length:.2f}\t"
+              f"{compact / 1024 / length:.3f}\t{wide / 1024 / length:.3f}")
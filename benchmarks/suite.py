@@ -0,0 +1,176 @@
+"""
+Benchmark of both optimization methods on synthetic proteins and organisms built in database directory: model size,
+build time, solve time, peak memory and objective of each case. Each case is run in a separate process, so peak memory
+(resident set size) is measured per case.
+
+Results are written as JSON lines and can be compared with saved baseline (results of previous run): cases that are
+slower or use more memory than baseline by more than tolerance, or have another objective, are reported as regressions.
+
+Run from the repository root:
+    python -m benchmarks.suite --output results.jsonl
+    python -m benchmarks.suite --output results.jsonl --baseline baseline.jsonl
+"""
+import argparse
+import json
+import random
+import resource
+import sys
+import time
+from multiprocessing import Pool
+
+from config import AMINOACIDS, DB_DIR
+from code.extractor import _extract_built_data, find_organisms
+
+LENGTHS = [50, 200, 1000, 5000]
+METHODS = ["MaxCPBstCAI", "MinRCPBstRCB"]
+THRESHOLDS = {"MaxCPBstCAI": 0.8, "MinRCPBstRCB": 0.5}
+# relative tolerance of times and memory when compared with baseline
+TOLERANCE = 0.2
+# absolute differences that are treated as noise (short cases)
+NOISE = {"build_time": 0.05, "solve_time": 0.05, "peak_rss_mb": 5}
+# relative tolerance of objective
+OBJECTIVE_TOLERANCE = 1e-6
+FIELDS = ["organism", "method", "length", "seed", "variables", "constraints", "build_time", "solve_time",
+          "peak_rss_mb", "objective"]
+
+
+def skewed_protein(length: int, seed: int = 0) -> str:
+    """
+    Deterministic synthetic protein with skewed amino acid composition: amino acid weights follow Zipf law in random
+    (seed dependent) order of amino acids, so proteins of different seeds are rich in different amino acids.
+
+    :param length: number of amino acids
+    :param seed: seed of random generator
+    :return: protein sequence
+    """
+    rng = random.Random(seed)
+    aminoacids = AMINOACIDS[:-1]
+    rng.shuffle(aminoacids)
+    weights = [1 / rank for rank in range(1, len(aminoacids) + 1)]
+    return "".join(rng.choices(aminoacids, weights, k=length))
+
+
+def run_case(organism: str, method: str, length: int, seed: int, threshold: float, threads: int = 0) -> dict:
+    """
+    Build and solve optimization model of one case.
+
+    :return: case parameters and measurements
+    """
+    # Gurobi is imported in case process only
+    from code.formulation import max_cpb_st_cai_formulation, min_rcpb_st_rcb_formulation
+    from code.optimizer import _create_M, _create_R, _create_Y, _create_matrix_model
+
+    case = {"organism": organism, "method": method, "length": length, "seed": seed, "threshold": threshold}
+    protein_seq = skewed_protein(length, seed)
+    line_data, matrix_data = _extract_built_data(DB_DIR, organism, method)
+    try:
+        start_time = time.perf_counter()
+        aminoacids = list(protein_seq)
+        Y = _create_Y(aminoacids)
+        M = _create_M()
+        R = _create_R(aminoacids, M)
+        if method == "MaxCPBstCAI":
+            formulation = max_cpb_st_cai_formulation(R, line_data, matrix_data, threshold)
+        else:
+            formulation = min_rcpb_st_rcb_formulation(R, Y, M, line_data, matrix_data, threshold)
+        model, _ = _create_matrix_model(formulation)
+        model.Params.OutputFlag = 0
+        model.Params.Threads = threads
+        model.update()
+        case["build_time"] = time.perf_counter() - start_time
+        case["variables"] = model.NumVars
+        case["constraints"] = model.NumConstrs
+        case["nonzeros"] = model.NumNZs
+
+        start_time = time.perf_counter()
+        model.optimize()
+        case["solve_time"] = time.perf_counter() - start_time
+        case["objective"] = model.ObjVal * formulation.scale if model.SolCount else None
+        model.dispose()
+    except Exception as e:
+        case["error"] = str(e)
+    # kilobytes on Linux
+    case["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return case
+
+
+def compare(results: list, baseline: list, tolerance: float = TOLERANCE) -> list:
+    """
+    Compare results with baseline.
+
+    :param results: cases of current run
+    :param baseline: cases of baseline run
+    :param tolerance: relative tolerance of times and memory
+    :return: list of regression messages
+    """
+    def key(case):
+        return case["organism"], case["method"], case["length"], case["seed"], case["threshold"]
+
+    baseline = {key(case): case for case in baseline}
+    regressions = []
+    for case in results:
+        base = baseline.get(key(case))
+        if base is None:
+            continue
+        name = "{} {} length={} seed={}".format(*key(case))
+        if "error" in case and "error" not in base:
+            regressions.append(f"{name}: {case['error']}")
+            continue
+        for field, noise in NOISE.items():
+            if field in case and field in base and case[field] > base[field] * (1 + tolerance) + noise:
+                regressions.append(f"{name}: {field} {base[field]:.3f} -> {case[field]:.3f}")
+        if case.get("objective") is not None and base.get("objective") is not None:
+            difference = abs(case["objective"] - base["objective"])
+            if difference > OBJECTIVE_TOLERANCE * max(1.0, abs(base["objective"])):
+                regressions.append(f"{name}: objective {base['objective']} -> {case['objective']}")
+    return regressions
+
+
+def _run_case(args: tuple) -> dict:
+    return run_case(*args)
+
+
+def _format(value) -> str:
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+def read_results(filename: str) -> list:
+    with open(filename, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of optimization methods")
+    parser.add_argument("--lengths", type=int, nargs="+", default=LENGTHS)
+    parser.add_argument("--methods", nargs="+", default=METHODS, choices=METHODS)
+    parser.add_argument("--organisms", nargs="+", default=None, help="all organisms of database by default")
+    parser.add_argument("--seeds", type=int, default=1, help="number of proteins of each length")
+    parser.add_argument("--threads", type=int, default=0, help="Gurobi threads")
+    parser.add_argument("--output", default="benchmark.jsonl")
+    parser.add_argument("--baseline", default=None, help="results of previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    organisms = args.organisms or find_organisms(DB_DIR)
+    cases = [(organism, method, length, seed, THRESHOLDS[method], args.threads)
+             for organism in organisms for method in args.methods
+             for length in args.lengths for seed in range(args.seeds)]
+
+    results = []
+    print("organism\tmethod\tlength\tseed\tvariables\tconstraints\tbuild, s\tsolve, s\tpeak RSS, MB\tobjective")
+    # new process for each case: peak memory of case is not affected by previous cases
+    with Pool(1, maxtasksperchild=1) as pool, open(args.output, "w") as f:
+        for case in pool.imap(_run_case, cases):
+            results.append(case)
+            f.write(json.dumps(case) + "\n")
+            print("\t".join(_format(case.get(field, "-")) for field in FIELDS))
+            if "error" in case:
+                print(f"error: {case['error']}")
+
+    if args.baseline:
+        regressions = compare(results, read_results(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(f"Regression! {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
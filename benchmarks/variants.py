@@ -0,0 +1,59 @@
+"""
+Incremental optimization of variants with point mutations compared with optimization from scratch: solve time and
+gap between objectives for synthetic parent protein and different numbers of mutations.
+
+Run from the repository root: python -m benchmarks.variants [MaxCPBstCAI|MinRCPBstRCB] [backend] [length] [edits ...]
+"""
+import random
+import sys
+import time
+
+from config import AMINOACIDS, DB_DIR
+from benchmarks.suite import skewed_protein, THRESHOLDS
+from code.extractor import _extract_built_data
+from code.variants import variant_optimization
+
+ORGANISM = "escherichia_coli"
+LENGTH = 300
+EDITS = [1, 3, 10]
+
+
+def point_mutant(protein_seq: str, edits: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    variant = list(protein_seq)
+    for position in rng.sample(range(len(variant)), edits):
+        variant[position] = rng.choice([aa for aa in AMINOACIDS[:-1] if aa != variant[position]])
+    return "".join(variant)
+
+
+if __name__ == "__main__":
+    from code.batch import get_optimization
+
+    method = sys.argv[1] if len(sys.argv) > 1 else "MaxCPBstCAI"
+    backend = sys.argv[2] if len(sys.argv) > 2 else "highs"
+    length = int(sys.argv[3]) if len(sys.argv) > 3 else LENGTH
+    edits = list(map(int, sys.argv[4:])) or EDITS
+    optimization = get_optimization(method, "mip")
+    line_data, matrix_data = _extract_built_data(DB_DIR, ORGANISM, method)
+    threshold = THRESHOLDS[method]
+
+    parent = skewed_protein(length)
+    parent_dna = optimization(parent, line_data, matrix_data, threshold, build="matrix", linking="flow",
+                              backend=backend).sequence
+    rows = []
+    for count in edits:
+        variant = point_mutant(parent, count)
+        start_time = time.perf_counter()
+        full = optimization(variant, line_data, matrix_data, threshold, build="matrix", linking="flow",
+                            backend=backend)
+        full_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        result = variant_optimization(method, parent, parent_dna, variant, line_data, matrix_data, threshold,
+                                      linking="flow", backend=backend)
+        variant_time = time.perf_counter() - start_time
+        loss = full.objective - result.objective if method == "MaxCPBstCAI" else result.objective - full.objective
+        rows.append(f"{count}\t{result.metrics.model['free_positions']}\t{full.objective:.6f}\t"
+                    f"{result.objective:.6f}\t{100 * loss / abs(full.objective):.3f}\t{full_time:.3f}\t"
+                    f"{variant_time:.3f}")
+    print("edits\tfree positions\tfull\tincremental\tgap, %\tfull, s\tincremental, s")
+    print("\n".join(rows))
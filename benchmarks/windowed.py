@@ -0,0 +1,34 @@
+"""
+Gap between objective of windowed optimization and full solve for synthetic proteins of different length.
+
+Run from the repository root: python -m benchmarks.windowed [MaxCPBstCAI|MinRCPBstRCB] [window] [length ...]
+"""
+import sys
+
+from config import DB_DIR
+from benchmarks.suite import skewed_protein, THRESHOLDS
+from code.extractor import _extract_built_data
+from code.windowed import max_cpb_st_cai_windowed, min_rcpb_st_rcb_windowed
+
+ORGANISM = "escherichia_coli"
+WINDOW = 250
+LENGTHS = [500, 1000, 2000]
+
+
+if __name__ == "__main__":
+    method = sys.argv[1] if len(sys.argv) > 1 else "MaxCPBstCAI"
+    window = int(sys.argv[2]) if len(sys.argv) > 2 else WINDOW
+    lengths = list(map(int, sys.argv[3:])) or LENGTHS
+    optimization = max_cpb_st_cai_windowed if method == "MaxCPBstCAI" else min_rcpb_st_rcb_windowed
+    line_data, matrix_data = _extract_built_data(DB_DIR, ORGANISM, method)
+
+    rows = []
+    for length in lengths:
+        result = optimization(skewed_protein(length), line_data, matrix_data, THRESHOLDS[method], window,
+                              compare=True)
+        model = result.metrics.model
+        rows.append(f"{length}\t{model['windows']}\t{result.objective:.6f}\t{model['full_objective']:.6f}\t"
+                    f"{100 * model['gap']:.3f}\t{result.metrics.total_time - result.metrics.phases['compare']:.3f}\t"
+                    f"{model['full_time']:.3f}")
+    print("length\twindows\twindowed\tfull\tgap, %\twindowed, s\tfull, s")
+    print("\n".join(rows))
@@ -1,26 +1,50 @@
+from multiprocessing import Pool
 from os.path import join
 
-from code.calculator import calculate_fitness_values, calculate_cps, calculate_observed_codon_frequencies, calculate_observed_pair_frequencies
-from code.extractor import extract_db_frequencies, extract_builder_data
-from code.writer import create_directory, write_ordering_line, write_ordering_matrix
-from config import DB_CODON_FREQUENCY_START, DB_CODON_PAIR_FREQUENCY_START, CODON_DB_PATH, BICODON_DB_PATH, DB_DIR
+import numpy as np
 
-taxid, organism = extract_builder_data("builder_input.txt")
+from code.array_calculator import calculate_tables, frequencies_array, pair_frequencies_array, line_dict, matrix_dict
+from code.extractor import extract_db_frequencies_bulk, extract_builder_data
+from code.writer import create_directory, write_ordering_line, write_ordering_matrix, write_tables_record
+from config import DB_CODON_FREQUENCY_START, DB_CODON_PAIR_FREQUENCY_START, CODON_DB_PATH, BICODON_DB_PATH, DB_DIR, \
+    BUILT_TABLES
 
-# build fitness values and observed codon frequencies
-codon_frequencies = extract_db_frequencies(taxid, CODON_DB_PATH, DB_CODON_FREQUENCY_START)
-fitness_values = calculate_fitness_values(codon_frequencies)
-observed_codon_frequencies = calculate_observed_codon_frequencies(codon_frequencies)
 
-create_directory(join(DB_DIR, organism))
-write_ordering_line(join(DB_DIR, organism, "fv.txt"), fitness_values)
-write_ordering_line(join(DB_DIR, organism, "ocf.txt"), observed_codon_frequencies)
+def write_organism(organism: str, tables: np.ndarray):
+    """
+    Save fitness values, Codon Pair Score (CPS) table and observed codon/codon-pair frequencies of organism in organism
+    directory.
 
+    :param organism: name of directory to save built data
+    :param tables: built data record of organism
+    """
+    create_directory(join(DB_DIR, organism))
+    write_ordering_line(join(DB_DIR, organism, "fv.txt"), line_dict(tables["fv"], 2))
+    write_ordering_line(join(DB_DIR, organism, "ocf.txt"), line_dict(tables["ocf"], 2))
+    write_ordering_matrix(join(DB_DIR, organism, "cps.txt"), matrix_dict(tables["cps"]))
+    write_ordering_matrix(join(DB_DIR, organism, "opf.txt"), matrix_dict(tables["opf"], 2))
 
-# build Codon Pair Score (CPS) table and observed codon pair frequencies table
-codon_pairs_frequencies = extract_db_frequencies(taxid, BICODON_DB_PATH, DB_CODON_PAIR_FREQUENCY_START)
-cps = calculate_cps(codon_frequencies, codon_pairs_frequencies)
-observed_pair_frequencies = calculate_observed_pair_frequencies(codon_pairs_frequencies)
+    # all tables in full precision to binary file (text files are rounded)
+    write_tables_record(join(DB_DIR, organism, BUILT_TABLES), tables)
 
-write_ordering_matrix(join(DB_DIR, organism, "cps.txt"), cps)
-write_ordering_matrix(join(DB_DIR, organism, "opf.txt"), observed_pair_frequencies)
+
+if __name__ == "__main__":
+    organisms, options = extract_builder_data("builder_input.txt")
+    workers = int(options.get("workers", 1))
+
+    # each database is read once for all organisms
+    taxids = [taxid for taxid, _ in organisms]
+    codon_frequencies = extract_db_frequencies_bulk(taxids, CODON_DB_PATH, DB_CODON_FREQUENCY_START)
+    codon_pairs_frequencies = extract_db_frequencies_bulk(taxids, BICODON_DB_PATH, DB_CODON_PAIR_FREQUENCY_START)
+
+    # tables of all organisms are calculated in one call
+    tables = calculate_tables(np.array([frequencies_array(codon_frequencies[taxid]) for taxid in taxids]),
+                              np.array([pair_frequencies_array(codon_pairs_frequencies[taxid]) for taxid in taxids]))
+
+    tasks = [(organism, organism_tables) for (_, organism), organism_tables in zip(organisms, tables)]
+    if workers == 1:
+        for task in tasks:
+            write_organism(*task)
+    else:
+        with Pool(workers) as pool:
+            pool.starmap(write_organism, tasks)
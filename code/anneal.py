@@ -0,0 +1,361 @@
+import math
+import time
+
+import numpy as np
+
+from code.dp import _create_candidates, _log_fitness_values, _unknown_aminoacids
+from code.result import Metrics, NoSolution, OptimizationResult
+from code.scoring import CODON_AA, AA_CODONS, cai, cpb, rcb, rcpb
+from code.warmstart import start_codons
+from config import CODONS
+
+# number of annealing chains for each protein
+POPULATION = 16
+# number of proposed changes per chain for each position of protein
+SWEEPS = 30
+# final temperature relative to the initial one
+COOLING = 1e-2
+# penalty of constraint violation at the end relative to the initial one
+PENALTY = 1e3
+# number of selections during annealing: the worst chains of protein are replaced with copies of its best chains
+SELECTIONS = 10
+# share of chains replaced on selection
+SELECTION_SHARE = 0.25
+# number of iterations between checks of time budget
+TIME_CHECK = 64
+# tolerance for comparison of constraint values
+EPS = 1e-9
+
+
+def max_cpb_st_cai_anneal(protein_seq: str, fitness_values: list, cps: list, threshold: float,
+                          population: int = POPULATION, sweeps: int = SWEEPS, time_limit: float = None,
+                          seed: int = 0) -> OptimizationResult:
+    """
+    MaxCPBstCAI optimization by simulated annealing without MIP solver (see anneal_batch). Result is not guaranteed
+    optimal.
+
+    :param protein_seq: sequence of protein for optimization
+    :param fitness_values: fitness values list
+    :param cps: Codon Pair Score (CPS) table
+    :param threshold: the min value for CAI
+    :param population: number of annealing chains
+    :param sweeps: number of proposed changes per chain for each position
+    :param time_limit: time budget in seconds (annealing is cooled faster to finish in time), None for no limit
+    :param seed: seed of random generator
+    :return: string with DNA sequence, optimized for input protein (with objective value and metrics as attributes)
+    """
+    return anneal_batch("MaxCPBstCAI", [protein_seq], fitness_values, cps, threshold, population, sweeps, time_limit,
+                        seed)[0]
+
+
+def min_rcpb_st_rcb_anneal(protein_seq: str, freq_codons: list, freq_codon_pair: list, threshold: float,
+                           population: int = POPULATION, sweeps: int = SWEEPS, time_limit: float = None,
+                           seed: int = 0) -> OptimizationResult:
+    """
+    MinRCPBstRCB optimization by simulated annealing without MIP solver (see anneal_batch). Result is not guaranteed
+    optimal.
+
+    :param protein_seq: sequence of protein for optimization
+    :param freq_codons: observed frequency of each codon
+    :param freq_codon_pair: observed frequency of codon pair
+    :param threshold: the max value for RCB
+    :param population: number of annealing chains
+    :param sweeps: number of proposed changes per chain for each position
+    :param time_limit: time budget in seconds (annealing is cooled faster to finish in time), None for no limit
+    :param seed: seed of random generator
+    :return: string with DNA sequence, optimized for input protein (with objective value and metrics as attributes)
+    """
+    return anneal_batch("MinRCPBstRCB", [protein_seq], freq_codons, freq_codon_pair, threshold, population, sweeps,
+                        time_limit, seed)[0]
+
+
+def anneal_batch(method: str, proteins: list, line_data: list, matrix_data: list, threshold: float,
+                 population: int = POPULATION, sweeps: int = SWEEPS, time_limit: float = None,
+                 seed: int = 0) -> list:
+    """
+    Optimize proteins together by simulated annealing. Every protein has population of chains (codon indexes arrays)
+    that start from heuristic codons (see warmstart.start_codons), chains of all proteins are rows of one array. On
+    each iteration every chain proposes change of codon on random position to random synonymous codon. Change of
+    objective and constraint is computed incrementally: for MaxCPBstCAI only two Codon Pair Scores of neighbours and
+    one log fitness value change, for MinRCPBstRCB codon and codon pair counts of chains are kept, so two codon
+    deviations of RCB and at most four codon pair deviations of RCPB change. Violation of constraint is penalized, the
+    penalty grows while temperature decreases, the best chain that meets constraint is the result. The worst chains
+    of protein are periodically replaced with copies of its best chains.
+
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param proteins: sequences of proteins for optimization
+    :param line_data: fitness values or observed codon frequencies
+    :param matrix_data: Codon Pair Score table or observed codon pair frequencies
+    :param threshold: threshold for CAI or RCB
+    :param population: number of annealing chains for each protein
+    :param sweeps: number of proposed changes per chain for each position
+    :param time_limit: time budget in seconds for each protein (budget of batch is time_limit * number of proteins),
+    None for no limit
+    :param seed: seed of random generator
+    :return: list of results in order of proteins: status of result is "time_limit" if annealing of protein was cooled
+    faster to finish in time budget, NoSolution if protein has unknown amino acid or no chain of protein meets
+    constraint
+    """
+    if method not in ("MaxCPBstCAI", "MinRCPBstRCB"):
+        raise Exception(f"Unknown method {method}")
+    unknown = [_unknown_aminoacids(protein_seq) for protein_seq in proteins]
+    if any(unknown):
+        # proteins with unknown amino acids have no solution, other proteins of batch are optimized
+        known = [protein_seq for protein_seq, letters in zip(proteins, unknown) if not letters]
+        results = iter(anneal_batch(method, known, line_data, matrix_data, threshold, population, sweeps, time_limit,
+                                    seed) if known else [])
+        return [NoSolution(f"unknown amino acid {', '.join(letters)}", Metrics()) if letters else next(results)
+                for letters in unknown]
+    metrics = Metrics()
+    rng = np.random.default_rng(seed)
+    chains = _Chains(method, proteins, line_data, matrix_data, threshold, population)
+    metrics.lap("start")
+
+    B, C = len(proteins), len(chains.protein)
+    rows = np.arange(C)
+    protein = chains.protein
+    # positions of each chain
+    movable_start, movable_count = chains.movable_start[protein], chains.movable_count[protein]
+    offset, last = chains.offset[protein], chains.lengths[protein] - 1
+    iterations = sweeps * chains.movable_count * (chains.lengths > 1)
+    selection = np.maximum(iterations // (SELECTIONS + 1), 1)
+    replaced = int(population * SELECTION_SHARE)
+    best_codons = chains.codons.copy()
+    current = chains.violation()
+    best_energy = np.where(current <= EPS, chains.energy, np.inf)
+    temperature_start = weight_start = None
+    accepted = np.zeros(C, dtype=int)
+    # proteins whose annealing is cooled faster to finish in time budget
+    limited = np.zeros(B, dtype=bool)
+    iteration = 0
+    start = time.perf_counter()
+    while iteration < iterations.max(initial=0):
+        progress = np.where(iterations > iteration, iteration / np.maximum(iterations, 1), 1.0)
+        if time_limit is not None and iteration % TIME_CHECK == 0:
+            budget = (time.perf_counter() - start) / (time_limit * B)
+            limited |= budget > progress
+            progress = np.minimum(np.maximum(progress, budget), 1.0)
+            if progress.min() >= 1:
+                break
+
+        # every chain changes codon on random position to random synonymous codon
+        position = chains.movable[movable_start + (rng.random(C) * movable_count).astype(np.intp)]
+        i = position - offset
+        sizes = chains.sizes[position]
+        old = chains.codons[rows, i]
+        new = chains.table[position, (rng.random(C) * (sizes - 1)).astype(np.intp)]
+        new = np.where(new == old, chains.table[position, sizes - 1], new)
+        has_prev, has_next = i > 0, i < last
+        prev = chains.codons[rows, i - has_prev]
+        following = chains.codons[rows, i + has_next]
+        delta, constraint = chains.propose(rows, prev, old, new, following, has_prev, has_next)
+        violation = chains.violation(constraint)
+
+        if temperature_start is None:
+            # initial temperature accepts typical change of objective with probability 1/e, violation of constraint
+            # costs as typical change of objective per typical change of constraint
+            temperature_start = np.maximum(_typical(delta, protein, B), EPS)
+            weight_start = temperature_start / np.maximum(_typical(constraint - chains.constraint, protein, B), EPS)
+        temperature = (temperature_start * COOLING ** progress)[protein]
+        # penalty of violation grows to make chains feasible at the end
+        weight = (weight_start * PENALTY ** progress)[protein]
+        change = delta + weight * (violation - current)
+        accept = (progress < 1)[protein] & (rng.random(C) < np.exp(-np.maximum(change, 0) / temperature))
+        if accept.any():
+            a = accept
+            chains.accept(rows[a], i[a], prev[a], old[a], new[a], following[a], has_prev[a], has_next[a], delta[a],
+                          constraint[a])
+            current = chains.violation()
+            accepted += a
+            improved = (current <= EPS) & (chains.energy < best_energy - EPS)
+            best_codons[improved] = chains.codons[improved]
+            best_energy[improved] = chains.energy[improved]
+
+        iteration += 1
+        selected = (iteration % selection == 0) & (iteration < iterations)
+        if replaced and selected.any():
+            # the worst chains of protein continue from its best chains
+            order = np.argsort((chains.energy + weight * current).reshape(B, population), axis=1,
+                               kind="stable") + (np.arange(B) * population)[:, None]
+            chains.select(order[selected, -replaced:].ravel(), order[selected, :replaced].ravel())
+            current = chains.violation()
+    metrics.lap("anneal")
+
+    results = []
+    for b, protein_seq in enumerate(proteins):
+        protein_energy = best_energy[b * population:(b + 1) * population]
+        protein_metrics = Metrics()
+        protein_metrics.phases = {phase: value / B for phase, value in metrics.phases.items()}
+        status = "time_limit" if limited[b] else None
+        if not np.isfinite(protein_energy).any():
+            # other proteins of batch keep their results
+            results.append(NoSolution(f"no chain reached threshold {threshold}", protein_metrics, status))
+            continue
+        codons = best_codons[b * population + np.argmin(protein_energy), :chains.lengths[b]]
+        if method == "MaxCPBstCAI":
+            objValue = cpb(codons, matrix_data)
+            protein_metrics.model["cai"] = cai(codons, line_data)
+        else:
+            objValue = rcpb(codons, matrix_data)
+            protein_metrics.model["rcb"] = rcb(codons, line_data)
+        protein_metrics.model["population"] = population
+        protein_metrics.model["iterations"] = min(iteration, int(iterations[b]))
+        protein_metrics.model["acceptance"] = (accepted[b * population:(b + 1) * population].sum() /
+                                               max(protein_metrics.model["iterations"] * population, 1))
+        protein_metrics.model["batch"] = B
+        ans = "".join(CODONS[j] for j in codons)
+        results.append(OptimizationResult(objValue, ans, protein_metrics, status))
+    metrics.lap("solution")
+    return results
+
+
+class _Chains:
+    """
+    Annealing chains of proteins: codon indexes of chains (rows padded to the longest protein, chains of protein are
+    consecutive rows), energy (minimized objective) and constraint value of each chain. For MaxCPBstCAI energy is
+    negative sum of Codon Pair Scores and constraint is sum of log fitness values. For MinRCPBstRCB codon and codon
+    pair counts are kept, constraint is RCB * N (sum of |count - expected count| / number of synonymous codons over
+    codons) and energy is RCPB * (N - 1) (the same sum over codon pairs), expected counts depend only on protein.
+    """
+
+    def __init__(self, method: str, proteins: list, line_data: list, matrix_data: list, threshold: float,
+                 population: int):
+        self.method = method
+        B = len(proteins)
+        candidates = [_create_candidates(protein_seq) for protein_seq in proteins]
+        self.lengths = np.array([len(c) for c in candidates])
+        # positions of all proteins are numbered together, protein positions start from offset
+        self.offset = np.concatenate([[0], np.cumsum(self.lengths)[:-1]])
+        flat = [position_codons for protein_candidates in candidates for position_codons in protein_candidates]
+        self.sizes = np.array([len(c) for c in flat])
+        self.table = np.zeros((len(flat), self.sizes.max()), dtype=np.intp)
+        for position, position_codons in enumerate(flat):
+            self.table[position, :len(position_codons)] = position_codons
+        # positions with synonymous codons of each protein (the first position of protein without synonymous codons,
+        # it is never changed), proteins without synonymous codons have zero count
+        movable = [o + np.flatnonzero(self.sizes[o:o + n] > 1) for o, n in zip(self.offset, self.lengths)]
+        self.movable_count = np.array([len(m) for m in movable])
+        self.movable = np.concatenate([m if len(m) else [o] for m, o in zip(movable, self.offset)]).astype(np.intp)
+        self.movable_start = np.concatenate([[0], np.cumsum(np.maximum(self.movable_count, 1))[:-1]])
+
+        self.protein = np.repeat(np.arange(B), population)
+        self.codons = np.zeros((B * population, self.lengths.max()), dtype=np.intp)
+        for b, protein_seq in enumerate(proteins):
+            start = start_codons(method, protein_seq, line_data, matrix_data, threshold)
+            self.codons[b * population:(b + 1) * population, :len(start)] = start
+        # pairs of padded positions are not counted
+        pairs = np.arange(self.codons.shape[1] - 1) < (self.lengths[self.protein] - 1)[:, None]
+        positions = np.arange(self.codons.shape[1]) < self.lengths[self.protein][:, None]
+        first, second = self.codons[:, :-1], self.codons[:, 1:]
+
+        if method == "MaxCPBstCAI":
+            self.log_fitness_values = _log_fitness_values(line_data)
+            self.cps = np.asarray(matrix_data, dtype=np.double)
+            self.bound = (self.lengths * math.log(threshold))[self.protein]
+            self.energy = -np.where(pairs, self.cps[first, second], 0.0).sum(axis=1)
+            with np.errstate(invalid="ignore"):
+                self.constraint = np.where(positions, self.log_fitness_values[self.codons], 0.0).sum(axis=1)
+        else:
+            n_codons, n_aa = len(CODONS), len(AA_CODONS)
+            self.codon_weights = 1 / AA_CODONS[CODON_AA]
+            self.pair_weights = np.outer(self.codon_weights, self.codon_weights).ravel()
+            pair_aa = (CODON_AA[:, None] * n_aa + CODON_AA[None, :]).ravel()
+            self.codon_expected = np.empty((B, n_codons))
+            self.pair_expected = np.empty((B, n_codons * n_codons))
+            for b, start in enumerate(self.codons[::population]):
+                aminoacids = CODON_AA[start[:self.lengths[b]]]
+                eta = np.bincount(aminoacids, minlength=n_aa)
+                self.codon_expected[b] = eta[CODON_AA] * np.asarray(line_data, dtype=np.double)
+                aa_pairs = np.bincount(aminoacids[:-1] * n_aa + aminoacids[1:], minlength=n_aa * n_aa)
+                self.pair_expected[b] = aa_pairs[pair_aa] * np.asarray(matrix_data, dtype=np.double).ravel()
+            self.bound = (threshold * self.lengths)[self.protein]
+
+            rows = np.broadcast_to(np.arange(len(self.protein))[:, None], self.codons.shape)
+            self.codon_counts = np.zeros((len(self.protein), n_codons), dtype=np.int32)
+            np.add.at(self.codon_counts, (rows[positions], self.codons[positions]), 1)
+            self.pair_counts = np.zeros((len(self.protein), n_codons * n_codons), dtype=np.int32)
+            np.add.at(self.pair_counts, (rows[:, 1:][pairs], (first * n_codons + second)[pairs]), 1)
+            self.constraint = np.abs(self.codon_counts - self.codon_expected[self.protein]) @ self.codon_weights
+            self.energy = np.abs(self.pair_counts - self.pair_expected[self.protein]) @ self.pair_weights
+
+    def violation(self, constraint=None) -> np.ndarray:
+        """
+        :param constraint: constraint values of chains (current values by default)
+        :return: violation of CAI or RCB constraint of each chain
+        """
+        constraint = self.constraint if constraint is None else constraint
+        if self.method == "MaxCPBstCAI":
+            return np.maximum(self.bound - constraint, 0.0)
+        return np.maximum(constraint - self.bound, 0.0)
+
+    def propose(self, rows, prev, old, new, following, has_prev, has_next):
+        """
+        Evaluate change of codon old to new of each chain, codons prev and following are its neighbours (if any).
+
+        :return: change of energy, new constraint value of each chain
+        """
+        if self.method == "MaxCPBstCAI":
+            with np.errstate(invalid="ignore"):
+                delta = np.where(has_prev, self.cps[prev, new] - self.cps[prev, old], 0.0) + \
+                    np.where(has_next, self.cps[new, following] - self.cps[old, following], 0.0)
+                constraint = self.constraint[rows] + self.log_fitness_values[new] - self.log_fitness_values[old]
+            return -delta, constraint
+
+        protein = self.protein[rows]
+        constraint = self.constraint[rows] + self._codon_change(rows, protein, old, -1) + \
+            self._codon_change(rows, protein, new, 1)
+        keys, changes = self._pair_changes(prev, old, new, following, has_prev, has_next)
+        # changes are applied one by one, earlier changes of the same codon pair are added to its count
+        counts = self.pair_counts[rows[:, None], keys] - self.pair_expected[protein[:, None], keys]
+        for t in range(1, keys.shape[1]):
+            for earlier in range(t):
+                counts[:, t] += (keys[:, t] == keys[:, earlier]) * changes[:, earlier]
+        delta = ((np.abs(counts + changes) - np.abs(counts)) * self.pair_weights[keys]).sum(axis=1)
+        return delta, constraint
+
+    def accept(self, rows, i, prev, old, new, following, has_prev, has_next, delta, constraint):
+        """
+        Change codon on position i of chains (rows) from old to new.
+        """
+        self.codons[rows, i] = new
+        self.energy[rows] += delta
+        self.constraint[rows] = constraint
+        if self.method == "MinRCPBstRCB":
+            self.codon_counts[rows, old] -= 1
+            self.codon_counts[rows, new] += 1
+            keys, changes = self._pair_changes(prev, old, new, following, has_prev, has_next)
+            np.add.at(self.pair_counts, (rows[:, None], keys), changes)
+
+    def select(self, rows: np.ndarray, source: np.ndarray):
+        """
+        Replace chains (rows) with copies of source chains.
+        """
+        self.codons[rows] = self.codons[source]
+        self.energy[rows] = self.energy[source]
+        self.constraint[rows] = self.constraint[source]
+        if self.method == "MinRCPBstRCB":
+            self.codon_counts[rows] = self.codon_counts[source]
+            self.pair_counts[rows] = self.pair_counts[source]
+
+    def _codon_change(self, rows, protein, codons, change: int) -> np.ndarray:
+        # change of RCB * N when count of codon is changed
+        counts = self.codon_counts[rows, codons] - self.codon_expected[protein, codons]
+        return self.codon_weights[codons] * (np.abs(counts + change) - np.abs(counts))
+
+    @staticmethod
+    def _pair_changes(prev, old, new, following, has_prev, has_next):
+        # codon pairs (prev, old), (old, following) are removed, (prev, new), (new, following) are added (missing
+        # neighbour pairs have zero change)
+        n_codons = len(CODONS)
+        keys = np.stack([prev * n_codons + old, old * n_codons + following, prev * n_codons + new,
+                         new * n_codons + following], axis=1)
+        has_prev, has_next = has_prev.astype(np.int32), has_next.astype(np.int32)
+        changes = np.stack([-has_prev, -has_next, has_prev, has_next], axis=1)
+        return keys, changes
+
+
+def _typical(values: np.ndarray, protein: np.ndarray, B: int) -> np.ndarray:
+    # mean absolute finite value for each protein
+    finite = np.isfinite(values)
+    total = np.bincount(protein[finite], np.abs(values[finite]), minlength=B)
+    return total / np.maximum(np.bincount(protein[finite], minlength=B), 1)
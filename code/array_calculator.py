@@ -0,0 +1,171 @@
+# Calculation of built data tables on arrays. Codon frequencies are arrays with last axis of 64 codons, codon pair
+# frequencies are arrays with last two axes of 64 x 64 codons (in CODONS order). Leading axes are organisms: tables of
+# many organisms are calculated in one call. Codon Pair Scores are sums of logarithms of frequencies.
+import numpy as np
+
+from code.writer import TABLES_DTYPE
+from config import CODONS, CODON2AA, AA2CODON, AMINOACIDS
+
+# index of amino acid of each codon (in CODONS order)
+CODON_AA = np.array([AMINOACIDS.index(CODON2AA[codon]) for codon in CODONS])
+# codon to amino acid indicator matrix (64 x 21)
+AA_MATRIX = (CODON_AA[:, None] == np.arange(len(AMINOACIDS))).astype(float)
+# zero codon pair frequency lead to error in logarithm calculations, it is changed to this value
+ZERO_PAIR_FREQUENCY = 0.001
+
+
+def _padded_index(groups: list) -> np.ndarray:
+    # index table of groups padded with -1
+    index = np.full((len(groups), max(len(group) for group in groups)), -1)
+    for g, group in enumerate(groups):
+        index[g, :len(group)] = group
+    return index
+
+
+# codons of each amino acid and codon pairs (flat indexes) of each amino acid pair in AA2CODON order: sums are added in
+# this order, so they are equal to sums of database tables built before and text tables are the same
+AA_INDEX = _padded_index([[CODONS.index(codon) for codon in AA2CODON[aa]] for aa in AMINOACIDS])
+AA_PAIR_INDEX = _padded_index([[CODONS.index(c1) * len(CODONS) + CODONS.index(c2)
+                                for c1 in AA2CODON[a1] for c2 in AA2CODON[a2]]
+                               for a1 in AMINOACIDS for a2 in AMINOACIDS])
+
+
+def calculate_tables(codon_frequencies: np.ndarray, codon_pair_frequencies: np.ndarray) -> np.ndarray:
+    """
+    Calculate all built data of organisms: fitness values, observed codon frequencies, Codon Pair Score (CPS) table and
+    observed codon pair frequencies table.
+
+    :param codon_frequencies: codon frequencies array (..., 64)
+    :param codon_pair_frequencies: codon pair frequencies array (..., 64, 64)
+    :return: array of built data records (TABLES_DTYPE) of shape (...)
+    """
+    codon_frequencies = np.asarray(codon_frequencies, dtype=float)
+    codon_pair_frequencies = np.asarray(codon_pair_frequencies, dtype=float)
+    tables = np.zeros(codon_frequencies.shape[:-1], dtype=TABLES_DTYPE)
+    tables["fv"] = calculate_fitness_values(codon_frequencies)
+    tables["ocf"] = calculate_observed_codon_frequencies(codon_frequencies)
+    tables["cps"] = calculate_cps(codon_frequencies, codon_pair_frequencies)
+    # zero codon pair frequencies are changed for observed codon pair frequencies too, as in database tables built
+    # before
+    tables["opf"] = calculate_observed_pair_frequencies(np.where(codon_pair_frequencies == 0, ZERO_PAIR_FREQUENCY,
+                                                                 codon_pair_frequencies))
+    return tables
+
+
+def calculate_fitness_values(codon_frequencies: np.ndarray) -> np.ndarray:
+    """
+    Calculate fitness values
+
+    :param codon_frequencies: codon frequencies array (..., 64)
+    :return: fitness values array (..., 64)
+    """
+    synonymous = np.where(AA_MATRIX.T > 0, codon_frequencies[..., None, :], -np.inf)
+    max_frequencies = synonymous.max(axis=-1)
+    return codon_frequencies / max_frequencies[..., CODON_AA]
+
+
+def calculate_cps(codon_frequencies: np.ndarray, codon_pair_frequencies: np.ndarray) -> np.ndarray:
+    """
+    Calculate Codon Pair Score (CPS) table that needed for calculating Codon Pair Bias (CPB) index.
+
+    :param codon_frequencies: codon frequencies array (..., 64)
+    :param codon_pair_frequencies: codon pair frequencies array (..., 64, 64)
+    :return: Codon Pair Score table (..., 64, 64)
+    """
+    aa_frequencies = _ordered_sums(codon_frequencies, AA_INDEX)[..., CODON_AA]
+    aa_pairs_frequencies = _calc_aa_pairs_frequencies(codon_pair_frequencies)
+
+    zeros = codon_pair_frequencies == 0
+    if zeros.any():
+        print(f"Warning! {np.count_nonzero(zeros)} zero codon pair frequencies. Changed to {ZERO_PAIR_FREQUENCY}")
+        codon_pair_frequencies = np.where(zeros, ZERO_PAIR_FREQUENCY, codon_pair_frequencies)
+
+    log_aa = np.log(aa_frequencies)
+    log_codon = np.log(codon_frequencies)
+    return np.log(codon_pair_frequencies) + log_aa[..., :, None] + log_aa[..., None, :] - log_codon[..., :, None] - \
+        log_codon[..., None, :] - np.log(aa_pairs_frequencies)
+
+
+def calculate_observed_codon_frequencies(codon_frequencies: np.ndarray) -> np.ndarray:
+    """
+    Calculate observed frequencies
+    :param codon_frequencies: codon frequencies array (..., 64)
+    :return: observed frequencies array (..., 64)
+    """
+    aa_frequencies = _ordered_sums(codon_frequencies, AA_INDEX)
+    return codon_frequencies / aa_frequencies[..., CODON_AA]
+
+
+def calculate_observed_pair_frequencies(codon_pair_frequencies: np.ndarray) -> np.ndarray:
+    """
+    Calculate observed codon pair frequencies
+    :param codon_pair_frequencies: codon pair frequencies array (..., 64, 64)
+    :return: observed codon pair frequencies table (..., 64, 64)
+    """
+    return codon_pair_frequencies / _calc_aa_pairs_frequencies(codon_pair_frequencies)
+
+
+def frequencies_array(codon_frequencies: dict) -> np.ndarray:
+    """
+    :param codon_frequencies: codon frequencies dictionary
+    :return: codon frequencies array (64)
+    """
+    return np.array([codon_frequencies[codon] for codon in CODONS], dtype=float)
+
+
+def pair_frequencies_array(codon_pair_frequencies: dict) -> np.ndarray:
+    """
+    :param codon_pair_frequencies: codon pair frequencies dictionary
+    :return: codon pair frequencies array (64, 64)
+    """
+    return np.array([[codon_pair_frequencies[c1 + c2] for c2 in CODONS] for c1 in CODONS], dtype=float)
+
+
+def line_dict(values: np.ndarray, digits: int = None) -> dict:
+    """
+    :param values: array (64)
+    :param digits: number of decimal digits to round values to (None for full precision)
+    :return: dictionary codon: value
+    """
+    return {codon: _round(float(value), digits) for codon, value in zip(CODONS, values)}
+
+
+def matrix_dict(values: np.ndarray, digits: int = None) -> dict:
+    """
+    :param values: array (64, 64)
+    :param digits: number of decimal digits to round values to (None for full precision)
+    :return: dictionary codon: codon: value
+    """
+    return {c1: line_dict(row, digits) for c1, row in zip(CODONS, values)}
+
+
+def _calc_aa_pairs_frequencies(codon_pair_frequencies: np.ndarray) -> np.ndarray:
+    """
+    Calculate amino acid pairs frequencies based on codon pairs frequencies.
+
+    :param codon_pair_frequencies: codon pair frequencies array (..., 64, 64)
+    :return: amino acid pair frequency of each codon pair (..., 64, 64)
+    """
+    flat = codon_pair_frequencies.reshape(codon_pair_frequencies.shape[:-2] + (-1,))
+    aa_pair_frequencies = _ordered_sums(flat, AA_PAIR_INDEX)
+    aa_pair = CODON_AA[:, None] * len(AMINOACIDS) + CODON_AA[None, :]
+    return aa_pair_frequencies[..., aa_pair]
+
+
+def _ordered_sums(values: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """
+    Sums of groups of values, terms are added one by one in order of index.
+
+    :param values: array (..., n)
+    :param index: index table of groups padded with -1 (groups x max group size)
+    :return: sums array (..., groups)
+    """
+    sums = np.zeros(values.shape[:-1] + (len(index),))
+    for k in range(index.shape[1]):
+        groups = np.flatnonzero(index[:, k] >= 0)
+        sums[..., groups] += values[..., index[groups, k]]
+    return sums
+
+
+def _round(value: float, digits: int) -> float:
+    return value if digits is None else round(value, digits)
@@ -0,0 +1,166 @@
+import time
+
+import numpy as np
+
+from code.formulation import EQUAL, LESS_EQUAL, GREATER_EQUAL, Formulation
+
+# solver backends of models in matrix form: "gurobi" (Gurobi, needs licence) or "highs" (HiGHS of SciPy, open-source)
+BACKENDS = ("gurobi", "highs")
+# status codes of Gurobi (recorded in metrics for all backends)
+OPTIMAL = 2
+INFEASIBLE = 3
+UNBOUNDED = 5
+TIME_LIMIT = 9
+INTERRUPTED = 11
+# status codes of scipy.optimize.milp and corresponding status codes of Gurobi
+HIGHS_STATUS = {0: OPTIMAL, 1: TIME_LIMIT, 2: INFEASIBLE, 3: UNBOUNDED, 4: INTERRUPTED}
+STATUS_NAMES = {OPTIMAL: "optimal", INFEASIBLE: "infeasible", UNBOUNDED: "unbounded", TIME_LIMIT: "time_limit",
+                INTERRUPTED: "interrupted"}
+
+
+def solve_formulation(formulation: Formulation, backend: str = "gurobi", threads: int = 0, start: np.ndarray = None,
+                      names: bool = False, env=None, time_limit: float = None, mip_gap: float = None,
+                      callback=None) -> (np.ndarray, float):
+    """
+    Solve model in matrix form with selected backend. Solver library is imported only for selected backend, so
+    backends that are not installed (or have no licence) do not prevent other backends from running. Model dimensions
+    and solver statistics are recorded in metrics of formulation. When time limit is reached or solve is stopped by
+    callback the best solution found is returned.
+
+    :param formulation: model in matrix form
+    :param backend: "gurobi" or "highs"
+    :param threads: number of solver threads (0 lets solver choose, HiGHS of SciPy ignores it)
+    :param start: codon indexes of MIP start (HiGHS of SciPy ignores it)
+    :param names: name variables and constraints of Gurobi model (for debugging)
+    :param env: Gurobi environment (default environment if None)
+    :param time_limit: time limit of solve in seconds (no limit if None)
+    :param mip_gap: relative gap between objective and best bound to stop solve (solver default if None)
+    :param callback: function of incumbent objective, best bound (None if unknown) and solve time (objective and bound
+    in units of objective function) that is called for every new incumbent, solve is stopped if it returns True
+    (HiGHS of SciPy calls it once for the final solution)
+    :return: values of variables and model objective value (None, None if there is no solution)
+    """
+    if backend == "gurobi":
+        return _solve_gurobi(formulation, threads, start, names, env, time_limit, mip_gap, callback)
+    elif backend == "highs":
+        return _solve_highs(formulation, time_limit, mip_gap, callback)
+    raise Exception(f"Unknown backend {backend}")
+
+
+def optimize_gurobi(model, threads: int = 0, time_limit: float = None, mip_gap: float = None, callback=None,
+                    scale: float = 1.0):
+    """
+    Optimize Gurobi model with limits and progress callback (see solve_formulation).
+
+    :param model: Gurobi model
+    :param threads: number of solver threads (0 lets Gurobi choose)
+    :param time_limit: time limit of solve in seconds (no limit if None)
+    :param mip_gap: relative gap between objective and best bound to stop solve (Gurobi default if None)
+    :param callback: function of incumbent objective, best bound and solve time, solve is stopped if it returns True
+    :param scale: scale of objective (objective function value is model objective multiplied by scale)
+    """
+    from gurobipy import GRB
+
+    model.Params.Threads = threads
+    if time_limit is not None:
+        model.Params.TimeLimit = time_limit
+    if mip_gap is not None:
+        model.Params.MIPGap = mip_gap
+    if callback is None:
+        model.optimize()
+        return
+
+    def progress(model, where):
+        if where == GRB.Callback.MIPSOL:
+            objective = model.cbGet(GRB.Callback.MIPSOL_OBJ) * scale
+            bound = model.cbGet(GRB.Callback.MIPSOL_OBJBND)
+            bound = bound * scale if abs(bound) < GRB.INFINITY else None
+            if callback(objective, bound, model.cbGet(GRB.Callback.RUNTIME)):
+                model.terminate()
+
+    model.optimize(progress)
+
+
+def status_name(status: int) -> str:
+    """
+    :param status: status code of Gurobi
+    :return: name of status ("optimal", "time_limit", ...)
+    """
+    return STATUS_NAMES.get(status, f"status {status}")
+
+
+def _solve_gurobi(formulation: Formulation, threads: int, start: np.ndarray, names: bool, env, time_limit: float,
+                  mip_gap: float, callback) -> (np.ndarray, float):
+    from gurobipy import GRB
+
+    metrics = formulation.metrics
+    model, v = _create_matrix_model(formulation, names, env)
+    if start is not None:
+        # continuous variables are completed by Gurobi
+        values = np.full(formulation.n, GRB.UNDEFINED)
+        index = formulation.index
+        values[:index.nX], values[index.nX:index.nX + index.nZ] = index.start(start)
+        v.Start = values
+    model.update()
+    metrics.lap("model")
+    optimize_gurobi(model, threads, time_limit, mip_gap, callback, formulation.scale)
+    metrics.lap("solve")
+    metrics.solved(model, formulation.scale)
+    values, objective = (v.X, model.ObjVal) if model.SolCount else (None, None)
+    model.dispose()
+    return values, objective
+
+
+def _create_matrix_model(formulation: Formulation, names: bool = False, env=None):
+    # Build the Model from matrices, all variables and constraints are added in bulk
+    from gurobipy import GRB, Model
+    model = Model("Codon Optimization", env=env)
+    v = model.addMVar(formulation.n, lb=formulation.lb, ub=formulation.ub, vtype=formulation.vtype,
+                      name=formulation.variable_names() if names else "")
+    model.addMConstr(formulation.A, v, formulation.senses, formulation.rhs_vector,
+                     name=formulation.constraint_names() if names else "")
+    model.setObjective(formulation.c @ v, GRB.MAXIMIZE if formulation.maximize else GRB.MINIMIZE)
+    return model, v
+
+
+def _solve_highs(formulation: Formulation, time_limit: float, mip_gap: float, callback) -> (np.ndarray, float):
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    metrics = formulation.metrics
+    A = formulation.A
+    senses, rhs = formulation.senses, formulation.rhs_vector
+    lower = np.where((senses == EQUAL) | (senses == GREATER_EQUAL), rhs, -np.inf)
+    upper = np.where((senses == EQUAL) | (senses == LESS_EQUAL), rhs, np.inf)
+    # HiGHS minimizes
+    sign = -1.0 if formulation.maximize else 1.0
+    integrality = (formulation.vtype != "C").astype(np.uint8)
+    options = {}
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if mip_gap is not None:
+        options["mip_rel_gap"] = mip_gap
+    metrics.lap("model")
+
+    start_time = time.perf_counter()
+    result = milp(sign * formulation.c, integrality=integrality, bounds=Bounds(formulation.lb, formulation.ub),
+                  constraints=LinearConstraint(A, lower, upper), options=options)
+    runtime = time.perf_counter() - start_time
+    metrics.lap("solve")
+    metrics.model["variables"] = formulation.n
+    metrics.model["binaries"] = int(integrality.sum())
+    metrics.model["constraints"] = A.shape[0]
+    metrics.model["nonzeros"] = A.nnz
+    metrics.model["status"] = HIGHS_STATUS.get(result.status, INTERRUPTED)
+    metrics.model["runtime"] = runtime
+    metrics.model["nodes"] = getattr(result, "mip_node_count", None)
+    bound = getattr(result, "mip_dual_bound", None)
+    if bound is not None and np.isfinite(bound):
+        metrics.model["bound"] = sign * bound * formulation.scale
+    if result.x is None:
+        return None, None
+    if getattr(result, "mip_gap", None) is not None and np.isfinite(result.mip_gap):
+        metrics.model["mip_gap"] = result.mip_gap
+    objective = sign * result.fun
+    if callback is not None:
+        callback(objective * formulation.scale, metrics.model.get("bound"), runtime)
+    return result.x, objective
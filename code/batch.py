@@ -0,0 +1,198 @@
+import os
+from collections import deque, OrderedDict
+from contextlib import nullcontext
+from functools import partial
+from multiprocessing import Pool
+
+from code.cache import ResultCache, is_final
+
+# number of sequences submitted to pool ahead for each worker
+MAX_PENDING_PER_WORKER = 2
+# number of recent results kept in memory for duplicate sequences
+MAX_RECENT_RESULTS = 1024
+# number of sequences optimized together by engines that optimize batches of sequences ("anneal")
+CHUNK_SIZE = 64
+
+# optimization settings of worker process (organism tables are passed once per worker)
+_worker = {}
+
+
+def get_optimization(method: str, engine: str = "mip"):
+    """
+    Select optimization function. Optimization libraries are imported only for selected engine.
+
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param engine: "mip" (Gurobi), "windowed" (Gurobi, long protein by windows), "dp" (dynamic programming,
+    MaxCPBstCAI only) or "anneal" (simulated annealing)
+    :return: optimization function
+    """
+    if method == "MaxCPBstCAI" and engine == "mip":
+        from code.optimizer import max_cpb_st_cai_optimization
+        return max_cpb_st_cai_optimization
+    elif method == "MaxCPBstCAI" and engine == "windowed":
+        from code.windowed import max_cpb_st_cai_windowed
+        return max_cpb_st_cai_windowed
+    elif method == "MaxCPBstCAI" and engine == "dp":
+        from code.dp import max_cpb_st_cai_dp
+        return max_cpb_st_cai_dp
+    elif method == "MaxCPBstCAI" and engine == "anneal":
+        from code.anneal import max_cpb_st_cai_anneal
+        return max_cpb_st_cai_anneal
+    elif method == "MinRCPBstRCB" and engine == "mip":
+        from code.optimizer import min_rcpb_st_rcb_optimization
+        return min_rcpb_st_rcb_optimization
+    elif method == "MinRCPBstRCB" and engine == "windowed":
+        from code.windowed import min_rcpb_st_rcb_windowed
+        return min_rcpb_st_rcb_windowed
+    elif method == "MinRCPBstRCB" and engine == "anneal":
+        from code.anneal import min_rcpb_st_rcb_anneal
+        return min_rcpb_st_rcb_anneal
+    elif method in ("MaxCPBstCAI", "MinRCPBstRCB"):
+        raise Exception(f"Unknown engine {engine} for method {method}")
+    else:
+        raise Exception(f"Unknown method {method}")
+
+
+def get_batch_optimization(method: str, engine: str):
+    """
+    Select function that optimizes list of sequences together.
+
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param engine: optimization engine
+    :return: optimization function (list of protein sequences instead of sequence, list of results) or None if engine
+    optimizes sequences one by one
+    """
+    if engine == "anneal":
+        from code.anneal import anneal_batch
+        return partial(anneal_batch, method)
+    return None
+
+
+def optimize_batch(records, line_data: list, matrix_data: list, method: str, threshold: float, engine: str = "mip",
+                   settings: dict = None, workers: int = 1, cores: int = None, cache: ResultCache = None):
+    """
+    Optimize sequences in worker processes. Results are yielded in the order of input sequences as soon as all previous
+    results are ready. Records are read lazily: only few sequences per worker are submitted ahead, so memory does not
+    depend on the number of sequences. Cores are split between concurrent solves: each Gurobi solve gets
+    cores / workers threads (windowed solve runs cores / workers windows in parallel). Duplicate sequences are
+    optimized once, cached results are not optimized again. Engines that optimize batches of sequences ("anneal") get
+    chunks of CHUNK_SIZE new sequences.
+
+    :param records: (record id, protein sequence) pairs (any iterable)
+    :param line_data: fitness values or observed codon frequencies
+    :param matrix_data: Codon Pair Score table or observed codon pair frequencies
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param threshold: threshold for CAI or RCB
+    :param engine: optimization engine ("mip", "windowed", "dp" or "anneal")
+    :param settings: additional keyword arguments for optimization function
+    :param workers: number of worker processes
+    :param cores: number of cores for all workers (all cores of host by default)
+    :param cache: persistent cache of results
+    :return: generator of (record id, optimization result)
+    """
+    settings = dict(settings or {})
+    cores = cores or os.cpu_count()
+    if engine in ("mip", "windowed"):
+        settings["threads"] = max(1, cores // workers)
+    # sequences of chunk are optimized together by one call
+    chunk_size = CHUNK_SIZE if get_batch_optimization(method, engine) is not None else 1
+    initargs = (method, engine, line_data, matrix_data, threshold, settings)
+    # results of recent sequences for duplicates in batch
+    recent = OrderedDict()
+
+    def lookup(key):
+        if key in recent:
+            recent.move_to_end(key)
+            return recent[key]
+        if cache is not None:
+            return cache.get(key)
+        return None
+
+    def store(key, result):
+        recent[key] = result
+        if len(recent) > MAX_RECENT_RESULTS:
+            recent.popitem(last=False)
+        # results of solves stopped by limit and sequences without solution are not stored for later runs
+        if cache is not None and is_final(result):
+            cache.put(key, result)
+
+    if workers == 1:
+        _init_worker(*initargs)
+        pool = None
+        # results are yielded as soon as chunk is optimized
+        max_pending = chunk_size
+    else:
+        pool = Pool(workers, initializer=_init_worker, initargs=initargs)
+        max_pending = MAX_PENDING_PER_WORKER * workers * chunk_size
+
+    with pool or nullcontext():
+        pending = deque()
+        # sequence key: [result of its chunk (None until chunk is submitted), index of sequence in chunk]
+        in_flight = {}
+        # (sequence, its in flight entry) not submitted yet
+        chunk = []
+
+        def submit():
+            seqs = [seq for seq, _ in chunk]
+            if pool is None:
+                result = _Ready(_optimize_chunk(seqs))
+            else:
+                result = pool.apply_async(_optimize_chunk, (seqs,))
+            for _, entry in chunk:
+                entry[0] = result
+            chunk.clear()
+
+        def finish():
+            record_id, key, result = pending.popleft()
+            if not isinstance(result, str):
+                if result[0] is None:
+                    submit()
+                chunk_result, index = result
+                result = chunk_result.get()[index]
+                if in_flight.pop(key, None) is not None:
+                    store(key, result)
+            return record_id, result
+
+        for record_id, seq in records:
+            key = cache.key(seq) if cache is not None else seq
+            result = in_flight.get(key) or lookup(key)
+            if result is None:
+                result = in_flight[key] = [None, len(chunk)]
+                chunk.append((seq, result))
+                if len(chunk) == chunk_size:
+                    submit()
+            pending.append((record_id, key, result))
+            if len(pending) >= max_pending:
+                yield finish()
+        while pending:
+            yield finish()
+
+
+class _Ready:
+    # results of chunk optimized in the calling process (like result of pool.apply_async)
+    def __init__(self, results: list):
+        self.results = results
+
+    def get(self) -> list:
+        return self.results
+
+
+def _init_worker(method: str, engine: str, line_data: list, matrix_data: list, threshold: float, settings: dict):
+    _worker["run_optimization"] = get_optimization(method, engine)
+    _worker["run_batch_optimization"] = get_batch_optimization(method, engine)
+    _worker["line_data"] = line_data
+    _worker["matrix_data"] = matrix_data
+    _worker["threshold"] = threshold
+    _worker["settings"] = settings
+
+
+def _optimize(seq: str) -> str:
+    return _worker["run_optimization"](seq, _worker["line_data"], _worker["matrix_data"], _worker["threshold"],
+                                       **_worker["settings"])
+
+
+def _optimize_chunk(seqs: list) -> list:
+    if _worker["run_batch_optimization"] is not None:
+        return _worker["run_batch_optimization"](seqs, _worker["line_data"], _worker["matrix_data"],
+                                                 _worker["threshold"], **_worker["settings"])
+    return [_optimize(seq) for seq in seqs]
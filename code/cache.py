@@ -0,0 +1,133 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+from config import DB_DIR, BUILT_TABLES
+from code.checkpoint import settings_key
+from code.extractor import built_data_files
+from code.result import NoSolution
+
+
+def built_data_digest(organism: str, method: str, db_path: str = DB_DIR) -> str:
+    """
+    Digest of built data files used by optimization method. Rebuilding of organism changes the digest.
+
+    :param organism: organism (name of directory with built data)
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param db_path: path do database directory
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    filenames = list(built_data_files(db_path, organism, method))
+    tables = os.path.join(db_path, organism, BUILT_TABLES)
+    if os.path.exists(tables):
+        filenames.append(tables)
+    for filename in filenames:
+        if os.path.exists(filename):
+            with open(filename, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def is_final(result) -> bool:
+    """
+    Result does not depend on time: sequence has solution and solve was not stopped by limit (solver status is
+    optimal, results of engines without solver status are final).
+
+    :param result: optimization result
+    :return: True if result can be cached
+    """
+    return not isinstance(result, NoSolution) and getattr(result, "status", None) in (None, "optimal")
+
+
+class ResultCache:
+    """
+    Persistent cache of optimization results. Results are stored in files named by key (hash of sequence, digest of
+    organism tables and optimization parameters and settings) in cache directory. When total size of results exceeds
+    the limit least recently used results are removed.
+    """
+
+    def __init__(self, directory: str, organism: str, method: str, threshold: float, engine: str,
+                 settings: dict = None, max_size: int = 1024 ** 3):
+        """
+        :param directory: cache directory
+        :param organism: organism (name of directory with built data)
+        :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+        :param threshold: threshold for CAI or RCB
+        :param engine: optimization engine
+        :param settings: keyword arguments of optimization function (time limit, MIP gap, linking, backend, ...)
+        :param max_size: max total size of results in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._params = (f"{built_data_digest(organism, method)}\t{method}\t{threshold!r}\t{engine}\t"
+                        f"{settings_key(settings)}")
+
+        os.makedirs(directory, exist_ok=True)
+        # results ordered from least to most recently used
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith(".txt"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        self._sizes = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.size = sum(self._sizes.values())
+        self._evict(0)
+
+    def key(self, seq: str) -> str:
+        return hashlib.sha256(f"{self._params}\t{seq}".encode()).hexdigest()
+
+    def get(self, key: str):
+        """
+        Get cached result.
+
+        :param key: result key
+        :return: optimization result or None
+        """
+        if key not in self._sizes:
+            self.misses += 1
+            return None
+        filename = self._filename(key)
+        try:
+            with open(filename, "r") as f:
+                result = f.read()
+            os.utime(filename)
+        except OSError:
+            # removed by another process
+            self.size -= self._sizes.pop(key)
+            self.misses += 1
+            return None
+        self._sizes.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: str):
+        """
+        Store result and remove least recently used results if cache is too large.
+
+        :param key: result key
+        :param result: optimization result
+        """
+        filename = self._filename(key)
+        with open(filename + ".tmp", "w") as f:
+            f.write(result)
+        os.replace(filename + ".tmp", filename)
+
+        self.size += len(result.encode()) - self._sizes.pop(key, 0)
+        self._sizes[key] = len(result.encode())
+        self._evict(1)
+
+    def _evict(self, keep: int):
+        # remove least recently used results, but keep at least specified number of the most recent
+        while self.size > self.max_size and len(self._sizes) > keep:
+            old_key, old_size = self._sizes.popitem(last=False)
+            self.size -= old_size
+            try:
+                os.remove(self._filename(old_key))
+            except OSError:
+                pass
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".txt")
@@ -2,11 +2,12 @@ import math
 from config import CODONS, CODON2AA, AA2CODON, AMINOACIDS
 
 
-def calculate_fitness_values(codon_frequencies: dict) -> dict:
+def calculate_fitness_values(codon_frequencies: dict, digits: int = 2) -> dict:
     """
     Calculate fitness values
 
     :param codon_frequencies: codon frequencies dictionary
+    :param digits: number of decimal digits to round values to (None for full precision)
     :return: fitness values dictionary
     """
     max_frequencies = {}
@@ -16,7 +17,7 @@ def calculate_fitness_values(codon_frequencies: dict) -> dict:
     fitness_values = {}
     for codon, frequency in codon_frequencies.items():
         aa = CODON2AA[codon]
-        fitness_values[codon] = round(frequency / max_frequencies[aa], 2)
+        fitness_values[codon] = _round(frequency / max_frequencies[aa], digits)
     return fitness_values
 
 
@@ -46,10 +47,11 @@ def calculate_cps(codon_frequencies: dict, codon_pair_frequencies: dict) -> dict
     return cps
 
 
-def calculate_observed_codon_frequencies(codon_frequencies: dict) -> dict:
+def calculate_observed_codon_frequencies(codon_frequencies: dict, digits: int = 2) -> dict:
     """
     Calculate observed frequencies
     :param codon_frequencies: codon frequencies dictionary
+    :param digits: number of decimal digits to round values to (None for full precision)
     :return: observed frequencies dictionary
     """
     aa_frequencies = {}
@@ -59,14 +61,15 @@ def calculate_observed_codon_frequencies(codon_frequencies: dict) -> dict:
     observed_frequencies = {}
     for codon, frequency in codon_frequencies.items():
         aa = CODON2AA[codon]
-        observed_frequencies[codon] = round(frequency / aa_frequencies[aa], 2)
+        observed_frequencies[codon] = _round(frequency / aa_frequencies[aa], digits)
     return observed_frequencies
 
 
-def calculate_observed_pair_frequencies(codon_pair_frequencies: dict):
+def calculate_observed_pair_frequencies(codon_pair_frequencies: dict, digits: int = 2):
     """
     Calculate observed codon pair frequencies
     :param codon_pair_frequencies: codon pair frequencies dictionary
+    :param digits: number of decimal digits to round values to (None for full precision)
     :return: observed codon pair frequencies table
     """
     aa_pair_frequencies = _calc_aa_pairs_frequencies(codon_pair_frequencies)
@@ -75,7 +78,8 @@ def calculate_observed_pair_frequencies(codon_pair_frequencies: dict):
     for c1 in CODONS:
         for c2 in CODONS:
             aa_pair = CODON2AA[c1] + CODON2AA[c2]
-            observed_pair_frequencies[c1][c2] = round(codon_pair_frequencies[c1+c2] / aa_pair_frequencies[aa_pair], 2)
+            observed_pair_frequencies[c1][c2] = _round(codon_pair_frequencies[c1+c2] / aa_pair_frequencies[aa_pair],
+                                                       digits)
     return observed_pair_frequencies
 
 
@@ -103,8 +107,13 @@ def _remove_zeros(codon_pair_frequencies: dict) -> dict:
     :param codon_pair_frequencies: codon pair frequencies
     :return: new codon pair frequencies
     """
-    for key, value in codon_pair_frequencies.items():
-        if value == 0:
-            print(f"Warning! Zero codon pair frequency for {key}. Changed to 0.001")
-            codon_pair_frequencies[key] = 0.001
+    zeros = [key for key, value in codon_pair_frequencies.items() if value == 0]
+    if zeros:
+        print(f"Warning! {len(zeros)} zero codon pair frequencies. Changed to 0.001")
+    for key in zeros:
+        codon_pair_frequencies[key] = 0.001
     return codon_pair_frequencies
+
+
+def _round(value: float, digits: int) -> float:
+    return value if digits is None else round(value, digits)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+from collections import deque
+from os import path
+
+# settings of optimization function that do not change its result
+RESULT_INDEPENDENT_SETTINGS = ("threads", "names")
+
+
+def settings_key(settings: dict) -> str:
+    """
+    Normalized settings of optimization: settings that change result, sorted by name.
+
+    :param settings: keyword arguments of optimization function
+    :return: JSON string
+    """
+    return json.dumps({key: value for key, value in (settings or {}).items()
+                       if key not in RESULT_INDEPENDENT_SETTINGS}, sort_keys=True, default=str)
+
+
+def checkpoint_key(seq: str, organism: str, method: str, threshold: float, engine: str = "mip",
+                   settings: dict = None) -> str:
+    """
+    Key of optimization in checkpoint manifest: hash of sequence and optimization parameters.
+
+    :param seq: protein sequence
+    :param organism: organism (name of directory with built data)
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param threshold: threshold for CAI or RCB
+    :param engine: optimization engine
+    :param settings: keyword arguments of optimization function
+    :return: hex digest
+    """
+    return hashlib.sha256(f"{organism}\t{method}\t{threshold!r}\t{engine}\t{settings_key(settings)}\t{seq}"
+                          .encode()).hexdigest()
+
+
+class Manifest:
+    """
+    Checkpoint manifest of batch run. Each finished sequence is recorded as JSON line with record id, checkpoint key
+    and sizes of output files right after its result is written, so the run can be resumed after crash: finished
+    sequences are skipped and output written after the last recorded sequence is removed.
+    """
+
+    def __init__(self, filename: str, organism: str, method: str, threshold: float, engine: str = "mip",
+                 settings: dict = None, resume: bool = False):
+        """
+        :param filename: path to manifest file
+        :param organism: organism (name of directory with built data)
+        :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+        :param threshold: threshold for CAI or RCB
+        :param engine: optimization engine
+        :param settings: keyword arguments of optimization function
+        :param resume: keep finished sequences of previous run (otherwise manifest is cleared)
+        """
+        self.organism = organism
+        self.method = method
+        self.threshold = threshold
+        self.engine = engine
+        self.settings = settings
+        self.resume = resume
+        self.finished = set()
+        self._keys = deque()
+        # output files of run and their sizes after the last finished sequence of previous run
+        self._outputs = []
+        self._offsets = []
+
+        if resume and path.exists(filename):
+            with open(filename, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last line is incomplete if run was killed while writing it
+                        continue
+                    self.finished.add((entry["id"], entry["key"]))
+                    # manifests of previous versions have no sizes of output files
+                    self._offsets = entry.get("offsets")
+        self._file = open(filename, "a" if resume else "w")
+
+    def open(self, filename: str):
+        """
+        Open output file of run. When run is resumed, output written after the last finished sequence (result that
+        was written right before crash, but was not recorded in manifest) is removed, so it is not duplicated.
+
+        :param filename: path to output file
+        :return: file opened for writing
+        """
+        k = len(self._outputs)
+        if not self.resume or not self.finished:
+            # nothing is finished, the run starts again
+            f = open(filename, "w")
+        else:
+            f = open(filename, "a")
+            if self._offsets is not None and k < len(self._offsets) and self._offsets[k] < f.tell():
+                f.seek(self._offsets[k])
+                f.truncate()
+        self._outputs.append(f)
+        return f
+
+    def unfinished(self, records):
+        """
+        Skip finished records. Remaining records must be finished in the same order.
+
+        :param records: (record id, protein sequence) pairs
+        :return: generator of unfinished (record id, protein sequence)
+        """
+        for record_id, seq in records:
+            key = checkpoint_key(seq, self.organism, self.method, self.threshold, self.engine, self.settings)
+            if (record_id, key) not in self.finished:
+                self._keys.append(key)
+                yield record_id, seq
+
+    def finish(self, record_id: str):
+        """
+        Record the next unfinished record as finished. Its result must be written to output files.
+
+        :param record_id: record id
+        """
+        key = self._keys.popleft()
+        self.finished.add((record_id, key))
+        offsets = []
+        for f in self._outputs:
+            f.flush()
+            offsets.append(f.tell())
+        self._file.write(json.dumps({"id": record_id, "key": key, "offsets": offsets}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        for f in self._outputs:
+            f.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,354 @@
+import math
+
+import numpy as np
+
+from code.result import Metrics, NoSolution, OptimizationResult
+from config import CODONS, CODON2AA
+
+
+# number of Lagrange multipliers evaluated together on each refinement pass
+LAMBDA_GRID_SIZE = 16
+# number of refinement passes of Lagrange multiplier bracket
+LAMBDA_PASSES = 6
+# the biggest multiplier, for that fitness values dominate over any Codon Pair Score
+LAMBDA_MAX = 1e12
+# the max number of labels of label search (all positions together), bounds its time and memory
+LABEL_LIMIT = 1_000_000
+# the max gap between Lagrangian bound and incumbent (sums of Codon Pair Scores) for that label search is run
+LABEL_SEARCH_GAP = 2.0
+# tolerance for comparison of scores and log fitness sums
+EPS = 1e-9
+
+
+def max_cpb_st_cai_dp(protein_seq: str, fitness_values: list, cps: list, threshold: float) -> OptimizationResult:
+    """
+    Take amino acid sequence of protein as input and optimize DNA sequence without MIP solver. Solves the same
+    problem as max_cpb_st_cai_optimization: maximizes Codon Pair Bias (CPB) index when the CAI (Codon Adaptation
+    Index) does not fall below the specified value (threshold). The objective is a chain sum of codon pair scores,
+    so for fixed Lagrange multiplier of CAI constraint the problem is solved exactly by Viterbi-style dynamic
+    programming in O(N*36). The multiplier is found by bracketing: the smallest multiplier that gives sequence with
+    CAI above threshold is used, its Lagrangian value is the upper bound of objective. If CAI constraint is active,
+    remaining duality gap is closed by label search bounded by the Lagrangian solution, so the result is optimal as
+    for MIP solver. Label search runs only if the gap is at most LABEL_SEARCH_GAP and stops after LABEL_LIMIT labels,
+    otherwise the improved Lagrangian solution is the result (status "gap_limit" or "label_limit", bound and gap are
+    recorded as for MIP solver).
+
+    :param protein_seq: sequence of protein for optimization
+    :param fitness_values: fitness values list
+    :param cps: Codon Pair Score (CPS) table
+    :param threshold: the min value for CAI
+    :return: string with DNA sequence, optimized for input protein (with objective value, metrics, status, bound and
+    gap as attributes), NoSolution if protein has unknown amino acid or CAI threshold can not be reached
+    """
+    metrics = Metrics()
+    unknown = _unknown_aminoacids(protein_seq)
+    if unknown:
+        return NoSolution(f"unknown amino acid {', '.join(unknown)}", metrics)
+    candidates = _create_candidates(protein_seq)
+    N = len(candidates)
+
+    log_fitness_values = _log_fitness_values(fitness_values)
+    cps = np.asarray(cps, dtype=np.double)
+    blocks = _create_blocks(protein_seq, candidates, cps)
+    minCAI = N * math.log(threshold)
+    metrics.lap("blocks")
+    if sum(log_fitness_values[c].max() for c in candidates) < minCAI - EPS:
+        return NoSolution(f"CAI threshold {threshold} can not be reached", metrics, "infeasible")
+
+    codons, multiplier, bound = _solve_lagrangian(candidates, blocks, log_fitness_values, minCAI)
+    metrics.lap("lagrangian")
+    status = "optimal"
+    # CPB of protein without codon pairs is zero for all codons
+    if multiplier > 0 and N > 1:
+        codons = _improve(candidates, blocks, log_fitness_values, minCAI, codons)
+        metrics.lap("improve")
+        incumbent = _chain_scores(candidates, blocks, codons[None, :])[0]
+        if bound - incumbent <= LABEL_SEARCH_GAP:
+            improved, complete = _label_search(candidates, blocks, log_fitness_values, minCAI, multiplier, incumbent)
+            metrics.lap("label_search")
+            if improved is not None:
+                codons = improved
+            if not complete:
+                status = "label_limit"
+        else:
+            status = "gap_limit"
+
+    objValue = _cpb(codons, cps)
+    if status == "optimal":
+        bound = objValue
+    else:
+        bound = bound / (N - 1)
+        metrics.model["bound"] = bound
+        metrics.model["mip_gap"] = abs(bound - objValue) / abs(objValue) if objValue else math.inf
+    ans = "".join(CODONS[c] for c in codons)
+    metrics.lap("solution")
+    return OptimizationResult(objValue, ans, metrics, status, bound, metrics.model.get("mip_gap", 0.0))
+
+
+def _solve_lagrangian(candidates: list, blocks: list, log_fitness_values, min_cai: float):
+    """
+    Find the best codons set for Lagrangian relaxation of CAI constraint. CAI threshold must be reachable.
+
+    :param candidates: codon indexes available on each position
+    :param blocks: Codon Pair Score submatrices for each pair of adjacent positions
+    :param log_fitness_values: logarithms of fitness values (64 values)
+    :param min_cai: min sum of logarithms of fitness values
+    :return: the best feasible codon indexes for each position, the multiplier with the lowest Lagrangian bound and
+    the bound (sum of codon pair scores)
+    """
+    def solve(lambdas):
+        paths = _viterbi(candidates, blocks, log_fitness_values, lambdas)
+        log_cai = log_fitness_values[paths].sum(axis=1)
+        cpb = _chain_scores(candidates, blocks, paths)
+        with np.errstate(invalid="ignore"):
+            dual = cpb + lambdas * (log_cai - min_cai)
+        return paths, log_cai >= min_cai - EPS, cpb, dual
+
+    # the CAI constraint could be inactive
+    paths, feasible, cpb, _ = solve(np.zeros(1))
+    if feasible[0]:
+        return paths[0], 0.0, cpb[0]
+
+    lambdas = np.concatenate((np.geomspace(1e-4, 1e4, LAMBDA_GRID_SIZE - 1), [LAMBDA_MAX]))
+    lo, hi, best, best_cpb, multiplier, best_dual = 0.0, None, None, -np.inf, None, np.inf
+    for _ in range(LAMBDA_PASSES):
+        paths, feasible, cpb, dual = solve(lambdas)
+        for i in np.flatnonzero(feasible):
+            if cpb[i] > best_cpb:
+                best, best_cpb = paths[i], cpb[i]
+        if dual.min() < best_dual:
+            multiplier, best_dual = lambdas[dual.argmin()], dual.min()
+        if not feasible.any():
+            lo = lambdas[-1]
+        else:
+            first = np.flatnonzero(feasible)[0]
+            if first > 0:
+                lo = lambdas[first - 1]
+            hi = lambdas[first]
+        lambdas = np.linspace(lo, hi, LAMBDA_GRID_SIZE + 2)[1:-1]
+    return best, multiplier, best_dual
+
+
+def _improve(candidates: list, blocks: list, log_fitness_values, min_cai: float, path: np.ndarray) -> np.ndarray:
+    """
+    Improve feasible solution by single codon changes that increase sum of codon pair scores and keep CAI above
+    threshold. Better incumbent makes label search faster.
+
+    :param candidates: codon indexes available on each position
+    :param blocks: Codon Pair Score submatrices for each pair of adjacent positions
+    :param log_fitness_values: logarithms of fitness values (64 values)
+    :param min_cai: min sum of logarithms of fitness values
+    :param path: feasible codon indexes for each position
+    :return: improved codon indexes for each position
+    """
+    N = len(candidates)
+    path = path.copy()
+    local = [int(_local(candidates, i, path[i:i + 1])[0]) for i in range(N)]
+    slack = log_fitness_values[path].sum() - min_cai
+    improved = True
+    while improved:
+        improved = False
+        for i in range(N):
+            fitness = log_fitness_values[candidates[i]]
+            gain = np.zeros(len(candidates[i]))
+            if i > 0:
+                gain += blocks[i - 1][local[i - 1], :] - blocks[i - 1][local[i - 1], local[i]]
+            if i < N - 1:
+                gain += blocks[i][:, local[i + 1]] - blocks[i][local[i], local[i + 1]]
+            cost = fitness[local[i]] - fitness
+            gain[~(cost <= slack + EPS)] = -np.inf
+            best = int(gain.argmax())
+            if gain[best] > EPS:
+                slack -= cost[best]
+                local[i] = best
+                path[i] = candidates[i][best]
+                improved = True
+    return path
+
+
+def _label_search(candidates: list, blocks: list, log_fitness_values, min_cai: float, multiplier: float,
+                  incumbent: float):
+    """
+    Close the duality gap of Lagrangian solution. Labels (sum of codon pair scores, sum of log fitness values) are
+    extended along the chain, labels that are dominated on the same codon, that can not reach CAI threshold or
+    whose Lagrangian bound is not better than incumbent are dropped. Usually only few labels survive, search is
+    stopped when the number of labels of all positions exceeds LABEL_LIMIT.
+
+    :param candidates: codon indexes available on each position
+    :param blocks: Codon Pair Score submatrices for each pair of adjacent positions
+    :param log_fitness_values: logarithms of fitness values (64 values)
+    :param min_cai: min sum of logarithms of fitness values
+    :param multiplier: Lagrange multiplier used for bounds
+    :param incumbent: sum of codon pair scores of the best known feasible solution
+    :return: codon indexes for each position or None if incumbent is optimal (or search is stopped), True if search
+    is complete
+    """
+    N = len(candidates)
+    fitness = [log_fitness_values[c] for c in candidates]
+
+    # the best Lagrangian value and the best sum of log fitness values of the chain rest after each position
+    rest = [np.zeros(len(candidates[-1]))]
+    rest_cai = [0.0]
+    for i in range(N - 2, -1, -1):
+        with np.errstate(invalid="ignore"):
+            rest.insert(0, (blocks[i] + multiplier * fitness[i + 1][None, :] + rest[0][None, :]).max(axis=1))
+        rest_cai.insert(0, rest_cai[0] + fitness[i + 1].max())
+
+    def keep(cpb, cai, state, i):
+        with np.errstate(invalid="ignore"):
+            bound = cpb + rest[i][state] - multiplier * (min_cai - cai)
+        alive = np.flatnonzero((bound > incumbent + EPS) & (cai + rest_cai[i] >= min_cai - EPS))
+        if len(alive) < 2:
+            return alive
+        # drop labels dominated by label on the same codon: sorted by codon and decreasing score, label is kept
+        # only if its log fitness sum is greater than of all previous labels of the same codon
+        order = alive[np.lexsort((-cai[alive], -cpb[alive], state[alive]))]
+        shift = (cai[order].max() - cai[order].min() + 1) * state[order]
+        best_cai = np.maximum.accumulate(cai[order] + shift) - shift
+        dominated = np.zeros(len(order), dtype=bool)
+        dominated[1:] = (state[order][1:] == state[order][:-1]) & (cai[order][1:] <= best_cai[:-1] + EPS)
+        return np.sort(order[~dominated])
+
+    state = np.arange(len(candidates[0]))
+    cpb = np.zeros(len(state))
+    cai = fitness[0].copy()
+    alive = keep(cpb, cai, state, 0)
+    state, cpb, cai = state[alive], cpb[alive], cai[alive]
+    if len(state) == 0:
+        return None, True
+    states, parents = [state], []
+    labels = len(state)
+    for i, block in enumerate(blocks):
+        m = block.shape[1]
+        parent = np.repeat(np.arange(len(state)), m)
+        next_state = np.tile(np.arange(m), len(state))
+        next_cpb = cpb[parent] + block[state[parent], next_state]
+        next_cai = cai[parent] + fitness[i + 1][next_state]
+        alive = keep(next_cpb, next_cai, next_state, i + 1)
+        state, cpb, cai = next_state[alive], next_cpb[alive], next_cai[alive]
+        states.append(state)
+        parents.append(parent[alive])
+        if len(state) == 0:
+            return None, True
+        labels += len(state)
+        if labels > LABEL_LIMIT:
+            return None, False
+
+    path = np.zeros(N, dtype=np.intp)
+    label = int(np.argmax(cpb))
+    for i in range(N - 1, -1, -1):
+        path[i] = candidates[i][states[i][label]]
+        if i > 0:
+            label = parents[i - 1][label]
+    return path, True
+
+
+def _viterbi(candidates: list, blocks: list, log_fitness_values, lambdas) -> np.ndarray:
+    """
+    Maximize sum of codon pair scores plus lambda * sum of log fitness values for several lambdas at once.
+
+    :param candidates: codon indexes available on each position
+    :param blocks: Codon Pair Score submatrices for each pair of adjacent positions
+    :param log_fitness_values: logarithms of fitness values (64 values)
+    :param lambdas: Lagrange multipliers of CAI constraint
+    :return: codon indexes matrix (lambdas by positions)
+    """
+    K = len(lambdas)
+    lambdas = np.asarray(lambdas, dtype=np.double)[:, None]
+
+    def weights(i):
+        # zero multiplier ignores fitness values (0 * -inf for zero fitness)
+        w = lambdas * log_fitness_values[candidates[i]][None, :]
+        w[lambdas[:, 0] == 0] = 0
+        return w
+
+    score = weights(0)
+    pointers = []
+    for i, block in enumerate(blocks):
+        total = score[:, :, None] + block[None, :, :]
+        pointer = total.argmax(axis=1)
+        pointers.append(pointer)
+        score = np.take_along_axis(total, pointer[:, None, :], axis=1)[:, 0, :] + weights(i + 1)
+
+    N = len(candidates)
+    local = np.zeros((K, N), dtype=np.intp)
+    local[:, -1] = score.argmax(axis=1)
+    for i in range(N - 2, -1, -1):
+        local[:, i] = pointers[i][np.arange(K), local[:, i + 1]]
+
+    paths = np.zeros((K, N), dtype=np.intp)
+    for i, codons in enumerate(candidates):
+        paths[:, i] = codons[local[:, i]]
+    return paths
+
+
+def _create_candidates(protein_seq: str) -> list:
+    """
+    Create codon indexes available for each amino acid of protein (in CODONS order).
+
+    :param protein_seq: sequence of protein
+    :return: list of codon indexes arrays
+    """
+    aa_codons = {}
+    for j, codon in enumerate(CODONS):
+        aa_codons.setdefault(CODON2AA[codon], []).append(j)
+    aa_codons = {aa: np.array(codons, dtype=np.intp) for aa, codons in aa_codons.items()}
+
+    candidates = []
+    for aa in protein_seq:
+        if aa not in aa_codons:
+            raise Exception(f"Unknown amino acid {aa}")
+        candidates.append(aa_codons[aa])
+    return candidates
+
+
+def _unknown_aminoacids(protein_seq: str) -> list:
+    # sorted letters of protein that are not amino acids of CODON2AA
+    return sorted(set(protein_seq) - set(CODON2AA.values()))
+
+
+def _create_blocks(protein_seq: str, candidates: list, cps: np.ndarray) -> list:
+    """
+    Create Codon Pair Score submatrices for each pair of adjacent positions. Submatrices are shared between the same
+    amino acid pairs.
+
+    :param protein_seq: sequence of protein
+    :param candidates: codon indexes available on each position
+    :param cps: Codon Pair Score (CPS) table
+    :return: list of submatrices
+    """
+    cache = {}
+    blocks = []
+    for i in range(len(protein_seq) - 1):
+        aa_pair = protein_seq[i:i + 2]
+        if aa_pair not in cache:
+            cache[aa_pair] = cps[np.ix_(candidates[i], candidates[i + 1])]
+        blocks.append(cache[aa_pair])
+    return blocks
+
+
+def _chain_scores(candidates: list, blocks: list, paths: np.ndarray) -> np.ndarray:
+    # sums of codon pair scores for each path (row of paths matrix)
+    scores = np.zeros(len(paths))
+    for i, block in enumerate(blocks):
+        scores += block[_local(candidates, i, paths[:, i]), _local(candidates, i + 1, paths[:, i + 1])]
+    return scores
+
+
+def _local(candidates: list, i: int, codons: np.ndarray) -> np.ndarray:
+    # position of codon in candidates list of ith amino acid
+    return np.searchsorted(candidates[i], codons)
+
+
+def _log_fitness_values(fitness_values: list) -> np.ndarray:
+    fitness_values = np.asarray(fitness_values, dtype=np.double)
+    with np.errstate(divide="ignore"):
+        return np.log(fitness_values)
+
+
+def _cpb(codons, cps: np.ndarray) -> float:
+    # CPB index, the value of MaxCPBstCAI objective function
+    N = len(codons)
+    if N < 2:
+        return 0.0
+    return float(cps[codons[:-1], codons[1:]].sum() / (N - 1))
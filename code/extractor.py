@@ -1,73 +1,242 @@
-from os.path import join
+import json
+import os
+from os.path import join, exists
 
-from config import DB_COLUMN_DELIMITER, DB_TAXID_INDEX, DB_DIR
+import numpy as np
+
+from config import DB_COLUMN_DELIMITER, DB_TAXID_INDEX, DB_DIR, BUILT_TABLES, DB_INDEX_SUFFIX
 
 
 def extract_db_frequencies(taxid: str or int, db_path: str, frequency_col_from: int) -> dict:
     """
-    Extracting frequencies (codon or codon pair) from database
+    Extracting frequencies (codon or codon pair) from database. Rows of taxid are read directly by their byte ranges
+    from taxid index of database.
     :param taxid: taxid ID of organism
     :param db_path: path to database with frequencies information
     :param frequency_col_from: column id for first frequencies
     :return: frequencies dictionary
     """
-    taxid = str(taxid)
-    with open(db_path, "r") as f:
-        header = f.readline().rstrip().split(DB_COLUMN_DELIMITER)
+    return extract_db_frequencies_bulk([taxid], db_path, frequency_col_from)[str(taxid)]
+
+
+def extract_db_frequencies_bulk(taxids: list, db_path: str, frequency_col_from: int) -> dict:
+    """
+    Extracting frequencies (codon or codon pair) of many organisms from database in one pass. Rows of all taxids are
+    read in file order by their byte ranges from taxid index of database.
+    :param taxids: taxid IDs of organisms
+    :param db_path: path to database with frequencies information
+    :param frequency_col_from: column id for first frequencies
+    :return: dictionary taxid: frequencies dictionary
+    """
+    taxids = set(map(str, taxids))
+    index = load_taxid_index(db_path)
+    ranges = sorted(r for taxid in taxids for r in index["taxids"].get(taxid, []))
+    with open(db_path, "rb") as f:
+        header = f.readline().decode().rstrip().split(DB_COLUMN_DELIMITER)
         key_order = list(map(lambda c: c.upper(), header[frequency_col_from:]))
-        frequencies = {codon: 0 for codon in key_order}
-        for line in f:
-            row = line.split(DB_COLUMN_DELIMITER)
-            db_taxid = row[DB_TAXID_INDEX]
-            if db_taxid == taxid:
-                for codon, frequency in zip(key_order, row[frequency_col_from:]):
-                    frequencies[codon] += int(frequency)
+        frequencies = {taxid: {codon: 0 for codon in key_order} for taxid in taxids}
+        for start, end in ranges:
+            f.seek(start)
+            for line in f.read(end - start).decode().splitlines():
+                row = line.split(DB_COLUMN_DELIMITER)
+                db_taxid = row[DB_TAXID_INDEX]
+                if db_taxid in taxids:
+                    taxid_frequencies = frequencies[db_taxid]
+                    for codon, frequency in zip(key_order, row[frequency_col_from:]):
+                        taxid_frequencies[codon] += int(frequency)
     return frequencies
 
 
-def extract_codonopt_data(filename) -> (str, float, list):
+def load_taxid_index(db_path: str) -> dict:
+    """
+    Load index of database that maps taxid to byte ranges of its rows. Index is stored in sidecar file next to database
+    and is rebuilt when size or modification time of database changes.
+    :param db_path: path to database with frequencies information
+    :return: index dictionary ("taxids" maps taxid to list of [start, end) byte ranges)
+    """
+    stat = os.stat(db_path)
+    index_path = db_path + DB_INDEX_SUFFIX
+    if exists(index_path):
+        with open(index_path, "r") as f:
+            try:
+                index = json.load(f)
+            except ValueError:
+                index = {}
+        if index.get("size") == stat.st_size and index.get("mtime") == stat.st_mtime_ns:
+            return index
+
+    index = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "taxids": _index_taxids(db_path)}
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(index_path + ".tmp", index_path)
+    return index
+
+
+def _index_taxids(db_path: str) -> dict:
+    """
+    Find byte ranges of rows for each taxid (adjacent rows of the same taxid are merged into one range)
+    :param db_path: path to database with frequencies information
+    :return: dictionary taxid: list of [start, end) byte ranges
+    """
+    delimiter = DB_COLUMN_DELIMITER.encode()
+    taxids = {}
+    with open(db_path, "rb") as f:
+        offset = len(f.readline())
+        for line in f:
+            # only columns up to taxid are split
+            taxid = line.split(delimiter, DB_TAXID_INDEX + 1)[DB_TAXID_INDEX].decode().strip()
+            ranges = taxids.setdefault(taxid, [])
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1][1] = offset + len(line)
+            else:
+                ranges.append([offset, offset + len(line)])
+            offset += len(line)
+    return taxids
+
+
+def extract_codonopt_data(filename) -> (str, float, list, dict):
     """
-    Extracting information for running optimization
+    Extracting information for running optimization. After organism, method and threshold lines optional settings
+    can be specified as "key: value" lines (for example "engine: dp"), the rest of file are sequences. Sequences are
+    read lazily: from the rest of file or from FASTA file specified by "fasta" setting.
 
     :param filename: path to filename
-    :return: fitness values, Codon Pair Score (CPS) table, threshold CAI, sequences
+    :return: organism, fitness values, Codon Pair Score (CPS) table, method, threshold CAI, generator of
+    (record id, sequence), optional settings
     """
     with open(filename, "r") as r:
         organism = r.readline().split()[1]
         method = r.readline().split()[1]
         threshold = float(r.readline().split()[1])
+        options, offset = _read_options(r)
 
-        seqs = []
-        for line in r:
-            seqs.append(line.rstrip())
+    if "fasta" in options:
+        records = read_fasta(options["fasta"])
+    else:
+        records = read_fasta(filename, offset)
 
     line_data, matrix_data = _extract_built_data(DB_DIR, organism, method)
-    return line_data, matrix_data, method, threshold, seqs
+    return organism, line_data, matrix_data, method, threshold, records, options
 
 
-def extract_builder_data(filename) -> (str, str, str):
+def extract_scorer_data(filename) -> (str, tuple, object, dict):
     """
-    Extracting information for building db for new organism
+    Extracting information for scoring DNA sequences. After organism line optional settings can be specified as
+    "key: value" lines, the rest of file are DNA sequences. Sequences are read lazily: from the rest of file or from
+    FASTA file specified by "fasta" setting.
 
     :param filename: path to filename
-    :return: taxid id, new organism name
+    :return: organism, tables (fitness values, CPS table, observed codon frequencies, observed codon pair frequencies),
+    generator of (record id, sequence), optional settings
     """
     with open(filename, "r") as r:
-        taxid = r.readline().rstrip().split()[1]
-        organism = r.readline().rstrip().split()[1]
-    return taxid, organism
+        organism = r.readline().split()[1]
+        options, offset = _read_options(r)
 
+    if "fasta" in options:
+        records = read_fasta(options["fasta"])
+    else:
+        records = read_fasta(filename, offset)
 
-def _extract_built_data(db_path: str, organism: str, method: str) -> (list, list):
+    tables = _extract_built_data(DB_DIR, organism, "MaxCPBstCAI") + \
+        _extract_built_data(DB_DIR, organism, "MinRCPBstRCB")
+    return organism, tables, records, options
+
+
+def _read_options(r) -> (dict, int):
     """
-    Extracting built information from db for optimization
+    Read optional "key: value" lines until the first sequence line.
+
+    :param r: opened file
+    :return: settings, position in file where sequences start
+    """
+    options = {}
+    while True:
+        offset = r.tell()
+        line = r.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(">") or ":" not in line:
+            break
+        key, value = line.split(":", 1)
+        options[key.strip()] = value.strip()
+    return options, offset
+
+
+def read_fasta(filename: str, offset: int = 0):
+    """
+    Read protein sequences lazily one by one. Records are in FASTA format (header line ">id description" and sequence
+    lines), lines without header are read as separate sequences with ids seq1, seq2, ...
+
+    :param filename: path to file
+    :param offset: position in file where sequences start
+    :return: generator of (record id, sequence)
+    """
+    with open(filename, "r") as f:
+        f.seek(offset)
+        number = 0
+        record_id, parts = None, []
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if record_id is not None:
+                    yield record_id, "".join(parts)
+                number += 1
+                header = line[1:].split()
+                record_id, parts = header[0] if header else f"seq{number}", []
+            elif record_id is not None:
+                parts.append(line)
+            else:
+                number += 1
+                yield f"seq{number}", line
+        if record_id is not None:
+            yield record_id, "".join(parts)
+
+
+def extract_builder_data(filename) -> (list, dict):
+    """
+    Extracting information for building db for new organisms. File contains one or many pairs of "taxid" and "organism"
+    lines, other "key: value" lines are optional settings (for example "workers: 4").
+
+    :param filename: path to filename
+    :return: list of (taxid id, new organism name), optional settings
+    """
+    organisms = []
+    options = {}
+    taxid = None
+    with open(filename, "r") as r:
+        for line in r:
+            line = line.strip()
+            if not line:
+                continue
+            key, value = line.split(":", 1)
+            key, value = key.strip(), value.strip()
+            if key == "taxid":
+                taxid = value
+            elif key == "organism":
+                if taxid is None:
+                    raise Exception(f"No taxid for organism {value}")
+                organisms.append((taxid, value))
+                taxid = None
+            else:
+                options[key] = value
+    return organisms, options
+
+
+def built_data_files(db_path: str, organism: str, method: str) -> (str, str):
+    """
+    Paths to built data files used by optimization method
 
     :param db_path: path do database directory
     :param organism: organism (name of directory with built data)
     :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
-    :return: line data (fitness values, observed frequencies), matrix data (CPS table, observed codon pair frequencies)
+    :return: path to line data file (fv.txt or ocf.txt), path to matrix data file (cps.txt or opf.txt)
     """
-
     if method == "MaxCPBstCAI":
         codon_data = "fv.txt"
         codon_pair_data = "cps.txt"
@@ -76,15 +245,59 @@ def _extract_built_data(db_path: str, organism: str, method: str) -> (list, list
         codon_pair_data = "opf.txt"
     else:
         raise Exception(f"Unknown method {method}")
+    return join(db_path, organism, codon_data), join(db_path, organism, codon_pair_data)
+
+
+def find_organisms(db_path: str) -> list:
+    """
+    Organisms with built data in database directory
+
+    :param db_path: path do database directory
+    :return: sorted names of organism directories
+    """
+    return sorted(name for name in os.listdir(db_path)
+                  if exists(join(db_path, name, BUILT_TABLES)) or exists(join(db_path, name, "fv.txt")))
+
+
+def _extract_built_data(db_path: str, organism: str, method: str) -> (list, list):
+    """
+    Extracting built information from db for optimization
+
+    :param db_path: path do database directory
+    :param organism: organism (name of directory with built data)
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :return: line data (fitness values, observed frequencies), matrix data (CPS table, observed codon pair frequencies)
+    """
+    file_codon_data, file_codon_pair_data = built_data_files(db_path, organism, method)
+
+    # binary tables in full precision are mapped to memory, text files are fallback for organisms built before
+    file_tables = join(db_path, organism, BUILT_TABLES)
+    if exists(file_tables):
+        return _extract_built_tables(file_tables, method)
 
-    file_codon_data = join(db_path, organism, codon_data)
     with open(file_codon_data) as f:
         line_data = f.read().rstrip().split(',')
 
-    file_codon_pair_data = join(db_path, organism, codon_pair_data)
     matrix_data_str = open(file_codon_pair_data).readlines()
     matrix_data = []
     for i, line in enumerate(matrix_data_str):
         matrix_data.append(list(map(float, line.rstrip().split(","))))
 
     return list(map(float, line_data)), matrix_data
+
+
+def _extract_built_tables(filename: str, method: str) -> (np.ndarray, np.ndarray):
+    """
+    Extracting built information from binary file without parsing and copying (memory mapping)
+
+    :param filename: path to binary built data file
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :return: line data (fitness values, observed frequencies), matrix data (CPS table, observed codon pair frequencies)
+    """
+    tables = np.load(filename, mmap_mode="r")
+    if method == "MaxCPBstCAI":
+        return tables["fv"], tables["cps"]
+    elif method == "MinRCPBstRCB":
+        return tables["ocf"], tables["opf"]
+    else:
+        raise Exception(f"Unknown method {method}")
@@ -0,0 +1,439 @@
+import math
+
+import numpy as np
+from scipy import sparse
+
+from code.result import Metrics
+from config import CODONS, AMINOACIDS
+
+
+# constraint senses (the same characters as Gurobi uses)
+EQUAL = "="
+LESS_EQUAL = "<"
+GREATER_EQUAL = ">"
+# linking of X and Z variables: "weak" (two constraints per codon pair) or "flow" (Z flow conservation)
+LINKINGS = ("weak", "flow")
+
+
+class ChainIndex:
+    """
+    Index of model variables for the chain of protein positions. X variable (ith amino acid is assigned to codon)
+    exists for each allowed pair of position and codon, Z variable (codon pair is used for amino acids i and i+1)
+    exists for each allowed pair of codons of adjacent positions. Variables are ordered by position and codon indexes
+    (the same order as in dictionaries of loop construction). Positions and variable indexes are stored as int32,
+    codon indexes as int16.
+    """
+
+    def __init__(self, R: np.ndarray):
+        self.N = R.shape[0]
+
+        # X variables
+        x_pos, x_codon = np.nonzero(R)
+        self.x_pos = x_pos.astype(np.int32)
+        self.x_codon = x_codon.astype(np.int16)
+        self.nX = len(self.x_pos)
+        counts = np.bincount(self.x_pos, minlength=self.N)
+        self.x_start = np.concatenate(([0], np.cumsum(counts)))
+
+        # Z variables: all combinations of X variables of positions i and i+1
+        pair_counts = counts[:-1] * counts[1:]
+        self.z_pos = np.repeat(np.arange(self.N - 1, dtype=np.int32), pair_counts)
+        self.nZ = len(self.z_pos)
+        offset = np.arange(self.nZ) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+        next_counts = counts[1:][self.z_pos]
+        self.z_from = (self.x_start[self.z_pos] + offset // next_counts).astype(np.int32)
+        self.z_to = (self.x_start[self.z_pos + 1] + offset % next_counts).astype(np.int32)
+        self.z_j = self.x_codon[self.z_from]
+        self.z_k = self.x_codon[self.z_to]
+
+    def start(self, codons: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Values of X and Z variables for codons of each position.
+
+        :param codons: codon indexes
+        :return: values of X variables, values of Z variables
+        """
+        x_values = (self.x_codon == np.asarray(codons)[self.x_pos]).astype(np.double)
+        return x_values, x_values[self.z_from] * x_values[self.z_to]
+
+    def codons(self, x_values: np.ndarray) -> np.ndarray:
+        """
+        Codon indexes for each position from values of X variables.
+
+        :param x_values: values of X variables
+        :return: codon indexes
+        """
+        return self.x_codon[x_values > 0.5]
+
+
+class Formulation:
+    """
+    Codon optimization model in matrix form: objective vector, sparse constraint matrix with senses and right hand
+    sides, bounds and types of variables. Variables are X, Z and the method specific continuous variables (in this
+    order), rows are grouped in named constraint families. Construction time of each block of variables and each
+    family of constraints is recorded in metrics.
+    """
+
+    def __init__(self, index: ChainIndex, maximize: bool, metrics: Metrics = None):
+        self.metrics = metrics or Metrics()
+        self.metrics.lap("index")
+        self.index = index
+        self.maximize = maximize
+        self.blocks = [("X", index.nX), ("Z", index.nZ)]
+        self.c = np.zeros(index.nX + index.nZ)
+        self.vtype = np.full(index.nX + index.nZ, "B")
+        self.lb = np.zeros(index.nX + index.nZ)
+        self.ub = np.ones(index.nX + index.nZ)
+        self.families = []
+        self.rows = []
+        self.sense = []
+        self.rhs = []
+        # the value of objective function is model objective multiplied by scale
+        self.scale = 1.0
+        # codon or codon pair of each row of constraint families whose right hand sides depend on organism
+        self.keys = {}
+
+    @property
+    def n(self) -> int:
+        return len(self.c)
+
+    @property
+    def A(self) -> sparse.csr_matrix:
+        # families added before the last variables block are widened to all variables
+        rows = [sparse.csr_matrix((r.data, r.indices, r.indptr), shape=(r.shape[0], self.n)) for r in self.rows]
+        return sparse.vstack(rows, format="csr")
+
+    def add_variables(self, name: str, count: int, vtype: str = "C") -> int:
+        """
+        Add block of continuous (non-negative) variables.
+
+        :param name: block name
+        :param count: number of variables
+        :param vtype: variables type
+        :return: index of the first variable of block
+        """
+        start = self.n
+        self.blocks.append((name, count))
+        self.c = np.concatenate((self.c, np.zeros(count)))
+        self.vtype = np.concatenate((self.vtype, np.full(count, vtype)))
+        self.lb = np.concatenate((self.lb, np.zeros(count)))
+        self.ub = np.concatenate((self.ub, np.full(count, np.inf)))
+        self.metrics.lap(f"variables/{name}")
+        return start
+
+    def add_constraints(self, name: str, rows, cols, values, sense, rhs):
+        """
+        Add family of constraints given as coordinates of nonzero coefficients.
+
+        :param name: family name
+        :param rows: row indexes (inside family)
+        :param cols: variable indexes
+        :param values: coefficients
+        :param sense: senses of rows (or one sense for all rows)
+        :param rhs: right hand sides
+        """
+        rhs = np.asarray(rhs, dtype=np.double)
+        values = np.asarray(values, dtype=np.double)
+        nonzero = values != 0
+        matrix = sparse.coo_matrix((values[nonzero], (np.asarray(rows)[nonzero], np.asarray(cols)[nonzero])),
+                                   shape=(len(rhs), self.n))
+        self.families.append((name, len(rhs)))
+        self.rows.append(matrix.tocsr())
+        self.sense.append(np.full(len(rhs), sense) if isinstance(sense, str) else np.asarray(sense))
+        self.rhs.append(rhs)
+        self.metrics.lap(f"constraints/{name}")
+
+    def coefficients(self, name: str) -> sparse.csr_matrix:
+        """
+        Coefficients of constraint family.
+
+        :param name: family name
+        :return: sparse matrix of family rows
+        """
+        r = self.rows[[family for family, _ in self.families].index(name)]
+        return sparse.csr_matrix((r.data, r.indices, r.indptr), shape=(r.shape[0], self.n))
+
+    def set_coefficients(self, name: str, rows, cols, values):
+        """
+        Change coefficients of constraint family (senses and right hand sides are kept).
+
+        :param name: family name
+        :param rows: row indexes (inside family)
+        :param cols: variable indexes
+        :param values: coefficients
+        """
+        k = [family for family, _ in self.families].index(name)
+        values = np.asarray(values, dtype=np.double)
+        nonzero = values != 0
+        matrix = sparse.coo_matrix((values[nonzero], (np.asarray(rows)[nonzero], np.asarray(cols)[nonzero])),
+                                   shape=(self.families[k][1], self.n))
+        self.rows[k] = matrix.tocsr()
+
+    def family(self, name: str) -> slice:
+        """
+        Row indexes of constraint family.
+
+        :param name: family name
+        :return: slice of rows
+        """
+        start = 0
+        for family, count in self.families:
+            if family == name:
+                return slice(start, start + count)
+            start += count
+        raise Exception(f"Unknown constraint family {name}")
+
+    def set_rhs(self, name: str, rhs):
+        """
+        Change right hand sides of constraint family.
+
+        :param name: family name
+        :param rhs: right hand sides
+        """
+        rows = self.family(name)
+        rhs = np.asarray(rhs, dtype=np.double)
+        if len(rhs) != rows.stop - rows.start:
+            raise Exception(f"Wrong number of right hand sides for constraint family {name}")
+        self.rhs[[family for family, _ in self.families].index(name)] = rhs
+
+    def variables(self, name: str) -> slice:
+        """
+        Indexes of variables block.
+
+        :param name: block name
+        :return: slice of variables
+        """
+        start = 0
+        for block, count in self.blocks:
+            if block == name:
+                return slice(start, start + count)
+            start += count
+        raise Exception(f"Unknown variables {name}")
+
+    def variable_names(self) -> list:
+        # names like in loop construction: X[i, j], Z[i, j, k], codondev[j], ...
+        index = self.index
+        names = [f"X{[i, j]}" for i, j in zip(index.x_pos.tolist(), index.x_codon.tolist())]
+        names += [f"Z{[i, j, k]}" for i, j, k in zip(index.z_pos.tolist(), index.z_j.tolist(), index.z_k.tolist())]
+        for name, count in self.blocks[2:]:
+            names += [f"{name}{[i]}" for i in range(count)]
+        return names
+
+    def constraint_names(self) -> list:
+        return [f"{name}[{i}]" for name, count in self.families for i in range(count)]
+
+    @property
+    def senses(self) -> np.ndarray:
+        return np.concatenate(self.sense)
+
+    @property
+    def rhs_vector(self) -> np.ndarray:
+        return np.concatenate(self.rhs)
+
+
+def max_cpb_st_cai_formulation(R: np.ndarray, fitness_values: list, cps, threshold: float,
+                               metrics: Metrics = None, linking: str = "weak") -> Formulation:
+    """
+    Create MaxCPBstCAI model in matrix form: maximize Codon Pair Bias (CPB) index when the CAI (Codon Adaptation
+    Index) does not fall below the threshold.
+
+    :param R: matrix of possible codons for each amino acid of protein
+    :param fitness_values: fitness values list
+    :param cps: Codon Pair Score (CPS) table
+    :param threshold: the min value for CAI
+    :param metrics: metrics to record construction times
+    :param linking: linking of X and Z variables, "weak" or "flow" (see _add_chain_constraints)
+    :return: formulation
+    """
+    index = ChainIndex(R)
+    formulation = Formulation(index, maximize=True, metrics=metrics)
+    _add_chain_constraints(formulation, linking)
+
+    N = index.N
+    minCAI = N * math.log(threshold)
+    logFitnessValues = np.log(np.asarray(fitness_values, dtype=np.double))
+    formulation.add_constraints("minCAI", np.zeros(index.nX), np.arange(index.nX), logFitnessValues[index.x_codon],
+                                GREATER_EQUAL, [minCAI])
+
+    cps = np.asarray(cps, dtype=np.double)
+    formulation.c[index.nX:] = cps[index.z_j, index.z_k] / (N - 1)
+    formulation.metrics.lap("objective")
+    return formulation
+
+
+def set_organism(formulation: Formulation, line_data: list, matrix_data: list):
+    """
+    Change coefficients of formulation that depend on organism, the structure of model is the same for all organisms:
+    objective (CPS table) and minCAI coefficients (fitness values) of MaxCPBstCAI, right hand sides of deviation
+    constraints (observed codon and codon pair frequencies) of MinRCPBstRCB.
+
+    :param formulation: formulation of MaxCPBstCAI or MinRCPBstRCB model
+    :param line_data: fitness values or observed codon frequencies of organism
+    :param matrix_data: Codon Pair Score table or observed codon pair frequencies of organism
+    """
+    index = formulation.index
+    if formulation.maximize:
+        logFitnessValues = np.log(np.asarray(line_data, dtype=np.double))
+        formulation.set_coefficients("minCAI", np.zeros(index.nX), np.arange(index.nX),
+                                     logFitnessValues[index.x_codon])
+        cps = np.asarray(matrix_data, dtype=np.double)
+        formulation.c[index.nX:] = cps[index.z_j, index.z_k] / (index.N - 1)
+        return
+
+    freq_codons = np.asarray(line_data, dtype=np.double)
+    freq_codon_pair = np.asarray(matrix_data, dtype=np.double).ravel()
+    for bound in ("ub", "lb"):
+        formulation.set_rhs(f"codondev_{bound}", 100 * freq_codons[formulation.keys["codondev"]])
+        formulation.set_rhs(f"codonpairdev_{bound}", 100 * freq_codon_pair[formulation.keys["codonpairdev"]])
+
+
+def min_rcpb_st_rcb_formulation(R: np.ndarray, Y: np.ndarray, M: np.ndarray, freq_codons: list,
+                                freq_codon_pair: list, threshold: float, metrics: Metrics = None,
+                                linking: str = "weak", counted: np.ndarray = None) -> Formulation:
+    """
+    Create MinRCPBstRCB model in matrix form: minimize Relative Codon Pair Bias (RCPB) index when the Relative Codon
+    Bias (RCB) index does not rise above the threshold.
+
+    :param R: matrix of possible codons for each amino acid of protein
+    :param Y: matrix of amino acids of protein
+    :param M: matrix of codons of each amino acid
+    :param freq_codons: observed frequency of each codon
+    :param freq_codon_pair: observed frequency of codon pair
+    :param threshold: the max value for RCB
+    :param metrics: metrics to record construction times
+    :param linking: linking of X and Z variables, "weak" or "flow" (see _add_chain_constraints)
+    :param counted: mask of positions whose codons are counted in RCB (all positions if None), codon pairs of all
+    positions are counted in RCPB
+    :return: formulation
+    """
+    index = ChainIndex(R)
+    formulation = Formulation(index, maximize=False, metrics=metrics)
+    counted = np.ones(len(Y), dtype=bool) if counted is None else np.asarray(counted, dtype=bool)
+    _add_chain_constraints(formulation, linking)
+
+    N = index.N
+    nX = index.nX
+    n_codons, n_aa = len(CODONS), len(AMINOACIDS)
+    freq_codons = np.asarray(freq_codons, dtype=np.double)
+    freq_codon_pair = np.asarray(freq_codon_pair, dtype=np.double)
+
+    codondev = formulation.add_variables("codondev", n_codons)
+    codonpairdev = formulation.add_variables("codonpairdev", n_codons * n_codons)
+    AAdev = formulation.add_variables("AAdev", n_aa)
+    AApairdev = formulation.add_variables("AApairdev", n_aa * n_aa)
+
+    # deviation of codon usage from observed frequency for codons of amino acids that occur in protein, positions
+    # that are not counted (fixed codons of neighbour windows) and with zero rows of Y are left out
+    eta = np.sum(Y[counted], axis=0)
+    codon_aa = np.argmax(M, axis=0)
+    codon_eta = eta[codon_aa]
+    codons = np.flatnonzero(codon_eta != 0)
+    row = np.full(n_codons, -1)
+    row[codons] = np.arange(len(codons))
+    x = np.flatnonzero(np.any(Y[index.x_pos], axis=1) & counted[index.x_pos])
+    rows = np.concatenate((row[index.x_codon[x]], np.arange(len(codons))))
+    cols = np.concatenate((x, codondev + codons))
+    coefs = 100 / codon_eta[index.x_codon[x]]
+    dev = np.full(len(codons), 100.0)
+    formulation.add_constraints("codondev_ub", rows, cols, np.concatenate((coefs, -dev)), LESS_EQUAL,
+                                100 * freq_codons[codons])
+    formulation.add_constraints("codondev_lb", rows, cols, np.concatenate((coefs, dev)), GREATER_EQUAL,
+                                100 * freq_codons[codons])
+    formulation.keys["codondev"] = codons
+
+    # deviation of codon pair usage from observed frequency for codon pairs of amino acid pairs that occur in protein
+    # (the number of positions of codon pair is the number of its amino acid pair, so positions with restricted
+    # codons are counted right), pairs of positions with zero rows of Y are not counted
+    aa_pair_eta = Y[:-1].T.astype(int) @ Y[1:]
+    pair_eta = aa_pair_eta[codon_aa[:, None], codon_aa[None, :]].ravel()
+    pairs = np.flatnonzero(pair_eta)
+    row = np.full(n_codons * n_codons, -1)
+    row[pairs] = np.arange(len(pairs))
+    z = np.flatnonzero(np.any(Y[index.z_pos], axis=1) & np.any(Y[index.z_pos + 1], axis=1))
+    pair = index.z_j[z] * n_codons + index.z_k[z]
+    rows = np.concatenate((row[pair], np.arange(len(pairs))))
+    cols = np.concatenate((nX + z, codonpairdev + pairs))
+    coefs = 100 / pair_eta[pair]
+    dev = np.full(len(pairs), 100.0)
+    formulation.add_constraints("codonpairdev_ub", rows, cols, np.concatenate((coefs, -dev)), LESS_EQUAL,
+                                100 * freq_codon_pair.ravel()[pairs])
+    formulation.add_constraints("codonpairdev_lb", rows, cols, np.concatenate((coefs, dev)), GREATER_EQUAL,
+                                100 * freq_codon_pair.ravel()[pairs])
+    formulation.keys["codonpairdev"] = pairs
+
+    # amino acid deviation is mean deviation of its codons
+    NumAminoAcidCodonPossibility = np.sum(M, axis=1)
+    aa, codon = np.nonzero(M)
+    formulation.add_constraints("AAdev", np.concatenate((aa, np.arange(n_aa))),
+                                np.concatenate((codondev + codon, AAdev + np.arange(n_aa))),
+                                np.concatenate((100 / NumAminoAcidCodonPossibility[aa], np.full(n_aa, -100.0))),
+                                EQUAL, np.zeros(n_aa))
+
+    # amino acid pair deviation is mean deviation of its codon pairs
+    aa_pair = codon_aa[:, None] * n_aa + codon_aa[None, :]
+    NumAminoAcidPairCodonPairPossibility = np.outer(NumAminoAcidCodonPossibility, NumAminoAcidCodonPossibility).ravel()
+    formulation.add_constraints("AApairdev", np.concatenate((aa_pair.ravel(), np.arange(n_aa * n_aa))),
+                                np.concatenate((codonpairdev + np.arange(n_codons * n_codons),
+                                                AApairdev + np.arange(n_aa * n_aa))),
+                                np.concatenate((100 / NumAminoAcidPairCodonPairPossibility[aa_pair.ravel()],
+                                                np.full(n_aa * n_aa, -100.0))),
+                                EQUAL, np.zeros(n_aa * n_aa))
+
+    NumAA = np.sum(Y[counted], axis=0)
+    maxRCB = threshold * np.count_nonzero(counted)
+    formulation.add_constraints("maxRCB", np.zeros(n_aa), AAdev + np.arange(n_aa), 100 * NumAA, LESS_EQUAL,
+                                [100 * maxRCB])
+
+    NumAApairs = (Y[:-1].T.astype(int) @ Y[1:]).ravel()
+    formulation.c[AApairdev:AApairdev + n_aa * n_aa] = 100 * NumAApairs
+    formulation.scale = 1 / (100 * (N - 1))
+    formulation.metrics.lap("objective")
+    return formulation
+
+
+def _add_chain_constraints(formulation: Formulation, linking: str = "weak"):
+    """
+    Add constraints that every amino acid is assigned to exactly one codon, every pair of adjacent amino acids is
+    assigned to exactly one codon pair and link X and Z variables.
+
+    "weak" linking has two constraints for each Z variable: X[i, l] + X[i + 1, n] >= 2 * Z[i, l, n] and
+    X[i, l] + X[i + 1, n] <= Z[i, l, n] + 1. "flow" linking has one constraint for each X variable: sum of Z[i, j, k]
+    over k is X[i, j] and sum of Z[i, j, k] over j is X[i + 1, k]. Codon pairs of the chain are a flow through
+    positions, so LP relaxation of flow linking is integral without other constraints and is much tighter, the number
+    of rows is linear in the number of codons instead of codon pairs. One codon pair on each position follows from
+    assignment, so it is not added.
+
+    :param formulation: formulation with X and Z variables
+    :param linking: "weak" or "flow"
+    """
+    if linking not in LINKINGS:
+        raise Exception(f"Unknown linking {linking}")
+    index = formulation.index
+    nX, nZ = index.nX, index.nZ
+    z = nX + np.arange(nZ)
+
+    formulation.add_constraints("assignment", index.x_pos, np.arange(nX), np.ones(nX), EQUAL, np.ones(index.N))
+    if linking == "flow":
+        # X variables of all positions but the last one (outgoing flow) and all positions but the first one (incoming)
+        out_count = int(index.x_start[index.N - 1])
+        in_first = int(index.x_start[min(1, index.N)])
+        in_count = nX - in_first
+        formulation.add_constraints("flow_out", np.concatenate((index.z_from, np.arange(out_count))),
+                                    np.concatenate((z, np.arange(out_count))),
+                                    np.concatenate((np.ones(nZ), np.full(out_count, -1.0))), EQUAL,
+                                    np.zeros(out_count))
+        formulation.add_constraints("flow_in", np.concatenate((index.z_to - in_first, np.arange(in_count))),
+                                    np.concatenate((z, in_first + np.arange(in_count))),
+                                    np.concatenate((np.ones(nZ), np.full(in_count, -1.0))), EQUAL,
+                                    np.zeros(in_count))
+        return
+
+    formulation.add_constraints("pair_assignment", index.z_pos, z, np.ones(nZ), EQUAL, np.ones(index.N - 1))
+
+    # X[i, l] + X[i + 1, n] >= 2 * Z[i, l, n] and X[i, l] + X[i + 1, n] <= Z[i, l, n] + 1
+    rows = np.tile(np.arange(nZ), 3)
+    cols = np.concatenate((index.z_from, index.z_to, z))
+    formulation.add_constraints("link_lb", rows, cols, np.concatenate((np.ones(2 * nZ), np.full(nZ, -2.0))),
+                                GREATER_EQUAL, np.zeros(nZ))
+    formulation.add_constraints("link_ub", rows, cols, np.concatenate((np.ones(2 * nZ), np.full(nZ, -1.0))),
+                                LESS_EQUAL, np.ones(nZ))
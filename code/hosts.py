@@ -0,0 +1,108 @@
+from code.backends import optimize_gurobi, solve_formulation, status_name, _create_matrix_model
+from code.formulation import max_cpb_st_cai_formulation, min_rcpb_st_rcb_formulation, set_organism
+from code.optimizer import _create_M, _create_R, _create_Y, _no_solution
+from code.result import Metrics, OptimizationResult
+from code.scoring import cai, rcb
+from config import CODONS
+
+
+def multi_host_optimization(method: str, protein_seq: str, hosts: dict, threshold: float, threads: int = 0,
+                            linking: str = "weak", backend: str = "gurobi", time_limit: float = None,
+                            mip_gap: float = None) -> list:
+    """
+    Optimize protein for several expression hosts. Structure of model (variables and constraints of protein chain)
+    is the same for all organisms, so model is built once, only coefficients that depend on organism are changed for
+    each host: objective and minCAI coefficients for MaxCPBstCAI, right hand sides of deviation constraints for
+    MinRCPBstRCB. Gurobi model is kept between hosts and solution for previous host is MIP start for the next one.
+
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param protein_seq: sequence of protein for optimization
+    :param hosts: organism -> (line data, matrix data): fitness values and CPS table or observed codon and codon pair
+    frequencies
+    :param threshold: threshold for CAI or RCB
+    :param threads: number of solver threads (0 lets solver choose)
+    :param linking: linking of X and Z variables, "weak" or "flow"
+    :param backend: solver, "gurobi" or "highs"
+    :param time_limit: time limit of solve of each host in seconds (no limit if None)
+    :param mip_gap: relative gap between objective and best bound to stop solve (solver default if None)
+    :return: list of (organism, result) in order of hosts, result is NoSolution with solve status if there
+    is no solution
+    """
+    metrics = Metrics()
+    organisms = list(hosts)
+    aminoacids = list(protein_seq)
+    Y = _create_Y(aminoacids)
+    M = _create_M()
+    R = _create_R(aminoacids, M)
+    metrics.lap("R")
+
+    line_data, matrix_data = hosts[organisms[0]]
+    if method == "MaxCPBstCAI":
+        formulation = max_cpb_st_cai_formulation(R, line_data, matrix_data, threshold, metrics, linking)
+    elif method == "MinRCPBstRCB":
+        formulation = min_rcpb_st_rcb_formulation(R, Y, M, line_data, matrix_data, threshold, metrics, linking)
+    else:
+        raise Exception(f"Unknown method {method}")
+    model = None
+    if backend == "gurobi":
+        model, v = _create_matrix_model(formulation)
+        model.update()
+        constraints = model.getConstrs()
+    metrics.lap("model")
+
+    results = []
+    start = None
+    for organism in organisms:
+        host_metrics = Metrics()
+        line_data, matrix_data = hosts[organism]
+        set_organism(formulation, line_data, matrix_data)
+        if model is None:
+            formulation.metrics = host_metrics
+            values, objective = solve_formulation(formulation, backend, threads, time_limit=time_limit,
+                                                  mip_gap=mip_gap)
+        else:
+            _set_model_coefficients(model, v, constraints, formulation)
+            if start is not None:
+                v.Start = start
+            host_metrics.lap("coefficients")
+            optimize_gurobi(model, threads, time_limit, mip_gap)
+            host_metrics.lap("solve")
+            host_metrics.solved(model, formulation.scale)
+            values, objective = (v.X, model.ObjVal) if model.SolCount else (None, None)
+        if values is None:
+            results.append((organism, _no_solution(host_metrics)))
+            continue
+
+        codons = formulation.index.codons(values[formulation.variables("X")])
+        host_metrics.model["organism"] = organism
+        if method == "MaxCPBstCAI":
+            host_metrics.model["cai"] = cai(codons, line_data)
+        else:
+            host_metrics.model["rcb"] = rcb(codons, line_data)
+        ans = "".join(CODONS[j] for j in codons)
+        results.append((organism, OptimizationResult(objective * formulation.scale, ans, host_metrics,
+                                                     status_name(host_metrics.model["status"]),
+                                                     host_metrics.model.get("bound"),
+                                                     host_metrics.model.get("mip_gap"))))
+        # solution for previous host is MIP start
+        start = values
+    if model is not None:
+        model.dispose()
+    metrics.lap("hosts")
+    return results
+
+
+def _set_model_coefficients(model, v, constraints: list, formulation):
+    # coefficients of Gurobi model built from formulation are changed to coefficients of formulation in bulk: objective
+    # and right hand sides by attributes of all variables and constraints, minCAI row (its coefficients are fitness
+    # values) is replaced by row of formulation
+    v.Obj = formulation.c
+    model.setAttr("RHS", constraints, formulation.rhs_vector.tolist())
+    if formulation.maximize:
+        k = formulation.family("minCAI").start
+        model.remove(constraints[k])
+        row = model.addMConstr(formulation.coefficients("minCAI"), v, formulation.senses[k:k + 1],
+                               formulation.rhs_vector[k:k + 1])
+    model.update()
+    if formulation.maximize:
+        constraints[k] = row.tolist()[0]
@@ -1,19 +1,23 @@
 import math
-import time
-
-from config import *
 
+import numpy as np
 
-try:
-    import numpy as np
-    from gurobipy import *
+from config import *
+# Gurobi model of formulation is built by backends (_create_matrix_model is used by benchmarks from this module)
+from code.backends import optimize_gurobi, solve_formulation, status_name, _create_matrix_model
+from code.formulation import LINKINGS, Formulation, max_cpb_st_cai_formulation, min_rcpb_st_rcb_formulation
+from code.result import Metrics, NoSolution, OptimizationResult
+from code.warmstart import start_codons, start_objective
 
-except Exception as e:
-    logging.exception("External required libraries importing exception occurred")
-    raise e
+# gurobipy is imported only by functions that build Gurobi models, so models can be solved by other backends
+# without Gurobi
 
 
-def max_cpb_st_cai_optimization(protein_seq: str, fitness_values: list, cps: list, threshold: float) -> str:
+def max_cpb_st_cai_optimization(protein_seq: str, fitness_values: list, cps: list, threshold: float,
+                                build: str = "loop", names: bool = False, threads: int = 0,
+                                warm_start: str = "none", linking: str = "weak",
+                                backend: str = "gurobi", time_limit: float = None, mip_gap: float = None,
+                                callback=None) -> OptimizationResult:
     """
     Take amino acid sequence of protein as input and mathematically optimize DNA sequence. Fully based on MaxCPBstCAI
     function from software implementation of approach described in "Codon Optimization: A Mathematical Programming Approach"
@@ -24,9 +28,24 @@ def max_cpb_st_cai_optimization(protein_seq: str, fitness_values: list, cps: lis
     :param fitness_values: fitness values list
     :param cps: Codon Pair Score (CPS) table
     :param threshold: the min value for CAI
-    :return: string with DNA sequence, optimized for input protein
+    :param build: model construction, "loop" (variable by variable) or "matrix" (sparse matrices in bulk)
+    :param names: name variables and constraints of model built by matrices (for debugging)
+    :param threads: number of solver threads (0 lets Gurobi choose)
+    :param warm_start: MIP start: "none", "greedy" (heuristic codons) or "local" (heuristic codons improved by
+    local search)
+    :param linking: linking of X and Z variables: "weak" (two constraints per codon pair, as in the article) or "flow"
+    (sum of codon pairs of each codon is its X variable, tighter and smaller model)
+    :param backend: solver: "gurobi" or "highs" (HiGHS of SciPy, open-source, model is always built by matrices,
+    threads and warm_start are not used by solver)
+    :param time_limit: time limit of solve in seconds, the best solution found is returned when it is reached (no
+    limit if None)
+    :param mip_gap: relative gap between objective and best bound to stop solve (solver default if None)
+    :param callback: function of incumbent objective, best bound and solve time that is called for every new
+    incumbent, solve is stopped (with the incumbent as result) if it returns True
+    :return: string with DNA sequence, optimized for input protein (with objective value, metrics, solve status, best
+    bound and gap as attributes), NoSolution with solve status if solver found no solution
     """
-    start_time = time.time()
+    metrics = Metrics()
     aminoacids = list(protein_seq)
     N = len(aminoacids)
 
@@ -36,11 +55,24 @@ def max_cpb_st_cai_optimization(protein_seq: str, fitness_values: list, cps: lis
     test2 = np.sum(Y, axis=1)
     if len(test2) != N:
         print('warning! there exists undefined AA letter abbreviation')
+    metrics.lap("Y")
 
     M = _create_M()
     R = _create_R(aminoacids, M)
+    metrics.lap("R")
+
+    start = _create_start("MaxCPBstCAI", protein_seq, fitness_values, cps, threshold, warm_start, metrics)
+
+    if build == "matrix" or backend != "gurobi":
+        formulation = max_cpb_st_cai_formulation(R, fitness_values, cps, threshold, metrics, linking)
+        return _optimize_formulation(formulation, names, threads, start, backend, time_limit, mip_gap, callback)
+    elif build != "loop":
+        raise Exception(f"Unknown build {build}")
+    if linking not in LINKINGS:
+        raise Exception(f"Unknown linking {linking}")
+    from gurobipy import GRB
 
-    model, X = _create_model(aminoacids, R)
+    model, X = _create_model(aminoacids, R, metrics)
 
     # Variable Zijk=1 if codon pair jk is used for amino acids i and i+1
     coef = {}
@@ -52,6 +84,7 @@ def max_cpb_st_cai_optimization(protein_seq: str, fitness_values: list, cps: lis
                     Z[i, j, k] = model.addVar(vtype=GRB.BINARY, name="Z%s" % str([i, j, k]))
                     coef[i, j, k] = cps[j][k]
     model.update()
+    metrics.lap("variables/Z")
 
     for i in range(len(aminoacids) - 1):
         jvar = []
@@ -62,38 +95,48 @@ def max_cpb_st_cai_optimization(protein_seq: str, fitness_values: list, cps: lis
         for k in range(len(CODONS)):
             if R[i + 1, k] == 1:
                 kvar.append(k)
-        model.addConstr(sum(Z[i, l, n] for l in jvar for n in kvar), GRB.EQUAL, 1)
-        for l in jvar:
-            for n in kvar:
-                model.addConstr(X[i, l] + X[i + 1, n] >= 2 * Z[i, l, n])
-                model.addConstr(X[i, l] + X[i + 1, n] <= Z[i, l, n] + 1)
+        _add_link_constraints(model, X, Z, i, jvar, kvar, linking)
     model.update()
+    metrics.lap("constraints/pair_assignment, link")
 
     minCAI = N * math.log(threshold)
     logFitnessValues = np.zeros(64, dtype=np.double)
     for i in range(len(fitness_values)):
         logFitnessValues[i] = np.log(fitness_values[i])
-    model.addConstr(sum(X[i, j] * logFitnessValues[j] for (i, j) in X), GRB.GREATER_EQUAL, minCAI)
+    model.addConstr(sum(X[i, j] * logFitnessValues[j] for (i, j) in X) >= minCAI)
     model.update()
+    metrics.lap("constraints/minCAI")
 
     # Set objective function
     obj = sum(Z[i, j, k] * coef[i, j, k] for (i, j, k) in Z) / (N - 1)
     model.setObjective(obj, GRB.MAXIMIZE)
-    model.optimize()
+    model.update()
+    metrics.lap("objective")
+    if start is not None:
+        _set_start(X, Z, start)
+    optimize_gurobi(model, threads, time_limit, mip_gap, callback)
+    metrics.lap("solve")
+    metrics.solved(model)
+    if not model.SolCount:
+        return _no_solution(metrics)
 
     objValue = model.objVal
 
-    codons = [j for (i, j) in X if X[i, j].X == 1]
+    codons = [j for (i, j) in X if X[i, j].X > 0.5]
     ans = ""
     for j in range(len(codons)):
         ans += CODONS[codons[j]]
-    elapsed_time = time.time() - start_time
-    print(elapsed_time)
+    metrics.lap("solution")
+    print(metrics.total_time)
     print("END")
-    return f"Objective function value: {objValue}\n" + ans + "\n"
+    return _solver_result(objValue, ans, metrics)
 
 
-def min_rcpb_st_rcb_optimization(protein_seq: str, freq_codons: list, freq_codon_pair: list, threshold: float):
+def min_rcpb_st_rcb_optimization(protein_seq: str, freq_codons: list, freq_codon_pair: list, threshold: float,
+                                 build: str = "loop", names: bool = False, threads: int = 0,
+                                 warm_start: str = "none", linking: str = "weak",
+                                 backend: str = "gurobi", time_limit: float = None, mip_gap: float = None,
+                                 callback=None) -> OptimizationResult:
     """
     Take amino acid sequence of protein as input and mathematically optimize DNA sequence. Fully based on MinRCPBstRCB
     function from software implementation of approach described in "Codon Optimization: A Mathematical Programming Approach"
@@ -104,11 +147,24 @@ def min_rcpb_st_rcb_optimization(protein_seq: str, freq_codons: list, freq_codon
     :param freq_codons: observed frequency of each codon ([0.421418,	0.538557,	0.578582, ... ])
     :param freq_codon_pair: observed frequency of codon pair
     :param threshold: the max value for RCB
-    :return: string with DNA sequence, optimized for input protein
+    :param build: model construction, "loop" (variable by variable) or "matrix" (sparse matrices in bulk)
+    :param names: name variables and constraints of model built by matrices (for debugging)
+    :param threads: number of solver threads (0 lets Gurobi choose)
+    :param warm_start: MIP start: "none", "greedy" (heuristic codons) or "local" (heuristic codons improved by
+    local search)
+    :param linking: linking of X and Z variables: "weak" (two constraints per codon pair, as in the article) or "flow"
+    (sum of codon pairs of each codon is its X variable, tighter and smaller model)
+    :param backend: solver: "gurobi" or "highs" (HiGHS of SciPy, open-source, model is always built by matrices,
+    threads and warm_start are not used by solver)
+    :param time_limit: time limit of solve in seconds, the best solution found is returned when it is reached (no
+    limit if None)
+    :param mip_gap: relative gap between objective and best bound to stop solve (solver default if None)
+    :param callback: function of incumbent objective, best bound and solve time that is called for every new
+    incumbent, solve is stopped (with the incumbent as result) if it returns True
+    :return: string with DNA sequence, optimized for input protein (with objective value, metrics, solve status, best
+    bound and gap as attributes), NoSolution with solve status if solver found no solution
     """
-
-    start_time = time.time()
-
+    metrics = Metrics()
     aminoacids = list(protein_seq)
     N = len(aminoacids)
 
@@ -118,82 +174,110 @@ def min_rcpb_st_rcb_optimization(protein_seq: str, freq_codons: list, freq_codon
     test2 = np.sum(Y, axis=1)
     if len(test2) != N:
         print('warning! there exists undefined AA letter abbreviation')
+    metrics.lap("Y")
 
     M = _create_M()
     R = _create_R(aminoacids, M)
+    metrics.lap("R")
+
+    start = _create_start("MinRCPBstRCB", protein_seq, freq_codons, freq_codon_pair, threshold, warm_start, metrics)
+
+    if build == "matrix" or backend != "gurobi":
+        formulation = min_rcpb_st_rcb_formulation(R, Y, M, freq_codons, freq_codon_pair, threshold, metrics,
+                                                  linking)
+        return _optimize_formulation(formulation, names, threads, start, backend, time_limit, mip_gap, callback)
+    elif build != "loop":
+        raise Exception(f"Unknown build {build}")
+
+    model, X, Z = _create_min_rcpb_st_rcb_model(aminoacids, Y, M, R, freq_codons, freq_codon_pair, threshold,
+                                                metrics, linking)
+    if start is not None:
+        _set_start(X, Z, start)
+    optimize_gurobi(model, threads, time_limit, mip_gap, callback, 1 / (100 * (N - 1)))
+    metrics.lap("solve")
+    metrics.solved(model, 1 / (100 * (N - 1)))
+    if not model.SolCount:
+        return _no_solution(metrics)
+
+    objValue = model.objVal / (100 * (N - 1))
+
+    # Write codons into the file
+    codons = [(j) for (i, j) in X if X[i, j].X > 0.5]
+
+    ans = ""
+    for j in range(len(codons)):
+        ans += CODONS[codons[j]]
+    metrics.lap("solution")
+    print(metrics.total_time)
+    print("END")
+    return _solver_result(objValue, ans, metrics)
 
-    model, X = _create_model(aminoacids, R)
+
+def _create_min_rcpb_st_rcb_model(aminoacids, Y, M, R, freq_codons, freq_codon_pair, threshold, metrics=None,
+                                  linking="weak"):
+    # Build MinRCPBstRCB model, constraints are generated only for codons and codon pairs that occur in protein
+    metrics = metrics or Metrics()
+    if linking not in LINKINGS:
+        raise Exception(f"Unknown linking {linking}")
+    from gurobipy import GRB
+    N = len(aminoacids)
+    candidates, aa_pair_positions, codon_positions, pair_positions = _create_pair_index(aminoacids, R)
+    metrics.lap("index")
+
+    model, X = _create_model(aminoacids, R, metrics)
 
     Z = {}
     for i in range(len(aminoacids) - 1):
-        for j in range(len(CODONS)):
-            for k in range(len(CODONS)):
-                if R[i, j] == 1 and R[i + 1, k] == 1:
-                    Z[i, j, k] = model.addVar(vtype=GRB.BINARY, name="Z%s" % str([i, j, k]))
+        for j in candidates[i]:
+            for k in candidates[i + 1]:
+                Z[i, j, k] = model.addVar(vtype=GRB.BINARY, name="Z%s" % str([i, j, k]))
     model.update()
+    metrics.lap("variables/Z")
 
     for i in range(len(aminoacids) - 1):
-        jvar = []
-        kvar = []
-        for j in range(len(CODONS)):
-            if R[i, j] == 1:
-                jvar.append(j)
-        for k in range(len(CODONS)):
-            if R[i + 1, k] == 1:
-                kvar.append(k)
-        model.addConstr(sum(Z[i, l, n] for l in jvar for n in kvar), GRB.EQUAL, 1)
-        for l in jvar:
-            for m in kvar:
-                model.addConstr(X[i, l] + X[i + 1, m] >= 2 * Z[i, l, m])
-                model.addConstr(X[i, l] + X[i + 1, m] <= Z[i, l, m] + 1)
+        jvar = candidates[i]
+        kvar = candidates[i + 1]
+        _add_link_constraints(model, X, Z, i, jvar, kvar, linking)
     model.update()
+    metrics.lap("constraints/pair_assignment, link")
 
     codondev = {}
     for i in range(len(CODONS)):
         codondev[i] = model.addVar(vtype=GRB.CONTINUOUS, name="codondev%s" % str([i]))
     model.update()
-
-    eta = np.sum(Y, axis=0)
-    for j in range(len(CODONS)):
-        xvar = []
-        etatemp = []
-        for k in range(len(AMINOACIDS)):
-            if M[k, j] == 1:
-                etatemp = eta[k]
-        for i in range(len(aminoacids)):
-            if R[i, j] == 1:
-                xvar.append(i)
-        if etatemp != 0:
-            model.addConstr(100 * sum(X[i, j] for i in xvar) / etatemp, GRB.LESS_EQUAL,
-                        100 * (freq_codons[j] + codondev[j]))
-            model.addConstr(100 * sum(X[i, j] for i in xvar) / etatemp, GRB.GREATER_EQUAL,
-                        100 * (freq_codons[j] - codondev[j]))
+    metrics.lap("variables/codondev")
+
+    # number of positions of codon is the number of its amino acid in protein
+    for j in sorted(codon_positions):
+        xvar = codon_positions[j]
+        etatemp = len(xvar)
+        model.addConstr(100 * sum(X[i, j] for i in xvar) / etatemp <= 100 * (freq_codons[j] + codondev[j]))
+        model.addConstr(100 * sum(X[i, j] for i in xvar) / etatemp >= 100 * (freq_codons[j] - codondev[j]))
     model.update()
+    metrics.lap("constraints/codondev_ub, codondev_lb")
 
     codonpairdev = {}
     for j in range(len(CODONS)):
         for k in range(len(CODONS)):
             codonpairdev[j, k] = model.addVar(vtype=GRB.CONTINUOUS, name="codonpairdev%s" % str([j, k]))
     model.update()
-
-    for j in range(len(CODONS)):
-        for k in range(len(CODONS)):
-            ivar = []
-            for i in range(len(aminoacids) - 1):
-                if R[i, j] == 1 and R[i + 1, k] == 1:
-                    ivar.append(i)
-            if len(ivar) != 0:
-                etapairtemp = len(ivar)
-                model.addConstr(100 * sum(Z[i, j, k] for i in ivar) / etapairtemp, GRB.LESS_EQUAL,
-                            100 * (freq_codon_pair[j][k] + codonpairdev[j, k]))
-                model.addConstr(100 * sum(Z[i, j, k] for i in ivar) / etapairtemp, GRB.GREATER_EQUAL,
-                            100 * (freq_codon_pair[j][k] - codonpairdev[j, k]))
+    metrics.lap("variables/codonpairdev")
+
+    for (j, k) in sorted(pair_positions):
+        ivar = pair_positions[j, k]
+        etapairtemp = len(ivar)
+        model.addConstr(100 * sum(Z[i, j, k] for i in ivar) / etapairtemp <=
+                        100 * (freq_codon_pair[j][k] + codonpairdev[j, k]))
+        model.addConstr(100 * sum(Z[i, j, k] for i in ivar) / etapairtemp >=
+                        100 * (freq_codon_pair[j][k] - codonpairdev[j, k]))
     model.update()
+    metrics.lap("constraints/codonpairdev_ub, codonpairdev_lb")
 
     AAdev = {}
     for i in range(len(AMINOACIDS)):
         AAdev[i] = model.addVar(vtype=GRB.CONTINUOUS, name="AAdev%s" % str([i]))
     model.update()
+    metrics.lap("variables/AAdev")
 
     NumAminoAcidCodonPossibility = (np.sum(M, axis=1))
     for i in range(len(AMINOACIDS)):
@@ -201,16 +285,18 @@ def min_rcpb_st_rcb_optimization(protein_seq: str, freq_codons: list, freq_codon
         for j in range(len(CODONS)):
             if M[i, j] == 1:
                 jvar.append(j)
-        model.addConstr(100 * sum(codondev[j] for j in jvar) / NumAminoAcidCodonPossibility[i], GRB.EQUAL, 100 * AAdev[i])
+        model.addConstr(100 * sum(codondev[j] for j in jvar) / NumAminoAcidCodonPossibility[i] == 100 * AAdev[i])
     model.update()
+    metrics.lap("constraints/AAdev")
 
     AApairdev = {}
     for i in range(len(AMINOACIDS)):
         for j in range(len(AMINOACIDS)):
             AApairdev[i, j] = model.addVar(vtype=GRB.CONTINUOUS, name="AApairdev%s" % str([i, j]))
     model.update()
+    metrics.lap("variables/AApairdev")
 
-    NumAminoAcidPairCodoPairPossibility = np.zeros((len(AMINOACIDS), len(AMINOACIDS)), dtype=np.int)
+    NumAminoAcidPairCodoPairPossibility = np.zeros((len(AMINOACIDS), len(AMINOACIDS)), dtype=int)
     for i in range(len(AMINOACIDS)):
         for m in range(len(AMINOACIDS)):
             NumAminoAcidPairCodoPairPossibility[i, m] = np.sum(M[i]) * np.sum(M[m])
@@ -226,54 +312,55 @@ def min_rcpb_st_rcb_optimization(protein_seq: str, freq_codons: list, freq_codon
                 if M[j, l] == 1:
                     lvar.append(l)
             model.addConstr(
-                100 * sum(codonpairdev[k, l] for k in kvar for l in lvar) / NumAminoAcidPairCodoPairPossibility[i, j],
-                GRB.EQUAL, 100 * AApairdev[i, j])
+                100 * sum(codonpairdev[k, l] for k in kvar for l in lvar) / NumAminoAcidPairCodoPairPossibility[i, j] ==
+                100 * AApairdev[i, j])
     model.update()
+    metrics.lap("constraints/AApairdev")
 
     NumAA = np.sum(Y, axis=0)
     maxRCB = threshold * N
-    model.addConstr(100 * sum(AAdev[j] * NumAA[j] for (j) in AAdev), GRB.LESS_EQUAL, 100 * maxRCB)
+    model.addConstr(100 * sum(AAdev[j] * NumAA[j] for (j) in AAdev) <= 100 * maxRCB)
     model.update()
+    metrics.lap("constraints/maxRCB")
 
-    NumAApairs = np.zeros((len(AMINOACIDS), len(AMINOACIDS)), dtype=np.int)
-    for j in range(len(AMINOACIDS)):
-        for k in range(len(AMINOACIDS)):
-            for i in range(len(aminoacids) - 1):
-                if Y[i, j] == 1 and Y[i + 1, k] == 1:
-                    NumAApairs[j, k] = NumAApairs[j, k] + 1
+    NumAApairs = np.zeros((len(AMINOACIDS), len(AMINOACIDS)), dtype=int)
+    for aa_pair, positions in aa_pair_positions.items():
+        if aa_pair[0] in AMINOACIDS and aa_pair[1] in AMINOACIDS:
+            NumAApairs[AMINOACIDS.index(aa_pair[0]), AMINOACIDS.index(aa_pair[1])] = len(positions)
 
     obj = 100 * sum(AApairdev[i, j] * NumAApairs[i, j] for (i, j) in AApairdev)
     model.setObjective(obj, GRB.MINIMIZE)
-    model.optimize()
-
-    objValue = model.objVal / (100 * (N - 1))
+    model.update()
+    metrics.lap("objective")
+    return model, X, Z
 
-    # Write codons into the file
-    codons = [(j) for (i, j) in X if X[i, j].X == 1]
 
-    ans = ""
-    for j in range(len(codons)):
-        ans += CODONS[codons[j]]
-    elapsed_time = time.time() - start_time
-    print(elapsed_time)
-    print("END")
-    return f"Objective function value: {objValue}\n" + ans + "\n"
+def _add_link_constraints(model, X, Z, i, jvar, kvar, linking):
+    # constraints of codon pair of amino acids i and i+1 (see _add_chain_constraints of formulation)
+    if linking == "flow":
+        for l in jvar:
+            model.addConstr(sum(Z[i, l, n] for n in kvar) == X[i, l])
+        for n in kvar:
+            model.addConstr(sum(Z[i, l, n] for l in jvar) == X[i + 1, n])
+        return
+    model.addConstr(sum(Z[i, l, n] for l in jvar for n in kvar) == 1)
+    for l in jvar:
+        for n in kvar:
+            model.addConstr(X[i, l] + X[i + 1, n] >= 2 * Z[i, l, n])
+            model.addConstr(X[i, l] + X[i + 1, n] <= Z[i, l, n] + 1)
 
 
 def _create_Y(aminoacids):
-    # Y matrix whose entry yij  is equal to 1 if ith amino acid in the protein is the j th amino acid in our list.
-    N = len(aminoacids)
-    Y = np.zeros((N, len(AMINOACIDS)), dtype=np.int)
-    for i in range(len(aminoacids)):
-        for j in range(len(AMINOACIDS)):
-            if aminoacids[i] == AMINOACIDS[j]:
-                Y[i, j] = 1
+    # Y matrix whose entry yij  is True if ith amino acid in the protein is the j th amino acid in our list.
+    Y = np.zeros((len(aminoacids), len(AMINOACIDS)), dtype=bool)
+    positions, aa = _aminoacid_indexes(aminoacids)
+    Y[positions, aa] = True
     return Y
 
 
 def _create_M():
-    # M matrix whose entry mjk  is equal to 1 if jth amino acid can be represented by codon k.
-    M = np.zeros((len(AMINOACIDS), len(CODONS)), dtype=np.int)
+    # M matrix whose entry mjk  is True if jth amino acid can be represented by codon k.
+    M = np.zeros((len(AMINOACIDS), len(CODONS)), dtype=bool)
     M[0, 0:3] = [1, 1, 1]
     M[1, 3:9] = [1, 1, 1, 1, 1, 1]
     M[2, 9:13] = [1, 1, 1, 1]
@@ -300,17 +387,23 @@ def _create_M():
 
 def _create_R(aminoacids, M):
     # R matrix for possible codonset of amino acids in the protein
-    R = np.zeros((len(aminoacids), len(CODONS)), dtype=np.int)
-    for i in range(len(aminoacids)):
-        for j in range(len(AMINOACIDS)):
-            if aminoacids[i] == AMINOACIDS[j]:
-                R[i] = M[j]
-                break
+    R = np.zeros((len(aminoacids), len(CODONS)), dtype=bool)
+    positions, aa = _aminoacid_indexes(aminoacids)
+    R[positions] = M[aa]
     return R
 
 
-def _create_model(aminoacids, R):
+def _aminoacid_indexes(aminoacids):
+    # positions of known amino acids in protein and their indexes in AMINOACIDS
+    aa_index = {aa: j for j, aa in enumerate(AMINOACIDS)}
+    positions = [i for i, aa in enumerate(aminoacids) if aa in aa_index]
+    return np.array(positions, dtype=np.intp), np.array([aa_index[aminoacids[i]] for i in positions], dtype=np.intp)
+
+
+def _create_model(aminoacids, R, metrics=None):
     # Build the Model
+    from gurobipy import GRB, Model
+    metrics = metrics or Metrics()
     model = Model("Codon Optimization")
 
     # Variable Xik=1 if ith amino acid of the protein is assigned to k th codon
@@ -320,6 +413,7 @@ def _create_model(aminoacids, R):
             if R[i, j] == 1:
                 X[i, j] = model.addVar(vtype=GRB.BINARY, name="X%s" % str([i, j]))
     model.update()
+    metrics.lap("variables/X")
 
     # Constraint that every aminoacid is assigned to exactly one codon
     for i in range(len(aminoacids)):
@@ -327,6 +421,86 @@ def _create_model(aminoacids, R):
         for j in range(len(CODONS)):
             if R[i, j] == 1:
                 xvar.append(j)
-        model.addConstr(sum(X[i, k] * R[i, k] for k in xvar), GRB.EQUAL, 1)
+        model.addConstr(sum(X[i, k] * R[i, k] for k in xvar) == 1)
     model.update()
+    metrics.lap("constraints/assignment")
     return model, X
+
+
+def _optimize_formulation(formulation: Formulation, names: bool, threads: int, start: np.ndarray = None,
+                          backend: str = "gurobi", time_limit: float = None, mip_gap: float = None,
+                          callback=None) -> OptimizationResult:
+    metrics = formulation.metrics
+    values, objective = solve_formulation(formulation, backend, threads, start, names, None, time_limit, mip_gap,
+                                          callback)
+    if values is None:
+        return _no_solution(metrics)
+
+    objValue = objective * formulation.scale
+    codons = formulation.index.codons(values[formulation.variables("X")])
+    ans = ""
+    for j in range(len(codons)):
+        ans += CODONS[codons[j]]
+    metrics.lap("solution")
+    return _solver_result(objValue, ans, metrics)
+
+
+def _no_solution(metrics):
+    # infeasible model or solve stopped by limit before the first solution: result of sequence without solution
+    status = status_name(metrics.model["status"])
+    metrics.lap("solution")
+    return NoSolution(f"solver status {status}", metrics, status, metrics.model.get("bound"))
+
+
+def _solver_result(objValue, ans, metrics):
+    # result with solve status, best bound and gap recorded in metrics
+    return OptimizationResult(objValue, ans, metrics, status_name(metrics.model["status"]), metrics.model.get("bound"),
+                              metrics.model.get("mip_gap"))
+
+
+def _create_start(method, protein_seq, line_data, matrix_data, threshold, warm_start, metrics):
+    # codons of MIP start (None without warm start)
+    if warm_start == "none":
+        return None
+    start = start_codons(method, protein_seq, line_data, matrix_data, threshold, warm_start)
+    metrics.model["start_objective"] = start_objective(method, start, matrix_data)
+    metrics.lap("warm_start")
+    return start
+
+
+def _set_start(X, Z, codons):
+    # MIP start of loop construction model: X and derived Z variables
+    for (i, j), x in X.items():
+        x.Start = 1.0 if codons[i] == j else 0.0
+    for (i, j, k), z in Z.items():
+        z.Start = 1.0 if codons[i] == j and codons[i + 1] == k else 0.0
+
+
+def _create_pair_index(aminoacids, R):
+    """
+    Index of protein chain created in one pass: codons available on each position, positions of each amino acid pair,
+    positions of each codon and of each codon pair that occur in protein.
+
+    :param aminoacids: amino acids of protein
+    :param R: matrix of possible codons for each amino acid of protein
+    :return: candidates, amino acid pair positions, codon positions, codon pair positions
+    """
+    candidates = [np.flatnonzero(R[i]).tolist() for i in range(len(aminoacids))]
+
+    aa_pair_positions = {}
+    for i in range(len(aminoacids) - 1):
+        aa_pair_positions.setdefault(aminoacids[i] + aminoacids[i + 1], []).append(i)
+
+    codon_positions = {}
+    for i, codons in enumerate(candidates):
+        for j in codons:
+            codon_positions.setdefault(j, []).append(i)
+
+    # all codon pairs of amino acid pair occur on the same positions
+    pair_positions = {}
+    for positions in aa_pair_positions.values():
+        i = positions[0]
+        for j in candidates[i]:
+            for k in candidates[i + 1]:
+                pair_positions[j, k] = positions
+    return candidates, aa_pair_positions, codon_positions, pair_positions
@@ -0,0 +1,96 @@
+import time
+
+
+class Metrics:
+    """
+    Timings of optimization phases and statistics of solved model. Time of phase is time since the end of previous
+    phase, phases are named "Y", "R", "variables/<block>", "constraints/<family>", "objective", "model", "solve" etc.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.model = {}
+        self._start = time.perf_counter()
+        self._clock = self._start
+
+    def lap(self, phase: str):
+        """
+        Finish phase: time since the end of previous phase is added to phase time.
+
+        :param phase: phase name
+        """
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._clock
+        self._clock = now
+
+    def solved(self, model, scale: float = 1.0):
+        """
+        Record dimensions of Gurobi model and statistics of its solution.
+
+        :param model: optimized Gurobi model
+        :param scale: scale of objective (best bound is recorded in units of objective function)
+        """
+        self.model["variables"] = model.NumVars
+        self.model["binaries"] = model.NumBinVars
+        self.model["constraints"] = model.NumConstrs
+        self.model["nonzeros"] = model.NumNZs
+        self.model["status"] = model.Status
+        self.model["runtime"] = model.Runtime
+        self.model["nodes"] = model.NodeCount
+        # bound is infinite (1e100) before the first node and for infeasible model
+        if model.IsMIP and model.Status != 3 and abs(model.ObjBound) < 1e100:
+            self.model["bound"] = model.ObjBound * scale
+            if model.SolCount:
+                self.model["mip_gap"] = model.MIPGap
+
+    @property
+    def total_time(self) -> float:
+        return self._clock - self._start
+
+    def to_dict(self) -> dict:
+        return {"total_time": self.total_time, "phases": dict(self.phases), **self.model}
+
+
+class OptimizationResult(str):
+    """
+    Result of optimization. It is the text written to output file ("Objective function value: ...", DNA sequence), so
+    it is used as string, objective value, DNA sequence and metrics of optimization are its attributes. Results of
+    solvers have solve status ("optimal", "time_limit", "interrupted", ...), best bound and relative gap between
+    objective and bound: result of stopped solve is the best solution found (incumbent).
+    """
+
+    def __new__(cls, objective: float, sequence: str, metrics: Metrics = None, status: str = None,
+                bound: float = None, gap: float = None):
+        result = super().__new__(cls, f"Objective function value: {objective}\n" + sequence + "\n")
+        result.objective = objective
+        result.sequence = sequence
+        result.metrics = metrics
+        result.status = status
+        result.bound = bound
+        result.gap = gap
+        return result
+
+    def __getnewargs__(self):
+        return self.objective, self.sequence, self.metrics, self.status, self.bound, self.gap
+
+
+class NoSolution(str):
+    """
+    Result of optimization of sequence without solution: threshold can not be reached or solve was stopped by limit
+    before the first solution was found. It is the text written to output file ("No solution: <reason>"), objective
+    and DNA sequence are None, so batch of sequences continues with the next sequence.
+    """
+
+    def __new__(cls, reason: str, metrics: Metrics = None, status: str = None, bound: float = None):
+        result = super().__new__(cls, f"No solution: {reason}\n")
+        result.reason = reason
+        result.objective = None
+        result.sequence = None
+        result.metrics = metrics
+        result.status = status
+        result.bound = bound
+        result.gap = None
+        return result
+
+    def __getnewargs__(self):
+        return self.reason, self.metrics, self.status, self.bound
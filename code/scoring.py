@@ -0,0 +1,195 @@
+import numpy as np
+
+from config import CODONS, CODON2AA, AMINOACIDS
+
+# index of amino acid of each codon (in CODONS order)
+CODON_AA = np.array([AMINOACIDS.index(CODON2AA[codon]) for codon in CODONS])
+# number of codons of each amino acid
+AA_CODONS = np.bincount(CODON_AA, minlength=len(AMINOACIDS))
+# index of nucleotide of each byte of DNA sequence (A, C, G, T in upper or lower case, U as T), 4 for other bytes
+NUCLEOTIDE_INDEX = np.full(256, 4, dtype=np.uint8)
+for _index, _nucleotides in enumerate(["Aa", "Cc", "Gg", "TtUu"]):
+    NUCLEOTIDE_INDEX[[ord(n) for n in _nucleotides]] = _index
+# codon index (in CODONS order) of codon with nucleotide indexes n1, n2, n3 at 16 * n1 + 4 * n2 + n3
+CODON_INDEX = np.array([CODONS.index(a + b + c) for a in "ACGT" for b in "ACGT" for c in "ACGT"])
+# number of sequences scored together by score_records
+BATCH_SIZE = 1024
+# fields of scores
+SCORES = ("cai", "cpb", "rcb", "rcpb")
+
+
+def cai(codons, fitness_values) -> float:
+    """
+    Codon Adaptation Index (CAI): geometric mean of fitness values of codons.
+
+    :param codons: codon indexes (in CODONS order) of DNA sequence
+    :param fitness_values: fitness values list
+    :return: CAI
+    """
+    codons = np.asarray(codons)
+    return float(np.exp(np.log(np.asarray(fitness_values, dtype=np.double)[codons]).mean()))
+
+
+def cpb(codons, cps) -> float:
+    """
+    Codon Pair Bias (CPB) index: mean Codon Pair Score of adjacent codons (MaxCPBstCAI objective).
+
+    :param codons: codon indexes (in CODONS order) of DNA sequence
+    :param cps: Codon Pair Score (CPS) table
+    :return: CPB
+    """
+    codons = np.asarray(codons)
+    if len(codons) < 2:
+        return 0.0
+    return float(np.asarray(cps, dtype=np.double)[codons[:-1], codons[1:]].sum() / (len(codons) - 1))
+
+
+def rcb(codons, freq_codons) -> float:
+    """
+    Relative Codon Bias (RCB) index as in MinRCPBstRCB model: deviation of codon usage from observed frequency,
+    averaged over codons of amino acid and weighted by number of amino acid in protein.
+
+    :param codons: codon indexes (in CODONS order) of DNA sequence
+    :param freq_codons: observed frequency of each codon
+    :return: RCB
+    """
+    codons = np.asarray(codons)
+    aminoacids = CODON_AA[codons]
+    eta = np.bincount(aminoacids, minlength=len(AMINOACIDS))
+    codon_eta = eta[CODON_AA]
+    usage = np.bincount(codons, minlength=len(CODONS)) / np.maximum(codon_eta, 1)
+    codondev = np.where(codon_eta > 0, np.abs(usage - np.asarray(freq_codons, dtype=np.double)), 0.0)
+    AAdev = np.bincount(CODON_AA, codondev, minlength=len(AMINOACIDS)) / AA_CODONS
+    return float(eta @ AAdev / len(codons))
+
+
+def rcpb(codons, freq_codon_pair) -> float:
+    """
+    Relative Codon Pair Bias (RCPB) index as in MinRCPBstRCB model (objective): deviation of codon pair usage from
+    observed frequency, averaged over codon pairs of amino acid pair and weighted by number of amino acid pair in
+    protein.
+
+    :param codons: codon indexes (in CODONS order) of DNA sequence
+    :param freq_codon_pair: observed frequency of codon pair
+    :return: RCPB
+    """
+    codons = np.asarray(codons)
+    if len(codons) < 2:
+        return 0.0
+    n_codons, n_aa = len(CODONS), len(AMINOACIDS)
+    aminoacids = CODON_AA[codons]
+    aa_pairs = np.bincount(aminoacids[:-1] * n_aa + aminoacids[1:], minlength=n_aa * n_aa)
+    pair_aa = (CODON_AA[:, None] * n_aa + CODON_AA[None, :]).ravel()
+    pair_eta = aa_pairs[pair_aa]
+    usage = np.bincount(codons[:-1] * n_codons + codons[1:], minlength=n_codons * n_codons) / np.maximum(pair_eta, 1)
+    pairdev = np.where(pair_eta > 0, np.abs(usage - np.asarray(freq_codon_pair, dtype=np.double).ravel()), 0.0)
+    AApairdev = np.bincount(pair_aa, pairdev, minlength=n_aa * n_aa) / np.outer(AA_CODONS, AA_CODONS).ravel()
+    return float(aa_pairs @ AApairdev / (len(codons) - 1))
+
+
+def encode(sequences: list, ids: list = None) -> (np.ndarray, np.ndarray):
+    """
+    Encode DNA sequences to codon indexes.
+
+    :param sequences: DNA sequences (length of each sequence is multiple of 3)
+    :param ids: ids of sequences for error messages (numbers of sequences by default)
+    :return: codon indexes (in CODONS order) of sequences (rows padded with zeros to the longest sequence), number of
+    codons of each sequence
+    """
+    ids = ids or [f"{k + 1}" for k in range(len(sequences))]
+    lengths = np.array([len(seq) for seq in sequences], dtype=np.intp)
+    for k in np.flatnonzero((lengths % 3 != 0) | (lengths == 0)):
+        raise Exception(f"Length of sequence {ids[k]} is {lengths[k]}, it is not positive multiple of 3")
+    nucleotides = NUCLEOTIDE_INDEX[np.frombuffer("".join(sequences).encode(), dtype=np.uint8)]
+    if len(nucleotides) != lengths.sum() or (nucleotides > 3).any():
+        for k, seq in enumerate(sequences):
+            unknown = sorted(set(seq.upper()) - set("ACGTU"))
+            if unknown:
+                raise Exception(f"Unknown nucleotides {', '.join(unknown)} in sequence {ids[k]}")
+    codes = nucleotides.reshape(-1, 3).astype(np.intp) @ np.array([16, 4, 1])
+    lengths //= 3
+    codons = np.zeros((len(sequences), lengths.max(initial=0)), dtype=np.intp)
+    codons[np.arange(codons.shape[1]) < lengths[:, None]] = CODON_INDEX[codes]
+    return codons, lengths
+
+
+def score_batch(codons: np.ndarray, lengths: np.ndarray, fitness_values, cps, freq_codons,
+                freq_codon_pair) -> dict:
+    """
+    CAI, CPB, RCB and RCPB indexes of batch of sequences (see cai, cpb, rcb and rcpb functions), computed together for
+    all sequences.
+
+    :param codons: codon indexes of sequences (see encode)
+    :param lengths: number of codons of each sequence
+    :param fitness_values: fitness values list
+    :param cps: Codon Pair Score (CPS) table
+    :param freq_codons: observed frequency of each codon
+    :param freq_codon_pair: observed frequency of codon pair
+    :return: dictionary with array of each index ("cai", "cpb", "rcb", "rcpb")
+    """
+    n_codons, n_aa = len(CODONS), len(AMINOACIDS)
+    B = len(codons)
+    positions = np.arange(codons.shape[1]) < lengths[:, None]
+    pairs = positions[:, 1:]
+    first, second = codons[:, :-1], codons[:, 1:]
+    rows = np.broadcast_to(np.arange(B)[:, None], codons.shape)
+    n_pairs = np.maximum(lengths - 1, 1)
+
+    with np.errstate(divide="ignore"):
+        log_fitness_values = np.log(np.asarray(fitness_values, dtype=np.double))
+    cai_values = np.exp(np.where(positions, log_fitness_values[codons], 0.0).sum(axis=1) / lengths)
+    cpb_values = np.where(pairs, np.asarray(cps, dtype=np.double)[first, second], 0.0).sum(axis=1) / n_pairs
+
+    # RCB * N is sum of |codon count - amino acid count * frequency| / number of synonymous codons over codons
+    counts = np.bincount((rows * n_codons + codons)[positions], minlength=B * n_codons).reshape(B, n_codons)
+    eta = (counts @ (CODON_AA[:, None] == np.arange(n_aa))).astype(np.double)
+    deviation = np.abs(counts - eta[:, CODON_AA] * np.asarray(freq_codons, dtype=np.double))
+    rcb_values = deviation @ (1 / AA_CODONS[CODON_AA]) / lengths
+
+    # RCPB * (N - 1) is the same sum over codon pairs: sum of weighted expected counts (sum over amino acid pairs) with
+    # correction for codon pairs of sequence, so only codon pairs of sequences are counted
+    pair_aa = (CODON_AA[:, None] * n_aa + CODON_AA[None, :]).ravel()
+    pair_weights = 1 / np.outer(AA_CODONS[CODON_AA], AA_CODONS[CODON_AA]).ravel()
+    freq_codon_pair = np.asarray(freq_codon_pair, dtype=np.double).ravel()
+    aminoacids = CODON_AA[codons]
+    aa_pairs = np.bincount((rows[:, 1:] * n_aa ** 2 + aminoacids[:, :-1] * n_aa + aminoacids[:, 1:])[pairs],
+                           minlength=B * n_aa ** 2).reshape(B, n_aa ** 2)
+    expected = aa_pairs @ np.bincount(pair_aa, pair_weights * freq_codon_pair, minlength=n_aa ** 2)
+    keys, pair_counts = np.unique((rows[:, 1:] * n_codons ** 2 + first * n_codons + second)[pairs],
+                                  return_counts=True)
+    sequence, pair = np.divmod(keys, n_codons ** 2)
+    pair_expected = aa_pairs[sequence, pair_aa[pair]] * freq_codon_pair[pair]
+    correction = pair_weights[pair] * (np.abs(pair_counts - pair_expected) - pair_expected)
+    rcpb_values = (expected + np.bincount(sequence, correction, minlength=B)) / n_pairs
+
+    return {"cai": cai_values, "cpb": cpb_values, "rcb": rcb_values, "rcpb": rcpb_values}
+
+
+def score_records(records, fitness_values, cps, freq_codons, freq_codon_pair, batch_size: int = BATCH_SIZE):
+    """
+    Score DNA sequences lazily by batches, so large (genome-scale) FASTA files can be scored.
+
+    :param records: (record id, DNA sequence) pairs (any iterable, for example extractor.read_fasta)
+    :param fitness_values: fitness values list
+    :param cps: Codon Pair Score (CPS) table
+    :param freq_codons: observed frequency of each codon
+    :param freq_codon_pair: observed frequency of codon pair
+    :param batch_size: number of sequences scored together
+    :return: generator of (record id, number of codons, dictionary with CAI, CPB, RCB and RCPB)
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield from _score_records_batch(batch, fitness_values, cps, freq_codons, freq_codon_pair)
+            batch = []
+    if batch:
+        yield from _score_records_batch(batch, fitness_values, cps, freq_codons, freq_codon_pair)
+
+
+def _score_records_batch(batch: list, fitness_values, cps, freq_codons, freq_codon_pair):
+    ids = [record_id for record_id, _ in batch]
+    codons, lengths = encode([seq for _, seq in batch], ids)
+    scores = score_batch(codons, lengths, fitness_values, cps, freq_codons, freq_codon_pair)
+    for k, record_id in enumerate(ids):
+        yield record_id, int(lengths[k]), {name: float(scores[name][k]) for name in SCORES}
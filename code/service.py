@@ -0,0 +1,335 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pipe, Process
+
+import numpy as np
+
+from code.batch import get_optimization
+from code.extractor import _extract_built_data, find_organisms
+from config import DB_DIR
+
+# max number of jobs waiting for worker
+QUEUE_SIZE = 1000
+# default time limit of job in seconds (worker is restarted when job takes longer)
+TIME_LIMIT = 60.0
+# number of recent jobs for latency percentiles
+LATENCY_WINDOW = 1000
+# max size of request body in bytes
+MAX_BODY = 64 * 1024 ** 2
+# methods whose tables are loaded for preloaded organisms
+METHODS = ("MaxCPBstCAI", "MinRCPBstRCB")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class ServiceMetrics:
+    """
+    Counters of jobs and latencies of recent jobs: wait (from submission to start on worker), run (time on worker) and
+    total time.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counts = {"submitted": 0, "completed": 0, "failed": 0, "timed_out": 0, "rejected": 0}
+        self.latencies = {name: deque(maxlen=LATENCY_WINDOW) for name in ("wait", "run", "total")}
+
+    def finished(self, status: str, wait: float, run: float):
+        """
+        Record finished job.
+
+        :param status: "completed", "failed" or "timed_out"
+        :param wait: time in queue, s
+        :param run: time on worker, s
+        """
+        self.counts[status] += 1
+        self.latencies["wait"].append(wait)
+        self.latencies["run"].append(run)
+        self.latencies["total"].append(wait + run)
+
+    def to_dict(self, queue_depth: int, running: int, workers: int) -> dict:
+        latencies = {}
+        for name, values in self.latencies.items():
+            if values:
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                latencies[name] = {"mean": float(np.mean(values)), "p50": float(p50), "p95": float(p95),
+                                   "p99": float(p99), "max": float(np.max(values))}
+        return {"uptime": time.time() - self.started, "workers": workers, "queue_depth": queue_depth,
+                "running": running, **self.counts, "latency": latencies}
+
+
+class _Job:
+    # optimization of one sequence
+    def __init__(self, request: dict, time_limit: float):
+        self.request = request
+        self.time_limit = time_limit
+        self.submitted = time.perf_counter()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class _Worker:
+    """
+    Worker process with warm organism tables and solver environment, it runs one job at a time. Worker that exceeds
+    time limit of job is killed and started again.
+    """
+
+    def __init__(self, organisms: list, threads: int):
+        self._organisms = organisms
+        self._threads = threads
+        self._start()
+
+    def _start(self):
+        self._conn, child = Pipe()
+        self._process = Process(target=_worker_main, args=(child, self._organisms, self._threads), daemon=True)
+        self._process.start()
+        child.close()
+
+    def run(self, request: dict) -> tuple:
+        # blocking, called in thread
+        self._conn.send(request)
+        return self._conn.recv()
+
+    def restart(self):
+        self._process.kill()
+        self._process.join()
+        self._start()
+
+    def close(self):
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._process.join(1)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+
+
+class OptimizationService:
+    """
+    Local optimization service: jobs are accepted by HTTP (TCP or Unix socket), queued and run by a fixed number of
+    long-lived worker processes. Worker keeps organism tables and Gurobi environment, so job pays only for its solve.
+
+    Requests (JSON):
+    - POST /optimize {"organism", "method", "threshold", "sequence" or "sequences" (list of sequences or
+      {"id", "sequence"} objects), optional "engine", "settings" (keyword arguments of optimization function),
+      "time_limit"} -> {"results": [{"id", "objective", "sequence", "metrics"} or {"id", "error"}]}
+    - GET /metrics -> queue depth, number of running jobs, job counters and latencies
+    - GET /health -> {"status": "ok"}
+    """
+
+    def __init__(self, workers: int = 1, organisms: list = None, time_limit: float = TIME_LIMIT,
+                 queue_size: int = QUEUE_SIZE, cores: int = None):
+        """
+        :param workers: number of worker processes
+        :param organisms: organisms whose tables are loaded at start (other organisms are loaded at first job)
+        :param time_limit: default time limit of job in seconds
+        :param queue_size: max number of waiting jobs, requests are rejected when queue is full
+        :param cores: number of cores for all workers (all cores of host by default), each Gurobi solve gets
+        cores / workers threads
+        """
+        self.workers = workers
+        self.organisms = organisms or []
+        # tables are checked before workers are started (they are mapped to memory, so it is cheap)
+        for organism in self.organisms:
+            for method in METHODS:
+                _extract_built_data(DB_DIR, organism, method)
+        self.time_limit = time_limit
+        self.queue_size = queue_size
+        self.threads = max(1, (cores or os.cpu_count()) // workers)
+        self.metrics = ServiceMetrics()
+        self.running = 0
+        self._queue = None
+        self._workers = []
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8650, socket: str = None):
+        """
+        Start workers and serve requests until cancelled.
+
+        :param host: host of TCP server
+        :param port: port of TCP server
+        :param socket: path to Unix socket (used instead of TCP server)
+        """
+        self._queue = asyncio.Queue(self.queue_size)
+        # threads wait for results of workers (killed workers may keep their threads for a moment)
+        executor = ThreadPoolExecutor(2 * self.workers)
+        self._workers = [_Worker(self.organisms, self.threads) for _ in range(self.workers)]
+        schedulers = [asyncio.create_task(self._schedule(worker, executor)) for worker in self._workers]
+        if socket:
+            server = await asyncio.start_unix_server(self._handle, socket)
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+        try:
+            async with server:
+                print(f"Serving on {socket or f'http://{host}:{port}'} with {self.workers} workers")
+                await server.serve_forever()
+        finally:
+            for scheduler in schedulers:
+                scheduler.cancel()
+            for worker in self._workers:
+                worker.close()
+            executor.shutdown(wait=False)
+            if socket and os.path.exists(socket):
+                os.remove(socket)
+
+    async def submit(self, request: dict, time_limit: float = None) -> dict:
+        """
+        Queue optimization of one sequence and wait for its result.
+
+        :param request: job: organism, method, threshold, sequence, optional engine and settings
+        :param time_limit: time limit of job in seconds (default time limit of service if None)
+        :return: result ({"objective", "sequence", "metrics"} or {"error"})
+        """
+        return await self._enqueue(request, time_limit).future
+
+    def _enqueue(self, request: dict, time_limit: float = None) -> _Job:
+        # queue job without waiting: jobs of request are queued together after capacity of queue is checked
+        job = _Job(request, time_limit or self.time_limit)
+        self._queue.put_nowait(job)
+        self.metrics.counts["submitted"] += 1
+        return job
+
+    async def _schedule(self, worker: _Worker, executor: ThreadPoolExecutor):
+        # jobs of queue are run on worker one by one
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            started = time.perf_counter()
+            self.running += 1
+            try:
+                status, value = await asyncio.wait_for(loop.run_in_executor(executor, worker.run, job.request),
+                                                       job.time_limit)
+                result = value if status == "ok" else {"error": value}
+                status = "completed" if status == "ok" else "failed"
+            except asyncio.TimeoutError:
+                worker.restart()
+                result, status = {"error": f"Time limit {job.time_limit} s is exceeded"}, "timed_out"
+            except (EOFError, OSError) as e:
+                # worker died
+                worker.restart()
+                result, status = {"error": f"Worker failed: {e!r}"}, "failed"
+            finally:
+                self.running -= 1
+            self.metrics.finished(status, started - job.submitted, time.perf_counter() - started)
+            if not job.future.done():
+                job.future.set_result(result)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # one HTTP request per connection
+        try:
+            request_line = (await reader.readline()).decode()
+            method, path = request_line.split()[:2]
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY:
+                status, payload = 413, {"error": f"Request body is larger than {MAX_BODY} bytes"}
+            else:
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._route(method, path, body)
+        except Exception as e:
+            status, payload = 400, {"error": str(e)}
+        data = json.dumps(payload, default=_builtin).encode()
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> (int, dict):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics.to_dict(self._queue.qsize(), self.running, self.workers)
+        if method == "POST" and path == "/optimize":
+            return await self._optimize(json.loads(body or b"{}"))
+        return 404, {"error": f"Unknown request {method} {path}"}
+
+    async def _optimize(self, request: dict) -> (int, dict):
+        for key in ("organism", "method", "threshold"):
+            if key not in request:
+                raise Exception(f"No {key} in request")
+        if "sequences" in request:
+            sequences = request["sequences"]
+        elif "sequence" in request:
+            sequences = [{"id": request.get("id", "seq1"), "sequence": request["sequence"]}]
+        else:
+            raise Exception("No sequence in request")
+        sequences = [s if isinstance(s, dict) else {"id": f"seq{k + 1}", "sequence": s}
+                     for k, s in enumerate(sequences)]
+        # organism is a directory name of database
+        if request["organism"] not in find_organisms(DB_DIR):
+            return 400, {"error": f"Unknown organism {request['organism']}"}
+
+        common = {key: request[key] for key in ("organism", "method", "threshold")}
+        common["engine"] = request.get("engine", "mip")
+        common["settings"] = request.get("settings", {})
+        time_limit = request.get("time_limit")
+        # capacity is checked and all jobs are queued without awaiting, so concurrent requests can not overfill queue
+        if self._queue.qsize() + len(sequences) > self.queue_size:
+            self.metrics.counts["rejected"] += len(sequences)
+            return 503, {"error": "Queue is full", "queue_depth": self._queue.qsize()}
+        jobs = [self._enqueue({**common, "sequence": s["sequence"]}, time_limit) for s in sequences]
+        results = await asyncio.gather(*(job.future for job in jobs))
+        return 200, {"results": [{"id": s.get("id", f"seq{k + 1}"), **result}
+                                 for k, (s, result) in enumerate(zip(sequences, results))]}
+
+
+def _worker_main(conn, organisms: list, threads: int):
+    """
+    Loop of worker process: jobs are received from pipe, results are sent back. Organism tables are loaded once,
+    Gurobi environment is created before the first job.
+    """
+    # models built by loop print time of optimization
+    sys.stdout = open(os.devnull, "w")
+    tables = {(organism, method): _extract_built_data(DB_DIR, organism, method)
+              for organism in organisms for method in METHODS}
+    try:
+        import gurobipy
+        gurobipy.setParam("OutputFlag", 0)
+        gurobipy.Model().dispose()
+    except Exception:
+        # engines without Gurobi (dp, anneal) are available
+        pass
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        try:
+            conn.send(("ok", _run_job(request, tables, threads)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+def _run_job(request: dict, tables: dict, threads: int) -> dict:
+    organism, method, engine = request["organism"], request["method"], request["engine"]
+    optimization = get_optimization(method, engine)
+    key = (organism, method)
+    if key not in tables:
+        tables[key] = _extract_built_data(DB_DIR, organism, method)
+    line_data, matrix_data = tables[key]
+    settings = dict(request["settings"])
+    if engine in ("mip", "windowed"):
+        settings.setdefault("threads", threads)
+    result = optimization(request["sequence"], line_data, matrix_data, float(request["threshold"]), **settings)
+    metrics = getattr(result, "metrics", None)
+    return {"objective": result.objective, "sequence": result.sequence, "status": getattr(result, "status", None),
+            "metrics": metrics.to_dict() if metrics is not None else {}}
+
+
+def _builtin(value):
+    # NumPy scalars of metrics for JSON
+    return value.item() if hasattr(value, "item") else str(value)
@@ -0,0 +1,95 @@
+import math
+
+from code.backends import optimize_gurobi, solve_formulation, status_name, _create_matrix_model
+from code.formulation import max_cpb_st_cai_formulation, min_rcpb_st_rcb_formulation
+from code.optimizer import _create_M, _create_R, _create_Y, _no_solution
+from code.result import Metrics, OptimizationResult
+from code.scoring import cai, rcb
+from config import CODONS
+
+
+def threshold_sweep(method: str, protein_seq: str, line_data: list, matrix_data: list, thresholds: list,
+                    threads: int = 0, linking: str = "weak", backend: str = "gurobi", time_limit: float = None,
+                    mip_gap: float = None) -> list:
+    """
+    Trade-off curve between objective and threshold (CPB vs CAI for MaxCPBstCAI, RCPB vs RCB for MinRCPBstRCB). Model
+    is built once, only right hand side of threshold constraint (minCAI or maxRCB) is changed for each threshold.
+    Thresholds are solved from the tightest to the loosest, so solution for previous threshold is feasible and is used
+    as MIP start (Gurobi model is kept between thresholds, HiGHS of SciPy solves model in matrix form again).
+
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param protein_seq: sequence of protein for optimization
+    :param line_data: fitness values or observed codon frequencies
+    :param matrix_data: Codon Pair Score table or observed codon pair frequencies
+    :param thresholds: thresholds for CAI or RCB
+    :param threads: number of solver threads (0 lets solver choose)
+    :param linking: linking of X and Z variables, "weak" or "flow"
+    :param backend: solver, "gurobi" or "highs"
+    :param time_limit: time limit of solve of each threshold in seconds (no limit if None)
+    :param mip_gap: relative gap between objective and best bound to stop solve (solver default if None)
+    :return: list of (threshold, result) in order of thresholds, result is NoSolution with solve status if there
+    is no solution
+    """
+    metrics = Metrics()
+    aminoacids = list(protein_seq)
+    N = len(aminoacids)
+    Y = _create_Y(aminoacids)
+    M = _create_M()
+    R = _create_R(aminoacids, M)
+    metrics.lap("R")
+
+    if method == "MaxCPBstCAI":
+        formulation = max_cpb_st_cai_formulation(R, line_data, matrix_data, thresholds[0], metrics, linking)
+        family = "minCAI"
+        order = sorted(range(len(thresholds)), key=lambda t: -thresholds[t])
+    elif method == "MinRCPBstRCB":
+        formulation = min_rcpb_st_rcb_formulation(R, Y, M, line_data, matrix_data, thresholds[0], metrics, linking)
+        family = "maxRCB"
+        order = sorted(range(len(thresholds)), key=lambda t: thresholds[t])
+    else:
+        raise Exception(f"Unknown method {method}")
+    model = None
+    if backend == "gurobi":
+        model, v = _create_matrix_model(formulation)
+        model.update()
+        constraint = model.getConstrs()[formulation.family(family).start]
+    metrics.lap("model")
+
+    points = [None] * len(thresholds)
+    for t in order:
+        threshold = thresholds[t]
+        rhs = N * math.log(threshold) if method == "MaxCPBstCAI" else 100 * threshold * N
+        formulation.set_rhs(family, [rhs])
+        point_metrics = Metrics()
+        if model is None:
+            formulation.metrics = point_metrics
+            values, objective = solve_formulation(formulation, backend, threads, time_limit=time_limit,
+                                                  mip_gap=mip_gap)
+        else:
+            constraint.RHS = rhs
+            optimize_gurobi(model, threads, time_limit, mip_gap)
+            point_metrics.lap("solve")
+            point_metrics.solved(model, formulation.scale)
+            values, objective = (v.X, model.ObjVal) if model.SolCount else (None, None)
+        if values is None:
+            points[t] = (threshold, _no_solution(point_metrics))
+            continue
+
+        codons = formulation.index.codons(values[formulation.variables("X")])
+        point_metrics.model["threshold"] = threshold
+        if method == "MaxCPBstCAI":
+            point_metrics.model["cai"] = cai(codons, line_data)
+        else:
+            point_metrics.model["rcb"] = rcb(codons, line_data)
+        ans = "".join(CODONS[j] for j in codons)
+        points[t] = (threshold, OptimizationResult(objective * formulation.scale, ans, point_metrics,
+                                                   status_name(point_metrics.model["status"]),
+                                                   point_metrics.model.get("bound"),
+                                                   point_metrics.model.get("mip_gap")))
+        if model is not None:
+            # solution is feasible for the next (looser) threshold
+            v.Start = values
+    if model is not None:
+        model.dispose()
+    metrics.lap("sweep")
+    return points
@@ -0,0 +1,102 @@
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from code.formulation import max_cpb_st_cai_formulation, min_rcpb_st_rcb_formulation
+from code.optimizer import _create_M, _create_R, _create_Y, _optimize_formulation
+from code.result import Metrics, OptimizationResult
+from code.scoring import encode
+from code.warmstart import start_codons
+
+# number of positions on each side of edited positions that are optimized again
+RADIUS = 10
+
+
+def variant_optimization(method: str, parent_seq: str, parent_dna: str, protein_seq: str, line_data: list,
+                         matrix_data: list, threshold: float, radius: int = RADIUS, threads: int = 0,
+                         linking: str = "weak", backend: str = "gurobi", time_limit: float = None,
+                         mip_gap: float = None) -> OptimizationResult:
+    """
+    Incremental optimization of protein variant (point mutations, insertions, deletions, domain swaps) of optimized
+    parent protein. Variant is aligned with parent, codons of parent are kept on unchanged positions except
+    neighbourhoods of edited positions (radius positions on each side) that are optimized again. Kept codons are the
+    only codons of their positions in model, so they are removed by presolve and solve effort depends on the number
+    of edits, not on protein length. Codon usage of the whole variant is modelled, so CAI or RCB threshold is met by
+    the whole sequence. Parent codons and heuristic codons of edited positions are MIP start.
+
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param parent_seq: sequence of parent protein
+    :param parent_dna: optimized DNA sequence of parent protein
+    :param protein_seq: sequence of variant protein
+    :param line_data: fitness values or observed codon frequencies
+    :param matrix_data: Codon Pair Score table or observed codon pair frequencies
+    :param threshold: threshold for CAI or RCB
+    :param radius: number of positions on each side of edited positions that are optimized again
+    :param threads: number of solver threads (0 lets solver choose)
+    :param linking: linking of X and Z variables, "weak" or "flow"
+    :param backend: solver, "gurobi" or "highs"
+    :param time_limit: time limit of solve in seconds (no limit if None)
+    :param mip_gap: relative gap between objective and best bound to stop solve (solver default if None)
+    :return: string with DNA sequence, optimized for variant protein (with objective value, metrics, solve status,
+    best bound and gap as attributes), NoSolution with solve status if solver found no solution
+    """
+    metrics = Metrics()
+    aminoacids = list(protein_seq)
+    Y = _create_Y(aminoacids)
+    M = _create_M()
+    R = _create_R(aminoacids, M)
+    metrics.lap("R")
+
+    codons, free = variant_codons(parent_seq, parent_dna, protein_seq, radius)
+    fixed = np.flatnonzero(~free)
+    R[fixed] = False
+    R[fixed, codons[fixed]] = True
+    metrics.model["edited"] = int(np.sum(codons < 0))
+    metrics.model["free_positions"] = int(np.sum(free))
+    metrics.lap("variant")
+
+    start = codons.copy()
+    edited = codons < 0
+    start[edited] = start_codons(method, protein_seq, line_data, matrix_data, threshold)[edited]
+    metrics.lap("warm_start")
+
+    if method == "MaxCPBstCAI":
+        formulation = max_cpb_st_cai_formulation(R, line_data, matrix_data, threshold, metrics, linking)
+    elif method == "MinRCPBstRCB":
+        formulation = min_rcpb_st_rcb_formulation(R, Y, M, line_data, matrix_data, threshold, metrics, linking)
+    else:
+        raise Exception(f"Unknown method {method}")
+    return _optimize_formulation(formulation, False, threads, start, backend, time_limit, mip_gap)
+
+
+def variant_codons(parent_seq: str, parent_dna: str, protein_seq: str, radius: int = RADIUS) -> (np.ndarray,
+                                                                                                 np.ndarray):
+    """
+    Align variant with parent protein and find positions of variant that are optimized again.
+
+    :param parent_seq: sequence of parent protein
+    :param parent_dna: DNA sequence of parent protein
+    :param protein_seq: sequence of variant protein
+    :param radius: number of positions on each side of edited positions that are optimized again
+    :return: parent codon of each position of variant (-1 for edited positions), mask of positions that are optimized
+    """
+    parent_codons, _ = encode([parent_dna], ["parent"])
+    parent_codons = parent_codons[0]
+    if len(parent_codons) != len(parent_seq):
+        raise Exception(f"Parent DNA has {len(parent_codons)} codons, parent protein has {len(parent_seq)} amino acids")
+    parent_R = _create_R(list(parent_seq), _create_M())
+    wrong = np.flatnonzero(~parent_R[np.arange(len(parent_seq)), parent_codons])
+    if len(wrong):
+        raise Exception(f"Parent DNA does not encode parent protein at position {wrong[0] + 1}")
+
+    N = len(protein_seq)
+    codons = np.full(N, -1, dtype=np.intp)
+    free = np.zeros(N, dtype=bool)
+    matcher = SequenceMatcher(None, parent_seq, protein_seq, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            codons[j1:j2] = parent_codons[i1:i2]
+        else:
+            # deleted positions change the codon pair of their neighbours j1 - 1 and j1
+            free[max(0, j1 - radius - (j1 == j2)):min(N, j2 + radius)] = True
+    return codons, free
@@ -0,0 +1,155 @@
+import math
+
+import numpy as np
+
+from code.dp import _create_blocks, _create_candidates, _improve, _log_fitness_values
+from code.scoring import CODON_AA, AA_CODONS, cpb, rcpb
+from config import CODONS
+
+# tolerance for comparison of index changes
+EPS = 1e-9
+
+
+def start_codons(method: str, protein_seq: str, line_data: list, matrix_data: list, threshold: float,
+                 warm_start: str = "greedy") -> np.ndarray:
+    """
+    Feasible codons for MIP start.
+
+    :param method: method for optimization (MaxCPBstCAI or MinRCPBstRCB)
+    :param protein_seq: sequence of protein for optimization
+    :param line_data: fitness values or observed codon frequencies
+    :param matrix_data: Codon Pair Score table or observed codon pair frequencies
+    :param threshold: threshold for CAI or RCB
+    :param warm_start: "greedy" (heuristic codons) or "local" (heuristic codons improved by local search)
+    :return: codon indexes for each position
+    """
+    if warm_start not in ("greedy", "local"):
+        raise Exception(f"Unknown warm start {warm_start}")
+    local = warm_start == "local"
+    if method == "MaxCPBstCAI":
+        return max_cpb_st_cai_start(protein_seq, line_data, matrix_data, threshold, local)
+    elif method == "MinRCPBstRCB":
+        return min_rcpb_st_rcb_start(protein_seq, line_data, matrix_data, threshold, local)
+    raise Exception(f"Unknown method {method}")
+
+
+def start_objective(method: str, codons: np.ndarray, matrix_data: list) -> float:
+    # objective value of start codons
+    return cpb(codons, matrix_data) if method == "MaxCPBstCAI" else rcpb(codons, matrix_data)
+
+
+def max_cpb_st_cai_start(protein_seq: str, fitness_values: list, cps: list, threshold: float,
+                         local: bool = False) -> np.ndarray:
+    """
+    Codon with the highest fitness value on each position. CAI of such sequence is the highest possible, so it is
+    feasible for any threshold. Local search changes single codons to increase CPB while CAI is above threshold.
+
+    :param protein_seq: sequence of protein for optimization
+    :param fitness_values: fitness values list
+    :param cps: Codon Pair Score (CPS) table
+    :param threshold: the min value for CAI
+    :param local: improve codons by local search
+    :return: codon indexes for each position
+    """
+    candidates = _create_candidates(protein_seq)
+    log_fitness_values = _log_fitness_values(fitness_values)
+    codons = np.array([c[np.argmax(log_fitness_values[c])] for c in candidates], dtype=np.intp)
+    if local:
+        blocks = _create_blocks(protein_seq, candidates, np.asarray(cps, dtype=np.double))
+        codons = _improve(candidates, blocks, log_fitness_values, len(candidates) * math.log(threshold), codons)
+    return codons
+
+
+def min_rcpb_st_rcb_start(protein_seq: str, freq_codons: list, freq_codon_pair: list, threshold: float,
+                          local: bool = False) -> np.ndarray:
+    """
+    Codons of each amino acid are used in proportion to their observed frequencies (counts are rounded by the largest
+    remainders), so RCB is close to zero. Codons are interleaved along the protein. Local search changes single codons
+    to decrease RCPB while RCB is not above threshold.
+
+    :param protein_seq: sequence of protein for optimization
+    :param freq_codons: observed frequency of each codon
+    :param freq_codon_pair: observed frequency of codon pair
+    :param threshold: the max value for RCB
+    :param local: improve codons by local search
+    :return: codon indexes for each position
+    """
+    candidates = _create_candidates(protein_seq)
+    freq_codons = np.asarray(freq_codons, dtype=np.double)
+    aminoacids = np.array(list(protein_seq))
+    codons = np.empty(len(candidates), dtype=np.intp)
+    for aa in sorted(set(protein_seq)):
+        positions = np.flatnonzero(aminoacids == aa)
+        aa_codons = candidates[positions[0]]
+        frequencies = freq_codons[aa_codons]
+        if frequencies.sum() <= 0:
+            frequencies = np.ones(len(aa_codons))
+        share = frequencies / frequencies.sum() * len(positions)
+        counts = np.floor(share).astype(int)
+        remainders = np.argsort(counts - share, kind="stable")[:len(positions) - counts.sum()]
+        counts[remainders] += 1
+        # m-th use of codon with count c is placed at (m + 0.5) / c of amino acid positions
+        order = np.argsort(np.concatenate([(np.arange(c) + 0.5) / c for c in counts if c]), kind="stable")
+        codons[positions] = np.repeat(aa_codons, counts)[order]
+    if local:
+        codons = _improve_rcb(candidates, codons, freq_codons, freq_codon_pair, threshold)
+    return codons
+
+
+def _improve_rcb(candidates: list, codons: np.ndarray, freq_codons, freq_codon_pair, threshold: float) -> np.ndarray:
+    # one pass of single codon changes that decrease RCPB and keep RCB not above threshold: changes of RCB * N and
+    # RCPB * (N - 1) are computed incrementally from deviations of codon and codon pair counts (as in anneal._Chains),
+    # only two codon counts and four codon pair counts change, so a pass is O(N)
+    n_codons, n_aa = len(CODONS), len(AA_CODONS)
+    N = len(codons)
+    aminoacids = CODON_AA[codons]
+    eta = np.bincount(aminoacids, minlength=n_aa)
+    aa_pairs = np.bincount(aminoacids[:-1] * n_aa + aminoacids[1:], minlength=n_aa * n_aa)
+    pair_aa = (CODON_AA[:, None] * n_aa + CODON_AA[None, :]).ravel()
+    codon_dev = (np.bincount(codons, minlength=n_codons) -
+                 eta[CODON_AA] * np.asarray(freq_codons, dtype=np.double)).tolist()
+    pair_dev = (np.bincount(codons[:-1] * n_codons + codons[1:], minlength=n_codons * n_codons) -
+                aa_pairs[pair_aa] * np.asarray(freq_codon_pair, dtype=np.double).ravel()).tolist()
+    weights = (1 / AA_CODONS[CODON_AA]).tolist()
+    slack = threshold * N - sum(w * abs(d) for w, d in zip(weights, codon_dev))
+
+    def pair_changes(i, old, new):
+        # codon pairs with neighbours are removed for old codon and added for new codon
+        changes = []
+        if i > 0:
+            changes += [(codons[i - 1] * n_codons + old, -1), (codons[i - 1] * n_codons + new, 1)]
+        if i < N - 1:
+            changes += [(old * n_codons + codons[i + 1], -1), (new * n_codons + codons[i + 1], 1)]
+        return changes
+
+    def pair_delta(changes):
+        # changes are applied one by one, earlier changes of the same codon pair are added to its deviation
+        delta, applied = 0.0, {}
+        for key, step in changes:
+            dev = pair_dev[key] + applied.get(key, 0)
+            delta += weights[key // n_codons] * weights[key % n_codons] * (abs(dev + step) - abs(dev))
+            applied[key] = applied.get(key, 0) + step
+        return delta
+
+    codons = codons.tolist()
+    for i, position_codons in enumerate(candidates):
+        old = codons[i]
+        best, best_delta, best_rcb = old, -EPS, 0.0
+        for j in position_codons.tolist():
+            if j == old:
+                continue
+            rcb_delta = weights[old] * (abs(codon_dev[old] - 1) - abs(codon_dev[old])) + \
+                weights[j] * (abs(codon_dev[j] + 1) - abs(codon_dev[j]))
+            if rcb_delta > slack + EPS:
+                continue
+            delta = pair_delta(pair_changes(i, old, j))
+            if delta < best_delta:
+                best, best_delta, best_rcb = j, delta, rcb_delta
+        if best != old:
+            for key, step in pair_changes(i, old, best):
+                pair_dev[key] += step
+            codon_dev[old] -= 1
+            codon_dev[best] += 1
+            slack -= best_rcb
+            codons[i] = best
+    return np.array(codons, dtype=np.intp)
@@ -0,0 +1,186 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from code.backends import OPTIMAL, solve_formulation, status_name
+from code.formulation import Formulation, max_cpb_st_cai_formulation, min_rcpb_st_rcb_formulation
+from code.optimizer import max_cpb_st_cai_optimization, min_rcpb_st_rcb_optimization, _create_M, _create_R, \
+    _create_Y
+from code.result import Metrics, NoSolution, OptimizationResult
+from code.scoring import cai, cpb, rcb, rcpb
+from config import CODONS
+
+# number of positions of window (without fixed codons of neighbour windows)
+WINDOW = 1000
+
+
+def max_cpb_st_cai_windowed(protein_seq: str, fitness_values: list, cps: list, threshold: float,
+                            window: int = WINDOW, threads: int = 0, compare: bool = False,
+                            linking: str = "weak", backend: str = "gurobi", time_limit: float = None,
+                            mip_gap: float = None) -> OptimizationResult:
+    """
+    MaxCPBstCAI optimization of long protein by windows. Protein is split into windows of about the same length that
+    are solved in parallel in two rounds: even windows first, then odd windows with fixed boundary codons of their
+    neighbours, so codon pairs at the window boundaries are optimized too. CAI budget is shared between windows by
+    their length: CAI of every window is not below threshold, so CAI of the whole sequence is not below threshold.
+
+    :param protein_seq: sequence of protein for optimization
+    :param fitness_values: fitness values list
+    :param cps: Codon Pair Score (CPS) table
+    :param threshold: the min value for CAI
+    :param window: number of amino acids in window
+    :param threads: number of windows solved in parallel (0 for all cores)
+    :param compare: solve the whole protein too and record gap between objectives in metrics
+    :param linking: linking of X and Z variables, "weak" or "flow"
+    :param backend: solver of windows, "gurobi" or "highs"
+    :param time_limit: time limit of each window solve in seconds, the best solution found is used when it is reached
+    :param mip_gap: relative gap between objective and best bound to stop each window solve
+    :return: string with DNA sequence, optimized for input protein (with objective value, metrics and status of the
+    first window that is not solved to optimality as attributes), NoSolution if window has no solution
+    """
+    return _optimize_windows("MaxCPBstCAI", protein_seq, fitness_values, cps, threshold, window, threads, compare,
+                             linking, backend, time_limit, mip_gap)
+
+
+def min_rcpb_st_rcb_windowed(protein_seq: str, freq_codons: list, freq_codon_pair: list, threshold: float,
+                             window: int = WINDOW, threads: int = 0, compare: bool = False,
+                             linking: str = "weak", backend: str = "gurobi", time_limit: float = None,
+                             mip_gap: float = None) -> OptimizationResult:
+    """
+    MinRCPBstRCB optimization of long protein by windows (see max_cpb_st_cai_windowed). RCB of every window is not
+    above threshold (fixed codons of neighbour windows are not counted, codon pairs with them are counted in RCPB of
+    window), RCB is convex function of codon usage, so RCB of the whole sequence is not above threshold.
+
+    :param protein_seq: sequence of protein for optimization
+    :param freq_codons: observed frequency of each codon
+    :param freq_codon_pair: observed frequency of codon pair
+    :param threshold: the max value for RCB
+    :param window: number of amino acids in window
+    :param threads: number of windows solved in parallel (0 for all cores)
+    :param compare: solve the whole protein too and record gap between objectives in metrics
+    :param linking: linking of X and Z variables, "weak" or "flow"
+    :param backend: solver of windows, "gurobi" or "highs"
+    :param time_limit: time limit of each window solve in seconds, the best solution found is used when it is reached
+    :param mip_gap: relative gap between objective and best bound to stop each window solve
+    :return: string with DNA sequence, optimized for input protein (with objective value, metrics and status of the
+    first window that is not solved to optimality as attributes), NoSolution if window has no solution
+    """
+    return _optimize_windows("MinRCPBstRCB", protein_seq, freq_codons, freq_codon_pair, threshold, window, threads,
+                             compare, linking, backend, time_limit, mip_gap)
+
+
+def _optimize_windows(method: str, protein_seq: str, line_data: list, matrix_data: list, threshold: float,
+                      window: int, threads: int, compare: bool, linking: str = "weak",
+                      backend: str = "gurobi", time_limit: float = None, mip_gap: float = None) -> OptimizationResult:
+    metrics = Metrics()
+    aminoacids = list(protein_seq)
+    Y = _create_Y(aminoacids)
+    M = _create_M()
+    R = _create_R(aminoacids, M)
+    metrics.lap("R")
+
+    windows = _split(len(aminoacids), window)
+    codons = np.full(len(aminoacids), -1)
+    # status of the first window that is not solved to optimality
+    status = None
+    with ThreadPoolExecutor(min(threads or os.cpu_count(), len(windows))) as executor:
+        # odd windows are solved when codons of their neighbours are known
+        for parity in (0, 1):
+            bounds = windows[parity::2]
+            futures = [executor.submit(_solve_window, method, R, Y, M, line_data, matrix_data, threshold, start, end,
+                                       codons, linking, backend, time_limit, mip_gap) for start, end in bounds]
+            for (start, end), future in zip(bounds, futures):
+                window_codons, window_status = future.result()
+                if window_codons is None:
+                    metrics.model["windows"] = len(windows)
+                    metrics.lap("solution")
+                    return NoSolution(f"window {start}-{end}, solver status {status_name(window_status)}", metrics,
+                                      status_name(window_status))
+                if status is None and window_status != OPTIMAL:
+                    status = status_name(window_status)
+                codons[start:end] = window_codons
+            metrics.lap(f"windows/{'even' if parity == 0 else 'odd'}")
+
+    if method == "MaxCPBstCAI":
+        objValue = cpb(codons, matrix_data)
+        metrics.model["cai"] = cai(codons, line_data)
+    else:
+        objValue = rcpb(codons, matrix_data)
+        metrics.model["rcb"] = rcb(codons, line_data)
+    metrics.model["windows"] = len(windows)
+    ans = "".join(CODONS[j] for j in codons)
+    metrics.lap("solution")
+
+    if compare:
+        optimization = max_cpb_st_cai_optimization if method == "MaxCPBstCAI" else min_rcpb_st_rcb_optimization
+        full = optimization(protein_seq, line_data, matrix_data, threshold, build="matrix", threads=threads,
+                            linking=linking, backend=backend)
+        metrics.model["full_objective"] = full.objective
+        metrics.model["full_time"] = full.metrics.total_time
+        if full.objective is not None:
+            # relative loss of objective, positive when windowed solution is worse
+            loss = full.objective - objValue if method == "MaxCPBstCAI" else objValue - full.objective
+            metrics.model["gap"] = loss / abs(full.objective) if full.objective else loss
+        metrics.lap("compare")
+
+    return OptimizationResult(objValue, ans, metrics, status)
+
+
+def _split(N: int, window: int) -> list:
+    # windows of about the same length, not longer than window
+    count = max(1, math.ceil(N / window))
+    edges = np.linspace(0, N, count + 1).round().astype(int)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def _solve_window(method: str, R: np.ndarray, Y: np.ndarray, M: np.ndarray, line_data: list, matrix_data: list,
+                  threshold: float, start: int, end: int, codons: np.ndarray, linking: str = "weak",
+                  backend: str = "gurobi", time_limit: float = None, mip_gap: float = None) -> (np.ndarray, int):
+    """
+    Optimize codons of positions start..end-1. Known codons of neighbour positions are fixed, codon pairs with them
+    are in the window objective.
+
+    :return: codons of window (None if window has no solution) and solver status
+    """
+    left = int(start > 0 and codons[start - 1] >= 0)
+    right = int(end < len(codons) and codons[end] >= 0)
+    first, last = start - left, end + right
+    R_window = R[first:last].copy()
+    fixed = ([0] if left else []) + ([last - first - 1] if right else [])
+    # fixed codons are not counted in RCB of window
+    counted = np.ones(last - first, dtype=bool)
+    for i in fixed:
+        R_window[i] = 0
+        R_window[i, codons[first + i]] = 1
+        counted[i] = False
+
+    N = end - start
+    if method == "MaxCPBstCAI":
+        formulation = max_cpb_st_cai_formulation(R_window, line_data, matrix_data, threshold, linking=linking)
+        log_fitness_values = np.log(np.asarray(line_data, dtype=np.double))
+        fixed_cai = sum(log_fitness_values[codons[first + i]] for i in fixed)
+        formulation.set_rhs("minCAI", [N * math.log(threshold) + fixed_cai])
+    else:
+        formulation = min_rcpb_st_rcb_formulation(R_window, Y[first:last], M, line_data, matrix_data, threshold,
+                                                  linking=linking, counted=counted)
+
+    window_codons = _solve_formulation(formulation, backend, time_limit, mip_gap)
+    if window_codons is None:
+        return None, formulation.metrics.model["status"]
+    return window_codons[left:len(window_codons) - right], formulation.metrics.model["status"]
+
+
+def _solve_formulation(formulation: Formulation, backend: str, time_limit: float = None, mip_gap: float = None):
+    if backend != "gurobi":
+        values, _ = solve_formulation(formulation, backend, threads=1, time_limit=time_limit, mip_gap=mip_gap)
+    else:
+        # every window has own Gurobi environment: environments are not shared between threads
+        from gurobipy import Env
+        with Env(empty=True) as env:
+            env.setParam("OutputFlag", 0)
+            env.start()
+            values, _ = solve_formulation(formulation, backend, threads=1, env=env, time_limit=time_limit,
+                                          mip_gap=mip_gap)
+    return formulation.index.codons(values[formulation.variables("X")]) if values is not None else None
@@ -1,7 +1,13 @@
-from os import path, mkdir
+from os import path, mkdir, replace
+
+import numpy as np
 
 from config import CODONS
 
+# record of binary built data file
+TABLES_DTYPE = np.dtype([("fv", "<f8", (len(CODONS),)), ("ocf", "<f8", (len(CODONS),)),
+                         ("cps", "<f8", (len(CODONS), len(CODONS))), ("opf", "<f8", (len(CODONS), len(CODONS)))])
+
 
 def create_directory(path_dir: str):
     if path.isdir(path_dir):
@@ -35,3 +41,34 @@ def write_ordering_matrix(filename: str, data_2d: dict):
             for key2 in CODONS:
                 bufer += f"{round(data_2d[key1][key2], 3)}, "
             f.write(bufer[:-2] + "\n")
+
+
+def write_tables(filename: str, fitness_values: dict, observed_codon_frequencies: dict, cps: dict,
+                 observed_pair_frequencies: dict):
+    """
+    Write all built data of organism to one binary file (NumPy .npy with one record) in full precision. The file is
+    loaded without parsing by memory mapping.
+    :param filename: filename to write
+    :param fitness_values: fitness values
+    :param observed_codon_frequencies: observed codon frequencies
+    :param cps: Codon Pair Score table
+    :param observed_pair_frequencies: observed codon pair frequencies table
+    """
+    tables = np.zeros((), dtype=TABLES_DTYPE)
+    tables["fv"] = [fitness_values[codon] for codon in CODONS]
+    tables["ocf"] = [observed_codon_frequencies[codon] for codon in CODONS]
+    tables["cps"] = [[cps[c1][c2] for c2 in CODONS] for c1 in CODONS]
+    tables["opf"] = [[observed_pair_frequencies[c1][c2] for c2 in CODONS] for c1 in CODONS]
+    write_tables_record(filename, tables)
+
+
+def write_tables_record(filename: str, tables: np.ndarray):
+    """
+    Write built data record (TABLES_DTYPE) of organism to binary file.
+    :param filename: filename to write
+    :param tables: built data record
+    """
+    # written file is replaced atomically, so running optimizations never map partially written tables
+    with open(filename + ".tmp", "wb") as f:
+        np.save(f, np.asarray(tables, dtype=TABLES_DTYPE).reshape(()))
+    replace(filename + ".tmp", filename)
@@ -1,26 +1,132 @@
 from config import *
 
+import json
 from datetime import datetime
 
+from code.batch import get_optimization, optimize_batch
+from code.cache import ResultCache
+from code.checkpoint import Manifest
 from code.extractor import extract_codonopt_data
-from code.optimizer import max_cpb_st_cai_optimization, min_rcpb_st_rcb_optimization
 
-try:
-    line_data, matrix_data, method, threshold, seqs = extract_codonopt_data("codonopt_input.txt")
 
-    if method == "MaxCPBstCAI":
-        run_optimization = max_cpb_st_cai_optimization
-    elif method == "MinRCPBstRCB":
-        run_optimization = min_rcpb_st_rcb_optimization
-    else:
-        raise Exception(f"Unknown method {method}")
+def write_sweep(records, line_data: list, matrix_data: list, method: str, thresholds: list, output: str,
+                threads: int, settings: dict):
+    """
+    Optimize each protein for all thresholds (one model per protein) and write results and trade-off curve
+    (output file with .curve.tsv suffix).
+    """
+    from code.sweep import threshold_sweep
 
-    with open("output.txt", "w") as w:
+    index, objective = ("CAI", "CPB") if method == "MaxCPBstCAI" else ("RCB", "RCPB")
+    with open(output, "w") as w, open(output + ".curve.tsv", "w") as c:
         w.write("last update: " + datetime.now().ctime() + "\n\n")
-        for seq in seqs:
-            optimization_result = run_optimization(seq, line_data, matrix_data, threshold)
-            w.write(optimization_result + "\n")
+        c.write(f"id\tthreshold\t{index}\t{objective}\tstatus\n")
+        for record_id, seq in records:
+            points = threshold_sweep(method, seq, line_data, matrix_data, thresholds, threads, **settings)
+            for threshold, result in points:
+                w.write(f">{record_id} threshold={threshold}\n" + result + "\n")
+                if result.objective is not None:
+                    c.write(f"{record_id}\t{threshold}\t{result.metrics.model[index.lower()]}\t{result.objective}\t"
+                            f"{result.status}\n")
+            w.flush()
+            c.flush()
 
-except Exception as e:
-    logging.exception("Runtime exception occurred")
-    raise e
+
+def write_hosts(records, method: str, threshold: float, hosts: list, output: str, threads: int, settings: dict):
+    """
+    Optimize each protein for all hosts (one model per protein) and write results (output file) and table of indexes
+    (output file with .hosts.tsv suffix).
+    """
+    from code.extractor import _extract_built_data
+    from code.hosts import multi_host_optimization
+
+    tables = {host: _extract_built_data(DB_DIR, host, method) for host in hosts}
+    index, objective = ("CAI", "CPB") if method == "MaxCPBstCAI" else ("RCB", "RCPB")
+    with open(output, "w") as w, open(output + ".hosts.tsv", "w") as c:
+        w.write("last update: " + datetime.now().ctime() + "\n\n")
+        c.write(f"id\torganism\t{index}\t{objective}\tstatus\n")
+        for record_id, seq in records:
+            for host, result in multi_host_optimization(method, seq, tables, threshold, threads, **settings):
+                w.write(f">{record_id} organism={host}\n" + result + "\n")
+                if result.objective is not None:
+                    c.write(f"{record_id}\t{host}\t{result.metrics.model[index.lower()]}\t{result.objective}\t"
+                            f"{result.status}\n")
+            w.flush()
+            c.flush()
+
+
+if __name__ == "__main__":
+    try:
+        organism, line_data, matrix_data, method, threshold, records, options = \
+            extract_codonopt_data("codonopt_input.txt")
+        engine = options.get("engine", "mip")
+        time_limit = float(options["time_limit"]) if "time_limit" in options else None
+        # settings of MIP models, shared by engines and modes that build models (mip, windowed, hosts, sweep)
+        model_settings = {"linking": options.get("linking", "weak"), "backend": options.get("backend", "gurobi"),
+                          "time_limit": time_limit,
+                          "mip_gap": float(options["mip_gap"]) if "mip_gap" in options else None}
+        settings = {}
+        if engine == "mip":
+            settings = dict(model_settings)
+            settings["build"] = options.get("build", "loop")
+            settings["names"] = options.get("names", "no") == "yes"
+            settings["warm_start"] = options.get("warm_start", "none")
+        elif engine == "windowed":
+            settings = dict(model_settings)
+            settings["window"] = int(options.get("window", 1000))
+            settings["compare"] = options.get("compare", "no") == "yes"
+        elif engine == "anneal":
+            settings["population"] = int(options.get("population", 16))
+            settings["sweeps"] = int(options.get("sweeps", 30))
+            settings["time_limit"] = time_limit
+            settings["seed"] = int(options.get("seed", 0))
+        workers = int(options.get("workers", 1))
+        cores = int(options["cores"]) if "cores" in options else None
+        output = options.get("output", "output.txt")
+        resume = options.get("resume", "no") == "yes"
+        metrics_output = options.get("metrics")
+        cache = None
+        if "cache" in options:
+            cache_size = int(options.get("cache_size", 1024)) * 1024 ** 2
+            cache = ResultCache(options["cache"], organism, method, threshold, engine, settings, cache_size)
+
+        if "hosts" in options:
+            hosts = [host.strip() for host in options["hosts"].split(",") if host.strip()]
+            write_hosts(records, method, threshold, hosts, output, cores or 0, model_settings)
+        elif "sweep" in options:
+            thresholds = [float(t) for t in options["sweep"].split(",")]
+            write_sweep(records, line_data, matrix_data, method, thresholds, output, cores or 0, model_settings)
+        else:
+            # check method and engine before starting workers
+            get_optimization(method, engine)
+
+            # every result is flushed as soon as it is ready and recorded in manifest, so partial output survives a
+            # crash and the run can be resumed
+            with Manifest(output + ".manifest", organism, method, threshold, engine, settings, resume) as manifest:
+                w = manifest.open(output)
+                m = manifest.open(metrics_output) if metrics_output else None
+                if w.tell() == 0:
+                    w.write("last update: " + datetime.now().ctime() + "\n\n")
+                    w.flush()
+                results = optimize_batch(manifest.unfinished(records), line_data, matrix_data, method, threshold,
+                                         engine, settings, workers, cores, cache)
+                for record_id, optimization_result in results:
+                    w.write(f">{record_id}\n" + optimization_result + "\n")
+                    if m is not None:
+                        # results from cache have no metrics
+                        record_metrics = getattr(optimization_result, "metrics", None)
+                        record = {"id": record_id, "organism": organism, "method": method, "engine": engine}
+                        if record_metrics:
+                            record.update(objective=optimization_result.objective, **record_metrics.to_dict())
+                        else:
+                            record["cached"] = True
+                        m.write(json.dumps(record) + "\n")
+                    # output files are flushed and their sizes are recorded with finished sequence
+                    manifest.finish(record_id)
+
+            if cache is not None:
+                print(f"Cache hits: {cache.hits}, misses: {cache.misses}")
+
+    except Exception as e:
+        logging.exception("Runtime exception occurred")
+        raise e
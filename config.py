@@ -10,10 +10,15 @@ DB_COLUMN_DELIMITER = "\t"
 DB_TAXID_INDEX = 0
 DB_CODON_FREQUENCY_START = 2
 DB_CODON_PAIR_FREQUENCY_START = 2
+# suffix of sidecar file with taxid index of database
+DB_INDEX_SUFFIX = ".idx"
 
 CODON_DB_PATH = join(DB_DIR, CODON_DB)
 BICODON_DB_PATH = join(DB_DIR, BICODON_DB)
 
+# binary file with all built data of organism (fitness values, CPS table and observed frequencies) in full precision
+BUILT_TABLES = "tables.npy"
+
 
 """
 20 aminoacids and one stop symbol
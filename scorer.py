@@ -0,0 +1,20 @@
+from config import *
+
+from code.extractor import extract_scorer_data
+from code.scoring import score_records, BATCH_SIZE, SCORES
+
+if __name__ == "__main__":
+    try:
+        organism, tables, records, options = extract_scorer_data("scorer_input.txt")
+        output = options.get("output", "scores.tsv")
+        batch_size = int(options.get("batch", BATCH_SIZE))
+
+        # scores are written by batches as soon as they are ready
+        with open(output, "w") as w:
+            w.write("id\tcodons\t" + "\t".join(name.upper() for name in SCORES) + "\n")
+            for record_id, length, scores in score_records(records, *tables, batch_size=batch_size):
+                w.write(f"{record_id}\t{length}\t" + "\t".join(f"{scores[name]:.6f}" for name in SCORES) + "\n")
+
+    except Exception as e:
+        logging.exception("Runtime exception occurred")
+        raise e
@@ -0,0 +1,28 @@
+from config import *
+
+import asyncio
+
+from code.service import OptimizationService, QUEUE_SIZE, TIME_LIMIT
+
+if __name__ == "__main__":
+    try:
+        options = {}
+        with open("service_input.txt") as r:
+            for line in r:
+                if line.strip():
+                    key, value = line.split(":", 1)
+                    options[key.strip()] = value.strip()
+        organisms = [organism.strip() for organism in options.get("organisms", "").split(",") if organism.strip()]
+        service = OptimizationService(workers=int(options.get("workers", 1)), organisms=organisms,
+                                      time_limit=float(options.get("time_limit", TIME_LIMIT)),
+                                      queue_size=int(options.get("queue_size", QUEUE_SIZE)),
+                                      cores=int(options["cores"]) if "cores" in options else None)
+        try:
+            asyncio.run(service.serve(options.get("host", "127.0.0.1"), int(options.get("port", 8650)),
+                                      options.get("socket")))
+        except KeyboardInterrupt:
+            pass
+
+    except Exception as e:
+        logging.exception("Runtime exception occurred")
+        raise e
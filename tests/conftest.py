@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# modules of repository are imported as in scripts run from the repository root (package "code" shadows standard
+# library module with the same name)
+sys.path.insert(0, ROOT)
+sys.modules.pop("code", None)
+os.chdir(ROOT)
+
+ORGANISM = "escherichia_coli"
+# short proteins: models fit into size-limited Gurobi licence
+PROTEINS = ["MKVLLAGWWPLK", "MSTRHEDCQNIF", "MLLLKKAAGGSS"]
+
+
+@pytest.fixture(scope="session")
+def tables():
+    """
+    Built data of test organism.
+
+    :return: function of method that returns (line data, matrix data)
+    """
+    from config import DB_DIR
+    from code.extractor import _extract_built_data
+
+    cache = {}
+
+    def get(method: str):
+        if method not in cache:
+            cache[method] = _extract_built_data(DB_DIR, ORGANISM, method)
+        return cache[method]
+    return get
+
+
+def run_gurobi(optimization, *args, **kwargs):
+    """
+    Run optimization with Gurobi, skip test if Gurobi is not installed or model does not fit into licence.
+    """
+    gurobipy = pytest.importorskip("gurobipy")
+    try:
+        return optimization(*args, **kwargs)
+    except gurobipy.GurobiError as e:
+        pytest.skip(f"Gurobi is not available: {e}")
@@ -0,0 +1,166 @@
+import numpy as np
+import pytest
+
+from conftest import PROTEINS, run_gurobi
+
+# tolerance of objective comparison (solver tolerances of objectives in units of indexes)
+TOLERANCE = 1e-6
+
+
+def _codons(sequence: str) -> np.ndarray:
+    from code.scoring import encode
+
+    codons, _ = encode([sequence])
+    return codons[0]
+
+
+def _check_sequence(protein_seq: str, sequence: str):
+    # DNA sequence encodes protein
+    from config import CODON2AA
+
+    assert len(sequence) == 3 * len(protein_seq)
+    assert "".join(CODON2AA[sequence[i:i + 3]] for i in range(0, len(sequence), 3)) == protein_seq
+
+
+@pytest.mark.parametrize("protein_seq", PROTEINS)
+@pytest.mark.parametrize("threshold", [0.7, 0.9])
+def test_dp_matches_mip(tables, protein_seq, threshold):
+    from code.dp import max_cpb_st_cai_dp
+    from code.optimizer import max_cpb_st_cai_optimization
+    from code.scoring import cai
+
+    fitness_values, cps = tables("MaxCPBstCAI")
+    dp = max_cpb_st_cai_dp(protein_seq, fitness_values, cps, threshold)
+    mip = max_cpb_st_cai_optimization(protein_seq, fitness_values, cps, threshold, backend="highs")
+    assert dp.objective == pytest.approx(mip.objective, abs=TOLERANCE)
+    _check_sequence(protein_seq, dp.sequence)
+    assert cai(_codons(dp.sequence), fitness_values) >= threshold - 1e-9
+
+
+@pytest.mark.parametrize("protein_seq", PROTEINS)
+@pytest.mark.parametrize("linking", ["weak", "flow"])
+def test_matrix_matches_loop(tables, protein_seq, linking):
+    from code.optimizer import max_cpb_st_cai_optimization
+
+    fitness_values, cps = tables("MaxCPBstCAI")
+    loop = run_gurobi(max_cpb_st_cai_optimization, protein_seq, fitness_values, cps, 0.8, build="loop",
+                      linking=linking)
+    matrix = run_gurobi(max_cpb_st_cai_optimization, protein_seq, fitness_values, cps, 0.8, build="matrix",
+                        linking=linking)
+    assert loop.status == matrix.status == "optimal"
+    assert matrix.objective == pytest.approx(loop.objective, abs=TOLERANCE)
+    _check_sequence(protein_seq, matrix.sequence)
+
+
+def test_min_rcpb_matrix_matches_loop(tables):
+    from code.optimizer import min_rcpb_st_rcb_optimization
+
+    freq_codons, freq_codon_pair = tables("MinRCPBstRCB")
+    protein_seq = PROTEINS[0]
+    loop = run_gurobi(min_rcpb_st_rcb_optimization, protein_seq, freq_codons, freq_codon_pair, 0.3, build="loop")
+    matrix = run_gurobi(min_rcpb_st_rcb_optimization, protein_seq, freq_codons, freq_codon_pair, 0.3,
+                        build="matrix")
+    assert matrix.objective == pytest.approx(loop.objective, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("method, threshold", [("MaxCPBstCAI", 0.8), ("MinRCPBstRCB", 0.5)])
+def test_flow_matches_weak(tables, method, threshold):
+    from code.batch import get_optimization
+
+    optimization = get_optimization(method, "mip")
+    line_data, matrix_data = tables(method)
+    for protein_seq in PROTEINS:
+        weak = optimization(protein_seq, line_data, matrix_data, threshold, linking="weak", backend="highs")
+        flow = optimization(protein_seq, line_data, matrix_data, threshold, linking="flow", backend="highs")
+        assert weak.status == flow.status == "optimal"
+        assert flow.objective == pytest.approx(weak.objective, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("protein_seq", PROTEINS)
+def test_highs_matches_gurobi(tables, protein_seq):
+    from code.optimizer import max_cpb_st_cai_optimization
+
+    fitness_values, cps = tables("MaxCPBstCAI")
+    gurobi = run_gurobi(max_cpb_st_cai_optimization, protein_seq, fitness_values, cps, 0.8, build="matrix")
+    highs = max_cpb_st_cai_optimization(protein_seq, fitness_values, cps, 0.8, backend="highs")
+    assert highs.status == "optimal"
+    assert highs.objective == pytest.approx(gurobi.objective, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("method, threshold", [("MaxCPBstCAI", 0.8), ("MinRCPBstRCB", 0.5)])
+def test_objective_matches_scores(tables, method, threshold):
+    # objective of model is the index of its sequence
+    from code.batch import get_optimization
+    from code.scoring import cai, cpb, rcb, rcpb
+
+    optimization = get_optimization(method, "mip")
+    line_data, matrix_data = tables(method)
+    for protein_seq in PROTEINS:
+        result = optimization(protein_seq, line_data, matrix_data, threshold, backend="highs")
+        assert result.status == "optimal"
+        codons = _codons(result.sequence)
+        if method == "MaxCPBstCAI":
+            assert result.objective == pytest.approx(cpb(codons, matrix_data), abs=TOLERANCE)
+            assert cai(codons, line_data) >= threshold - 1e-9
+        else:
+            assert result.objective == pytest.approx(rcpb(codons, matrix_data), abs=TOLERANCE)
+            assert rcb(codons, line_data) <= threshold + 1e-9
+
+
+def test_no_solution_does_not_stop_batch(tables):
+    from code.batch import optimize_batch
+    from code.result import NoSolution
+
+    freq_codons, freq_codon_pair = tables("MinRCPBstRCB")
+    # RCB threshold 0.1 can not be reached for the first protein
+    records = [("infeasible", PROTEINS[0]), ("feasible", "VVV")]
+    results = dict(optimize_batch(records, freq_codons, freq_codon_pair, "MinRCPBstRCB", 0.1, "mip",
+                                  {"backend": "highs"}))
+    assert isinstance(results["infeasible"], NoSolution)
+    assert results["infeasible"].status == "infeasible"
+    assert results["feasible"].status == "optimal"
+
+    # one protein without solution does not discard results of its annealing batch
+    records = [("infeasible", "V"), ("feasible", PROTEINS[0])]
+    results = dict(optimize_batch(records, freq_codons, freq_codon_pair, "MinRCPBstRCB", 0.3, "anneal"))
+    assert isinstance(results["infeasible"], NoSolution)
+    assert results["feasible"].objective is not None
+
+    # protein with unknown amino acid is left out of its annealing batch
+    records = [("unknown", "MKBV"), ("feasible", PROTEINS[0])]
+    results = dict(optimize_batch(records, freq_codons, freq_codon_pair, "MinRCPBstRCB", 0.5, "anneal"))
+    assert isinstance(results["unknown"], NoSolution)
+    assert results["feasible"].objective is not None
+
+
+def test_dp_no_solution(tables):
+    from code.batch import optimize_batch
+    from code.result import NoSolution
+
+    fitness_values, cps = tables("MaxCPBstCAI")
+    # unknown amino acid and unreachable CAI threshold do not stop batch
+    records = [("unknown", "MKBV"), ("feasible", PROTEINS[0])]
+    results = dict(optimize_batch(records, fitness_values, cps, "MaxCPBstCAI", 0.8, "dp"))
+    assert isinstance(results["unknown"], NoSolution)
+    assert results["feasible"].status == "optimal"
+    results = dict(optimize_batch(records[1:], fitness_values, cps, "MaxCPBstCAI", 1.01, "dp"))
+    assert results["feasible"].status == "infeasible"
+
+
+@pytest.mark.parametrize("method, threshold", [("MaxCPBstCAI", 0.8), ("MinRCPBstRCB", 0.5)])
+def test_windowed_meets_threshold(tables, method, threshold):
+    # every window meets threshold, codon pairs at window boundaries are in objective of odd windows
+    from code.batch import get_optimization
+    from code.scoring import cai, rcb
+
+    optimization = get_optimization(method, "windowed")
+    line_data, matrix_data = tables(method)
+    protein_seq = "".join(PROTEINS)
+    result = optimization(protein_seq, line_data, matrix_data, threshold, window=12, backend="highs")
+    assert result.status is None
+    _check_sequence(protein_seq, result.sequence)
+    codons = _codons(result.sequence)
+    if method == "MaxCPBstCAI":
+        assert cai(codons, line_data) >= threshold - 1e-9
+    else:
+        assert rcb(codons, line_data) <= threshold + 1e-9
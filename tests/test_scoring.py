@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from conftest import PROTEINS
+
+
+def test_score_batch_matches_scalar_scores(tables):
+    from code.scoring import cai, cpb, encode, rcb, rcpb, score_batch
+    from config import CODONS
+
+    fitness_values, cps = tables("MaxCPBstCAI")
+    freq_codons, freq_codon_pair = tables("MinRCPBstRCB")
+    rng = np.random.default_rng(0)
+    # sequences of different lengths, including one codon
+    sequences = ["".join(CODONS[j] for j in rng.integers(0, len(CODONS), length)) for length in (1, 2, 5, 40, 200)]
+    codons, lengths = encode(sequences)
+    scores = score_batch(codons, lengths, fitness_values, cps, freq_codons, freq_codon_pair)
+    for k, length in enumerate(lengths):
+        sequence_codons = codons[k, :length]
+        assert scores["cai"][k] == pytest.approx(cai(sequence_codons, fitness_values))
+        assert scores["cpb"][k] == pytest.approx(cpb(sequence_codons, cps), abs=1e-12)
+        assert scores["rcb"][k] == pytest.approx(rcb(sequence_codons, freq_codons))
+        assert scores["rcpb"][k] == pytest.approx(rcpb(sequence_codons, freq_codon_pair))
+
+
+def test_dp_objective_is_cpb(tables):
+    from code.dp import max_cpb_st_cai_dp
+    from code.scoring import cpb, encode
+
+    fitness_values, cps = tables("MaxCPBstCAI")
+    for protein_seq in PROTEINS:
+        result = max_cpb_st_cai_dp(protein_seq, fitness_values, cps, 0.8)
+        codons, _ = encode([result.sequence])
+        assert result.objective == pytest.approx(cpb(codons[0], cps))